@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Activity, ActivityCategory, ActivityTemplate
+from .models import Activity, ActivityCategory, ActivityTemplate, ActivityTypeScore
 
 @admin.register(Activity)
 class ActivityAdmin(admin.ModelAdmin):
@@ -20,3 +20,9 @@ class ActivityTemplateAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'activity_type', 'default_unit', 'default_value', 'is_active')
     list_filter = ('category', 'is_active')
     search_fields = ('name', 'activity_type', 'description')
+
+@admin.register(ActivityTypeScore)
+class ActivityTypeScoreAdmin(admin.ModelAdmin):
+    list_display = ('user', 'category', 'activity_type', 'use_count', 'last_used_at')
+    search_fields = ('user__email', 'activity_type')
+    raw_id_fields = ('user',)
@@ -0,0 +1,189 @@
+"""
+Time-bucketed activity aggregation
+Runs Trunc + Sum queries in the database, or reads the per-day user rollups
+(UserMetrics) when they are enabled, and caches results per user and range.
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import Trunc
+
+from ecotrack.cache import CacheManager
+from .models import Activity
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+GROUP_BY_FIELDS = {
+    'category': 'category__name',
+    'activity_type': 'activity_type',
+}
+# Longest range (in days) served for each bucket size
+MAX_RANGE_DAYS = {
+    'hour': 31,
+    'day': 366,
+    'week': 366 * 3,
+    'month': 366 * 10,
+}
+CACHE_TIMEOUT = 300
+
+
+class AggregationError(ValueError):
+    """Invalid aggregation parameters"""
+
+
+def resolve_timezone(name: Optional[str], user) -> ZoneInfo:
+    """Resolve a timezone name, falling back to the user's profile setting"""
+    for candidate in (name, getattr(user, 'timezone', None), 'UTC'):
+        if not candidate:
+            continue
+        try:
+            return ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError):
+            if candidate == name:
+                raise AggregationError(f"Unknown timezone: {name}")
+    return ZoneInfo('UTC')
+
+
+def _version_key(user_id) -> str:
+    return CacheManager.get_cache_key('activity_aggregates', f"user:{user_id}", part='version')
+
+
+def bump_user_version(user_id):
+    """Invalidate every cached aggregate for a user"""
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def _user_version(user_id) -> int:
+    return cache.get(_version_key(user_id)) or 1
+
+
+def aggregate_activities(user, bucket: str, start: date, end: date,
+                         group_by: Optional[str] = None, tz_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Aggregate a user's activities into time buckets.
+
+    ``start`` and ``end`` are inclusive local dates in the resolved timezone.
+    """
+    if bucket not in BUCKETS:
+        raise AggregationError(f"bucket must be one of {', '.join(BUCKETS)}")
+    if group_by and group_by not in GROUP_BY_FIELDS:
+        raise AggregationError(f"group_by must be one of {', '.join(GROUP_BY_FIELDS)}")
+    if end < start:
+        raise AggregationError("end must not be before start")
+    if (end - start).days + 1 > MAX_RANGE_DAYS[bucket]:
+        raise AggregationError(f"Range too large for bucket '{bucket}' (max {MAX_RANGE_DAYS[bucket]} days)")
+
+    tz = resolve_timezone(tz_name, user)
+
+    cache_key = CacheManager.get_cache_key(
+        'activity_aggregates',
+        f"user:{user.id}",
+        version=_user_version(user.id),
+        bucket=bucket,
+        group_by=group_by or '',
+        start=start.isoformat(),
+        end=end.isoformat(),
+        tz=tz.key,
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if _can_use_rollups(user, bucket, group_by, tz):
+        results = _aggregate_rollups(user, bucket, start, end, tz)
+        source = 'rollup'
+    else:
+        results = _aggregate_activities(user, bucket, start, end, group_by, tz)
+        source = 'activities'
+
+    data = {
+        'bucket': bucket,
+        'group_by': group_by,
+        'timezone': tz.key,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'source': source,
+        'results': results,
+    }
+    cache.set(cache_key, data, CACHE_TIMEOUT)
+    return data
+
+
+def _can_use_rollups(user, bucket: str, group_by: Optional[str], tz: ZoneInfo) -> bool:
+    """
+    Daily rollups hold per-user totals keyed on the local date in the
+    user's profile timezone, so they only answer requests in that timezone.
+    """
+    return (
+        getattr(settings, 'ACTIVITY_DAILY_ROLLUPS', False)
+        and bucket != 'hour'
+        and not group_by
+        and tz.key == resolve_timezone(None, user).key
+    )
+
+
+def _aggregate_activities(user, bucket, start, end, group_by, tz) -> List[Dict[str, Any]]:
+    range_start = datetime.combine(start, time.min, tzinfo=tz)
+    range_end = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz)
+
+    fields = ['period']
+    group_field = GROUP_BY_FIELDS.get(group_by)
+    if group_field:
+        fields.append(group_field)
+
+    rows = Activity.objects.filter(
+        user=user,
+        start_timestamp__gte=range_start,
+        start_timestamp__lt=range_end,
+    ).annotate(
+        period=Trunc('start_timestamp', bucket, tzinfo=tz)
+    ).values(*fields).annotate(
+        co2_kg=Sum('co2_kg'),
+        activity_count=Count('id'),
+    ).order_by(*fields)
+
+    results = []
+    for row in rows:
+        item = {
+            'period': row['period'].astimezone(tz).isoformat(),
+            'co2_kg': round(float(row['co2_kg'] or 0), 3),
+            'activity_count': row['activity_count'],
+        }
+        if group_field:
+            item['group'] = row[group_field]
+        results.append(item)
+    return results
+
+
+def _aggregate_rollups(user, bucket, start, end, tz) -> List[Dict[str, Any]]:
+    from users.models import UserMetrics
+
+    rows = UserMetrics.objects.filter(
+        user=user,
+        metric_date__gte=start,
+        metric_date__lte=end,
+    ).annotate(
+        period=Trunc('metric_date', bucket)
+    ).values('period').annotate(
+        co2_kg=Sum('co2_kg'),
+        activity_count=Sum('activities_count'),
+    ).order_by('period')
+
+    return [
+        {
+            'period': datetime.combine(row['period'], time.min, tzinfo=tz).isoformat(),
+            'co2_kg': round(float(row['co2_kg'] or 0), 3),
+            'activity_count': row['activity_count'] or 0,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,187 @@
+"""
+Near-duplicate activity detection
+Keeps a rolling window of activity fingerprints per user in the cache so an
+ingest-time check is a constant number of cache reads, with no history query.
+"""
+import hashlib
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ecotrack.cache import CacheManager
+
+logger = logging.getLogger(__name__)
+
+# Least to most strict; merge and reject both keep the duplicate from being created
+POLICIES = ('off', 'flag', 'merge', 'reject')
+
+
+@dataclass
+class DuplicateMatch:
+    """An earlier activity that a new one duplicates"""
+    activity_id: str
+    seconds_apart: float
+
+
+def get_policy(override: Optional[str] = None) -> str:
+    """
+    Resolve the duplicate policy. A request override is only honoured when
+    it is stricter than the configured policy, so clients cannot opt out.
+    """
+    policy = getattr(settings, 'ACTIVITY_DUPLICATE_POLICY', 'flag')
+    if policy not in POLICIES:
+        policy = 'flag'
+    if override in POLICIES and POLICIES.index(override) > POLICIES.index(policy):
+        return override
+    return policy
+
+
+def get_window_seconds() -> int:
+    return getattr(settings, 'ACTIVITY_DUPLICATE_WINDOW_SECONDS', 600)
+
+
+def fingerprint(category_id, activity_type: str, value, unit: str) -> str:
+    """Stable fingerprint for the fields that identify a repeated log"""
+    normalized_value = Decimal(str(value)).quantize(Decimal('0.001')).normalize()
+    raw = f"{category_id}|{activity_type.strip().lower()}|{normalized_value}|{unit.strip().lower()}"
+    return hashlib.md5(raw.encode()).hexdigest()[:16]
+
+
+class DuplicateDetector:
+    """
+    Ingest-time duplicate detector.
+
+    Fingerprints are stored under ``(user, fingerprint, time bucket)`` keys,
+    where a bucket is one window wide. A candidate is compared against its
+    own bucket and the two neighbours, which covers every timestamp within
+    one window of it.
+    """
+
+    @staticmethod
+    def _key(user_id, fp: str, bucket: int) -> str:
+        return CacheManager.get_cache_key('activity_fingerprint', f"user:{user_id}", fp=fp, bucket=bucket)
+
+    @classmethod
+    def _keys_around(cls, user_id, fp: str, timestamp: float, window: int) -> List[str]:
+        bucket = int(timestamp // window)
+        return [cls._key(user_id, fp, b) for b in (bucket - 1, bucket, bucket + 1)]
+
+    @classmethod
+    def find_duplicate(cls, user_id, category_id, activity_type, value, unit, start_timestamp,
+                       exclude_id=None) -> Optional[DuplicateMatch]:
+        """Return the earlier activity this one duplicates, if any"""
+        window = get_window_seconds()
+        fp = fingerprint(category_id, activity_type, value, unit)
+        timestamp = start_timestamp.timestamp()
+
+        best = None
+        for stored in cache.get_many(cls._keys_around(user_id, fp, timestamp, window)).values():
+            activity_id, stored_timestamp = stored
+            if activity_id == exclude_id:
+                continue
+            seconds_apart = abs(stored_timestamp - timestamp)
+            if seconds_apart <= window and (best is None or seconds_apart < best.seconds_apart):
+                best = DuplicateMatch(activity_id=activity_id, seconds_apart=seconds_apart)
+        return best
+
+    @staticmethod
+    def _fields(data: dict) -> tuple:
+        """(category_id, activity_type, value, unit, start_timestamp) of validated serializer data"""
+        category = data['category']
+        return (
+            getattr(category, 'pk', category),
+            data['activity_type'],
+            data['value'],
+            data['unit'],
+            data['start_timestamp'],
+        )
+
+    @classmethod
+    def find_duplicate_for_data(cls, user_id, data: dict) -> Optional[DuplicateMatch]:
+        """find_duplicate for validated serializer data"""
+        return cls.find_duplicate(user_id, *cls._fields(data))
+
+    @classmethod
+    def _data_key(cls, user_id, data: dict) -> str:
+        category_id, activity_type, value, unit, start_timestamp = cls._fields(data)
+        bucket = int(start_timestamp.timestamp() // get_window_seconds())
+        return cls._key(user_id, fingerprint(category_id, activity_type, value, unit), bucket)
+
+    @classmethod
+    def reserve(cls, user_id, activity_id, data: dict) -> Optional[DuplicateMatch]:
+        """
+        Claim the fingerprint bucket for an activity about to be created with
+        ``activity_id``, then look for an earlier duplicate. The claim is a
+        cache.add, so of two identical logs racing into the same bucket only
+        the first finds no duplicate. A bucket already claimed keeps its
+        (earlier) activity.
+        """
+        cache.add(
+            cls._data_key(user_id, data),
+            (str(activity_id), data['start_timestamp'].timestamp()),
+            getattr(settings, 'ACTIVITY_DUPLICATE_TTL', 86400)
+        )
+        return cls.find_duplicate(user_id, *cls._fields(data), exclude_id=str(activity_id))
+
+    @classmethod
+    def release(cls, user_id, activity_id, data: dict):
+        """Give up a claim for an activity that was not created"""
+        key = cls._data_key(user_id, data)
+        stored = cache.get(key)
+        if stored and stored[0] == str(activity_id):
+            cache.delete(key)
+
+    @classmethod
+    def remember(cls, activity):
+        """Record an ingested activity's fingerprint"""
+        window = get_window_seconds()
+        fp = fingerprint(activity.category_id, activity.activity_type, activity.value, activity.unit)
+        bucket = int(activity.start_timestamp.timestamp() // window)
+        cache.set(
+            cls._key(activity.user_id, fp, bucket),
+            (str(activity.id), activity.start_timestamp.timestamp()),
+            getattr(settings, 'ACTIVITY_DUPLICATE_TTL', 86400)
+        )
+
+    @classmethod
+    def forget(cls, activity):
+        """Drop a deleted activity's fingerprint so re-logging it is not flagged"""
+        window = get_window_seconds()
+        fp = fingerprint(activity.category_id, activity.activity_type, activity.value, activity.unit)
+        key = cls._key(activity.user_id, fp, int(activity.start_timestamp.timestamp() // window))
+        stored = cache.get(key)
+        if stored and stored[0] == str(activity.id):
+            cache.delete(key)
+
+
+def find_duplicate_groups(rows: Iterable[tuple], window: int) -> List[List[str]]:
+    """
+    Group duplicate activities from rows ordered by (user, fingerprint fields
+    trimmed and lowercased like fingerprint(), start_timestamp). Rows are ``(id, user_id, category_id, activity_type,
+    value, unit, start_timestamp)``. Each group lists the original first.
+    """
+    groups = []
+    current = []
+    current_key = None
+    group_start = None
+
+    for activity_id, user_id, category_id, activity_type, value, unit, start_timestamp in rows:
+        key = (user_id, fingerprint(category_id, activity_type, value, unit))
+        timestamp = start_timestamp.timestamp()
+
+        if key == current_key and timestamp - group_start <= window:
+            current.append(str(activity_id))
+        else:
+            if len(current) > 1:
+                groups.append(current)
+            current = [str(activity_id)]
+            current_key = key
+            group_start = timestamp
+
+    if len(current) > 1:
+        groups.append(current)
+    return groups
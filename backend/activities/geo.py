@@ -0,0 +1,211 @@
+"""
+Geohash utilities for activity locations
+Provides encoding, bounding-box covers and distance helpers that work on any
+database backend (no PostGIS required)
+"""
+import math
+from typing import List, Optional, Tuple
+from django.db.models import Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+DEFAULT_PRECISION = 9  # ~5m x 5m cells
+EARTH_RADIUS_KM = 6371.0088
+
+# Approximate cell size (height_deg, width_deg) for each geohash length
+_CELL_SIZES = {}
+for _length in range(1, 13):
+    _lon_bits = math.ceil(_length * 5 / 2)
+    _lat_bits = math.floor(_length * 5 / 2)
+    _CELL_SIZES[_length] = (180.0 / (2 ** _lat_bits), 360.0 / (2 ** _lon_bits))
+
+
+def encode(latitude, longitude, precision: int = DEFAULT_PRECISION) -> str:
+    """Encode a coordinate pair into a geohash string"""
+    lat = float(latitude)
+    lon = float(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+
+    chars = []
+    bit = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[value])
+            bit = 0
+            value = 0
+
+    return ''.join(chars)
+
+
+def encode_optional(latitude, longitude, precision: int = DEFAULT_PRECISION) -> str:
+    """Encode a coordinate pair, returning an empty string when incomplete"""
+    if latitude is None or longitude is None:
+        return ''
+    return encode(latitude, longitude, precision)
+
+
+def decode_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Return (min_lat, min_lon, max_lat, max_lon) covered by a geohash"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def decode(geohash: str) -> Tuple[float, float]:
+    """Return the (latitude, longitude) centre point of a geohash cell"""
+    min_lat, min_lon, max_lat, max_lon = decode_bbox(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """
+    Exclusive upper bound for a prefix range scan.
+    '{' sorts directly after 'z', the last geohash character, so
+    ``prefix <= geohash < prefix + '{'`` selects every hash under the prefix
+    and can be answered from a plain b-tree index on SQLite and Postgres.
+    """
+    return prefix + '{'
+
+
+def bbox_cover(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+               max_cells: int = 32) -> List[str]:
+    """
+    Compute geohash prefixes covering a bounding box.
+
+    Picks the longest prefix length whose cells cover the box in at most
+    ``max_cells`` cells, then enumerates the cells on that grid. Results
+    are a superset of the box and must be refined with an exact filter.
+    """
+    min_lat = max(-90.0, min_lat)
+    max_lat = min(90.0, max_lat)
+    min_lon = max(-180.0, min_lon)
+    max_lon = min(180.0, max_lon)
+
+    precision = 1
+    for length in range(12, 0, -1):
+        cell_height, cell_width = _CELL_SIZES[length]
+        rows = math.floor(max_lat / cell_height) - math.floor(min_lat / cell_height) + 1
+        cols = math.floor(max_lon / cell_width) - math.floor(min_lon / cell_width) + 1
+        if rows * cols <= max_cells:
+            precision = length
+            break
+
+    cell_height, cell_width = _CELL_SIZES[precision]
+    prefixes = set()
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            prefixes.add(encode(lat, lon, precision))
+            if lon >= max_lon:
+                break
+            lon = min(lon + cell_width, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + cell_height, max_lat)
+
+    return sorted(prefixes)
+
+
+def radius_bbox(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) around a point"""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6:
+        lon_delta = 180.0
+    else:
+        lon_delta = min(180.0, math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)))
+    return (
+        latitude - lat_delta,
+        longitude - lon_delta,
+        latitude + lat_delta,
+        longitude + lon_delta,
+    )
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1 = math.radians(float(lat1))
+    phi2 = math.radians(float(lat2))
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(float(lon2) - float(lon1))
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def is_valid_point(latitude: float, longitude: float) -> bool:
+    """Whether a coordinate pair is finite and inside the lat/lon ranges"""
+    if not (math.isfinite(latitude) and math.isfinite(longitude)):
+        return False
+    return -90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0
+
+
+def parse_bbox(raw: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Parse a ``min_lon,min_lat,max_lon,max_lat`` query parameter.
+    Returns (min_lat, min_lon, max_lat, max_lon) or None if invalid.
+    """
+    if not raw:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in raw.split(','))
+    except ValueError:
+        return None
+    if not (is_valid_point(min_lat, min_lon) and is_valid_point(max_lat, max_lon)):
+        return None
+    if min_lat > max_lat or min_lon > max_lon:
+        return None
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def bbox_filter(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                max_cells: int = 32) -> Q:
+    """
+    Build a Q object selecting activities inside a bounding box.
+    The geohash prefix ranges prune rows through the index before the exact
+    latitude/longitude comparison runs on the survivors.
+    """
+    prefix_q = Q()
+    for prefix in bbox_cover(min_lat, min_lon, max_lat, max_lon, max_cells):
+        prefix_q |= Q(geohash__gte=prefix, geohash__lt=prefix_upper_bound(prefix))
+
+    return prefix_q & Q(
+        latitude__gte=min_lat,
+        latitude__lte=max_lat,
+        longitude__gte=min_lon,
+        longitude__lte=max_lon,
+    )
@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+from activities.dedupe import find_duplicate_groups
+from activities.models import Activity
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Find near-duplicate activities already stored and flag or delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='user', help='Only check this user (email or id)')
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=getattr(settings, 'ACTIVITY_DUPLICATE_WINDOW_SECONDS', 600),
+            help='Seconds within which identical activities count as duplicates',
+        )
+        parser.add_argument('--since-days', type=int, dest='since_days', help='Only check recent activities')
+        parser.add_argument(
+            '--action',
+            choices=['flag', 'delete'],
+            default='flag',
+            help='Flag duplicates in metadata or delete them (originals are kept)',
+        )
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', help='Report without changing anything')
+
+    def handle(self, *args, **options):
+        queryset = Activity.objects.all()
+
+        if options['user']:
+            lookup = {'email': options['user']} if '@' in options['user'] else {'id': options['user']}
+            user = User.objects.filter(**lookup).first()
+            if not user:
+                raise CommandError(f"User not found: {options['user']}")
+            queryset = queryset.filter(user=user)
+
+        if options['since_days']:
+            queryset = queryset.filter(start_timestamp__gte=timezone.now() - timedelta(days=options['since_days']))
+
+        # Sorting on the fingerprint fields, normalised as fingerprint() does, puts every
+        # duplicate next to its original
+        rows = queryset.order_by(
+            'user_id', 'category_id', Lower(Trim('activity_type')), 'value', Lower(Trim('unit')),
+            'start_timestamp', 'id'
+        ).values_list(
+            'id', 'user_id', 'category_id', 'activity_type', 'value', 'unit', 'start_timestamp'
+        ).iterator(chunk_size=BATCH_SIZE)
+
+        groups = find_duplicate_groups(rows, options['window'])
+        duplicate_count = sum(len(group) - 1 for group in groups)
+        self.stdout.write(f'Found {duplicate_count} duplicates in {len(groups)} groups')
+
+        if options['dry_run'] or not groups:
+            return
+
+        if options['action'] == 'delete':
+            self._delete(groups)
+        else:
+            self._flag(groups)
+
+    def _flag(self, groups):
+        original_of = {
+            duplicate_id: group[0]
+            for group in groups
+            for duplicate_id in group[1:]
+        }
+        ids = list(original_of)
+        flagged = 0
+        for i in range(0, len(ids), BATCH_SIZE):
+            batch = list(Activity.objects.filter(id__in=ids[i:i + BATCH_SIZE]).only('id', 'metadata'))
+            for activity in batch:
+                activity.metadata = {**(activity.metadata or {}), 'duplicate_of': original_of[str(activity.id)]}
+            Activity.objects.bulk_update(batch, ['metadata'], batch_size=BATCH_SIZE)
+            flagged += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Flagged {flagged} duplicate activities'))
+
+    def _delete(self, groups):
+        from social.services import SocialService
+
+        ids = [duplicate_id for group in groups for duplicate_id in group[1:]]
+        affected_user_ids = set()
+        deleted = 0
+        for i in range(0, len(ids), BATCH_SIZE):
+            batch = Activity.objects.filter(id__in=ids[i:i + BATCH_SIZE])
+            affected_user_ids.update(batch.values_list('user_id', flat=True))
+            deleted += batch.delete()[0]
+
+        for user in User.objects.filter(id__in=affected_user_ids):
+            SocialService.update_user_stats(user)
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} duplicate activities for {len(affected_user_ids)} users'
+        ))
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from activities.models import Activity
+from activities.rollups import rebuild_rollups
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-day activity rollups (UserMetrics) and the UserStats activity totals from activities'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='user', help='Only rebuild this user (email)')
+
+    def handle(self, *args, **options):
+        from social.services import SocialService
+
+        users = User.objects.filter(id__in=Activity.objects.values('user_id'))
+        if options['user']:
+            users = users.filter(email=options['user'])
+
+        days = 0
+        user_count = 0
+        for user in users.iterator():
+            days += rebuild_rollups(user)
+            user_count += 1
+
+        SocialService.recompute_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {days} daily rollups for {user_count} users'))
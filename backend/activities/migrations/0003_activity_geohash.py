@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="activity",
+            name="geohash",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=12
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                fields=["geohash"], name="activities_geohash_c8f5a0_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                fields=["user", "geohash"], name="activities_user_id_2cf38f_idx"
+            ),
+        ),
+    ]
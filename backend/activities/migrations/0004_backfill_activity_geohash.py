@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from activities.geo import encode
+
+BATCH_SIZE = 2000
+
+
+def backfill_geohash(apps, schema_editor):
+    Activity = apps.get_model("activities", "Activity")
+    pending = Activity.objects.filter(
+        geohash="", latitude__isnull=False, longitude__isnull=False
+    ).only("id", "latitude", "longitude")
+
+    batch = []
+    for activity in pending.iterator(chunk_size=BATCH_SIZE):
+        activity.geohash = encode(activity.latitude, activity.longitude)
+        batch.append(activity)
+        if len(batch) >= BATCH_SIZE:
+            Activity.objects.bulk_update(batch, ["geohash"])
+            batch = []
+    if batch:
+        Activity.objects.bulk_update(batch, ["geohash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0003_activity_geohash"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
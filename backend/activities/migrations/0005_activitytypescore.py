@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("activities", "0004_backfill_activity_geohash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActivityTypeScore",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("activity_type", models.CharField(max_length=100)),
+                ("score", models.FloatField(default=0)),
+                (
+                    "scored_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("use_count", models.PositiveIntegerField(default=0)),
+                ("last_used_at", models.DateTimeField()),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="type_scores",
+                        to="activities.activitycategory",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="activity_type_scores",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "activity_type_scores",
+                "unique_together": {("user", "category", "activity_type")},
+            },
+        ),
+    ]
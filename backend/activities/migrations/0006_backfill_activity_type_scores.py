@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def usage_weight(used_at, now):
+    """Frozen copy of activities.suggestions.usage_weight"""
+    half_life = getattr(settings, "TEMPLATE_SUGGESTION_HALF_LIFE_DAYS", 14) * 86400
+    elapsed = max((now - used_at).total_seconds(), 0)
+    return 0.5 ** (elapsed / half_life)
+
+
+def backfill_scores(apps, schema_editor):
+    Activity = apps.get_model("activities", "Activity")
+    ActivityTypeScore = apps.get_model("activities", "ActivityTypeScore")
+
+    rows = (
+        Activity.objects.order_by("user_id")
+        .values_list("user_id", "category_id", "activity_type", "start_timestamp")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+
+    now = datetime.now(timezone.utc)
+    scores = {}
+    pending = []
+    current_user = None
+    for user_id, category_id, activity_type, start_timestamp in rows:
+        if user_id != current_user:
+            pending.extend(scores.values())
+            scores = {}
+            current_user = user_id
+            if len(pending) >= BATCH_SIZE:
+                ActivityTypeScore.objects.bulk_create(pending)
+                pending = []
+
+        key = (category_id, activity_type.strip())
+        score = scores.get(key)
+        if score is None:
+            score = scores[key] = ActivityTypeScore(
+                user_id=user_id,
+                category_id=category_id,
+                activity_type=key[1],
+                scored_at=now,
+                last_used_at=start_timestamp,
+            )
+        score.score += usage_weight(start_timestamp, now)
+        score.use_count += 1
+        score.last_used_at = max(score.last_used_at, start_timestamp)
+
+    pending.extend(scores.values())
+    if pending:
+        ActivityTypeScore.objects.bulk_create(pending)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0005_activitytypescore"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
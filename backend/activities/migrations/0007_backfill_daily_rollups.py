@@ -0,0 +1,56 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 2000
+
+
+def backfill_rollups(apps, schema_editor):
+    Activity = apps.get_model("activities", "Activity")
+    User = apps.get_model("users", "User")
+    UserMetrics = apps.get_model("users", "UserMetrics")
+
+    user_ids = Activity.objects.values_list("user_id", flat=True).distinct()
+    pending = []
+    for user in User.objects.filter(id__in=user_ids).only("id", "timezone").iterator():
+        try:
+            tz = ZoneInfo(user.timezone or "UTC")
+        except (ZoneInfoNotFoundError, ValueError):
+            tz = ZoneInfo("UTC")
+
+        days = (
+            Activity.objects.filter(user_id=user.id)
+            .annotate(day=TruncDate("start_timestamp", tzinfo=tz))
+            .values("day")
+            .annotate(co2_kg=Sum("co2_kg"), activities_count=Count("id"))
+        )
+        UserMetrics.objects.filter(user_id=user.id).delete()
+        pending.extend(
+            UserMetrics(
+                user_id=user.id,
+                metric_date=row["day"],
+                co2_kg=row["co2_kg"] or 0,
+                activities_count=row["activities_count"],
+                source="rollup",
+            )
+            for row in days
+        )
+        if len(pending) >= BATCH_SIZE:
+            UserMetrics.objects.bulk_create(pending)
+            pending = []
+    if pending:
+        UserMetrics.objects.bulk_create(pending)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("activities", "0006_backfill_activity_type_scores"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
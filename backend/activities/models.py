@@ -2,6 +2,9 @@ import uuid
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.conf import settings
+from django.utils import timezone
+
+from .geo import encode_optional
 
 
 class ActivityCategory(models.Model):
@@ -40,6 +43,7 @@ class Activity(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     location_name = models.CharField(max_length=200, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
     co2_kg = models.DecimalField(max_digits=10, decimal_places=3, null=True, blank=True)
     co2_calculated = models.BooleanField(default=False)
     device_id = models.CharField(max_length=100, blank=True)
@@ -55,12 +59,22 @@ class Activity(models.Model):
             models.Index(fields=['category', 'start_timestamp']),
             models.Index(fields=['start_timestamp']),
             models.Index(fields=['co2_calculated']),
+            models.Index(fields=['geohash']),
+            models.Index(fields=['user', 'geohash']),
         ]
         ordering = ['-start_timestamp']
         
     def __str__(self):
         return f"{self.user.email} - {self.activity_type}: {self.value} {self.unit}"
     
+    def save(self, *args, **kwargs):
+        # Keep the spatial index column in sync with the coordinates
+        self.geohash = encode_optional(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'latitude', 'longitude'} & set(update_fields)):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+    
     @property
     def duration_minutes(self):
         if self.end_timestamp:
@@ -118,4 +132,26 @@ class ActivityImport(models.Model):
     def progress_percentage(self):
         if self.total_records and self.total_records > 0:
             return int((self.processed_records / self.total_records) * 100)
-        return 0
\ No newline at end of file
+        return 0
+
+
+class ActivityTypeScore(models.Model):
+    """
+    Decayed usage counter per user and activity type, used to rank template
+    suggestions. ``score`` is the decayed count as of ``scored_at`` and is
+    decayed further when read (see activities.suggestions).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activity_type_scores')
+    category = models.ForeignKey(ActivityCategory, on_delete=models.CASCADE, related_name='type_scores')
+    activity_type = models.CharField(max_length=100)
+    score = models.FloatField(default=0)
+    scored_at = models.DateTimeField(default=timezone.now)
+    use_count = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'activity_type_scores'
+        unique_together = ['user', 'category', 'activity_type']
+        
+    def __str__(self):
+        return f"{self.user_id} - {self.activity_type}: {self.score:.3f}"
@@ -0,0 +1,116 @@
+"""
+Lean read-only projections for list endpoints
+Builds serializer-identical output from ``values()`` rows without
+instantiating model objects or nested relations
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+# (output field name, values() lookup or None, converter)
+FieldMap = List[Tuple[str, Optional[str], Callable[[Any], Any]]]
+
+
+def _identity(value):
+    return value
+
+
+class ValuesProjection:
+    """
+    Precomputed field map for a ModelSerializer.
+
+    Each field's ``to_representation`` is resolved once, so rendering a
+    row is a tight loop over tuples. Computed fields that have no column
+    (properties, method fields) are declared in ``computed`` as
+    ``name -> (lookups, fn(row))``.
+    """
+
+    def __init__(self, serializer_class, computed: Optional[Dict[str, Tuple[Sequence[str], Callable]]] = None):
+        self.serializer_class = serializer_class
+        self.computed = computed or {}
+        self._field_maps: Dict[Tuple[str, ...], Tuple[FieldMap, List[str]]] = {}
+        self._field_names: Optional[List[str]] = None
+
+    @property
+    def field_names(self) -> List[str]:
+        if self._field_names is None:
+            self._field_names = list(self.serializer_class().fields.keys())
+        return self._field_names
+
+    def select_fields(self, requested: Optional[str]) -> Tuple[str, ...]:
+        """Resolve a ``fields=a,b,c`` parameter against the serializer fields"""
+        if not requested:
+            return tuple(self.field_names)
+        wanted = {name.strip() for name in requested.split(',') if name.strip()}
+        selected = tuple(name for name in self.field_names if name in wanted)
+        return selected or tuple(self.field_names)
+
+    def field_map(self, field_names: Tuple[str, ...]) -> Tuple[FieldMap, List[str]]:
+        """Return the cached (field map, values() lookups) for a field selection"""
+        cached = self._field_maps.get(field_names)
+        if cached is not None:
+            return cached
+
+        fields = self.serializer_class().fields
+        field_map: FieldMap = []
+        lookups: List[str] = []
+
+        for name in field_names:
+            if name in self.computed:
+                required, fn = self.computed[name]
+                lookups.extend(lookup for lookup in required if lookup not in lookups)
+                field_map.append((name, None, fn))
+                continue
+
+            field = fields[name]
+            if isinstance(field, PrimaryKeyRelatedField):
+                lookup = f"{field.source}_id"
+                converter = field.pk_field.to_representation if field.pk_field else _identity
+            elif isinstance(field, (serializers.ReadOnlyField, serializers.SerializerMethodField)):
+                raise ValueError(f"Field '{name}' needs a computed projection")
+            else:
+                lookup = field.source.replace('.', '__')
+                converter = field.to_representation
+
+            if lookup not in lookups:
+                lookups.append(lookup)
+            field_map.append((name, lookup, converter))
+
+        self._field_maps[field_names] = (field_map, lookups)
+        return field_map, lookups
+
+    def render(self, rows: Iterable[Dict[str, Any]], field_map: FieldMap) -> List[Dict[str, Any]]:
+        """Render ``values()`` rows with a precomputed field map"""
+        results = []
+        for row in rows:
+            item = {}
+            for name, lookup, converter in field_map:
+                if lookup is None:
+                    item[name] = converter(row)
+                else:
+                    value = row[lookup]
+                    item[name] = None if value is None else converter(value)
+            results.append(item)
+        return results
+
+
+class ProjectedListMixin:
+    """
+    List views that serialize through a ValuesProjection.
+    Supports ``?fields=`` sparse fieldsets and keeps filtering and pagination.
+    """
+    projection: ValuesProjection = None
+
+    def list(self, request, *args, **kwargs):
+        selected = self.projection.select_fields(request.query_params.get('fields'))
+        field_map, lookups = self.projection.field_map(selected)
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*lookups)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.projection.render(page, field_map))
+
+        return Response(self.projection.render(queryset, field_map))
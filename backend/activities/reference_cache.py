@@ -0,0 +1,91 @@
+"""
+Versioned in-process cache for activity reference data
+Categories and templates change only when admins edit them, so rendered
+responses are kept in worker memory and validated against a shared version
+number that model signals bump on every change.
+"""
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from rest_framework.renderers import JSONRenderer
+
+from ecotrack.cache import CacheManager, SharedVersion
+
+VERSION = SharedVersion(CacheManager.get_cache_key('reference', 'version'))
+MAX_VARIANTS = 256
+
+_lock = threading.Lock()
+_state = {'version': None, 'entries': {}}
+
+
+class ReferenceEntry:
+    """A pre-rendered response body with its strong ETag"""
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def bump_version():
+    """Invalidate reference data in every worker"""
+    VERSION.bump()
+    with _lock:
+        _state['entries'] = {}
+        _state['version'] = None
+
+
+def get_entry(dataset: str, variant: str) -> Tuple[int, Optional[ReferenceEntry]]:
+    """Return (version, entry) for a dataset variant, entry is None on a miss"""
+    version = VERSION.current()
+    with _lock:
+        if _state['version'] != version:
+            _state['version'] = version
+            _state['entries'] = {}
+        return version, _state['entries'].get((dataset, variant))
+
+
+def store_entry(version: int, dataset: str, variant: str, body: bytes) -> ReferenceEntry:
+    """Remember a rendered body for the version it was built against"""
+    entry = ReferenceEntry(body)
+    with _lock:
+        entries: Dict = _state['entries']
+        if _state['version'] == version and len(entries) < MAX_VARIANTS:
+            entries[(dataset, variant)] = entry
+    return entry
+
+
+class ReferenceDataCacheMixin:
+    """
+    List views whose responses are served from the reference data cache.
+    Responses carry a strong ETag and Cache-Control, and matching
+    If-None-Match requests are answered with 304 Not Modified.
+    """
+    reference_dataset = None
+
+    def list(self, request, *args, **kwargs):
+        variant = request.build_absolute_uri()
+        version, entry = get_entry(self.reference_dataset, variant)
+
+        if entry is None:
+            data = super().list(request, *args, **kwargs).data
+            entry = store_entry(version, self.reference_dataset, variant, JSONRenderer().render(data))
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if entry.etag in [tag.strip() for tag in if_none_match.split(',')]:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry.body, content_type='application/json')
+
+        response['ETag'] = entry.etag
+        patch_cache_control(
+            response,
+            private=True,
+            must_revalidate=True,
+            max_age=getattr(settings, 'REFERENCE_DATA_MAX_AGE', 0)
+        )
+        return response
@@ -0,0 +1,115 @@
+"""
+Per-day activity rollups
+Keeps users.UserMetrics (one row per user and local day) in step with the
+activities table, and the activity counters on social.UserStats with it.
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .aggregation import resolve_timezone
+from .models import Activity
+
+logger = logging.getLogger(__name__)
+
+# UserStats field holding the CO2 total of each leaderboard period
+PERIOD_CO2_FIELDS = {
+    'weekly': 'weekly_co2_saved',
+    'monthly': 'monthly_co2_saved',
+    'yearly': 'yearly_co2_saved',
+}
+
+
+def local_date(user, timestamp: datetime) -> date:
+    """The user's local calendar day for a timestamp"""
+    return timestamp.astimezone(resolve_timezone(None, user)).date()
+
+
+def refresh_daily_rollup(user, day: date):
+    """
+    Recompute one user-day rollup from its activities and move the change
+    into the user's activity totals.
+    """
+    from users.models import UserMetrics
+
+    tz = resolve_timezone(None, user)
+    totals = Activity.objects.filter(
+        user=user,
+        start_timestamp__gte=datetime.combine(day, time.min, tzinfo=tz),
+        start_timestamp__lt=datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz),
+    ).aggregate(co2_kg=Sum('co2_kg'), activities_count=Count('id'))
+    co2_kg = totals['co2_kg'] or Decimal('0')
+
+    with transaction.atomic():
+        rollup = UserMetrics.objects.select_for_update().filter(user=user, metric_date=day).first()
+        previous_co2 = rollup.co2_kg if rollup else Decimal('0')
+        previous_count = rollup.activities_count if rollup else 0
+
+        if totals['activities_count']:
+            UserMetrics.objects.update_or_create(
+                user=user,
+                metric_date=day,
+                defaults={
+                    'co2_kg': co2_kg,
+                    'activities_count': totals['activities_count'],
+                    'source': 'rollup',
+                }
+            )
+        elif rollup:
+            rollup.delete()
+
+    if bool(previous_count) != bool(totals['activities_count']):
+        from social.streaks import record_active_day
+        record_active_day(user, day, active=bool(totals['activities_count']))
+
+    co2_delta = float(co2_kg - previous_co2)
+    count_delta = totals['activities_count'] - previous_count
+    if co2_delta or count_delta:
+        _apply_stats_delta(user, day, co2_delta, count_delta)
+
+
+def _apply_stats_delta(user, day: date, co2_delta: float, count_delta: int):
+    from social.models import UserStats
+    from social.services import LeaderboardService
+
+    updates = {
+        'total_activities': F('total_activities') + count_delta,
+        'total_co2_saved': F('total_co2_saved') + co2_delta,
+    }
+    for period, field in PERIOD_CO2_FIELDS.items():
+        start, end = LeaderboardService._get_period_dates(period)
+        if start.date() <= day < end.date():
+            updates[field] = F(field) + co2_delta
+    UserStats.objects.filter(user=user).update(**updates)
+
+
+def rebuild_rollups(user) -> int:
+    """Rebuild every rollup for a user from scratch, returns the day count"""
+    from django.db.models.functions import TruncDate
+    from users.models import UserMetrics
+
+    tz = resolve_timezone(None, user)
+    days = Activity.objects.filter(user=user).annotate(
+        day=TruncDate('start_timestamp', tzinfo=tz)
+    ).values('day').annotate(
+        co2_kg=Sum('co2_kg'),
+        activities_count=Count('id'),
+    ).order_by('day')
+
+    rollups = [
+        UserMetrics(
+            user=user,
+            metric_date=row['day'],
+            co2_kg=row['co2_kg'] or 0,
+            activities_count=row['activities_count'],
+            source='rollup',
+        )
+        for row in days
+    ]
+    with transaction.atomic():
+        UserMetrics.objects.filter(user=user).delete()
+        UserMetrics.objects.bulk_create(rollups, batch_size=2000)
+    return len(rollups)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import ActivityCategory, Activity, ActivityTemplate
+from .projections import ValuesProjection
 
 
 class ActivityCategorySerializer(serializers.ModelSerializer):
@@ -16,6 +17,13 @@ class ActivityTemplateSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ActivityTemplateSuggestionSerializer(serializers.Serializer):
+    template = ActivityTemplateSerializer()
+    score = serializers.FloatField()
+    use_count = serializers.IntegerField()
+    last_used_at = serializers.DateTimeField(allow_null=True)
+
+
 class ActivitySerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     category_type = serializers.CharField(source='category.category_type', read_only=True)
@@ -41,4 +49,19 @@ class ActivityCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+
+def _duration_minutes(row):
+    if row['end_timestamp']:
+        return int((row['end_timestamp'] - row['start_timestamp']).total_seconds() / 60)
+    return None
+
+
+# Read-only fast path for activity list endpoints
+ACTIVITY_LIST_PROJECTION = ValuesProjection(
+    ActivitySerializer,
+    computed={
+        'duration_minutes': (('start_timestamp', 'end_timestamp'), _duration_minutes),
+    }
+)
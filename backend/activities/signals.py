@@ -0,0 +1,72 @@
+"""
+Signal handlers for activity caches and derived counters
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .aggregation import bump_user_version
+from .dedupe import DuplicateDetector
+from .models import Activity, ActivityCategory, ActivityTemplate
+from .reference_cache import bump_version
+from .rollups import local_date, refresh_daily_rollup
+from .suggestions import discard_usage, record_usage
+
+
+@receiver([post_save, post_delete], sender=ActivityCategory)
+@receiver([post_save, post_delete], sender=ActivityTemplate)
+def invalidate_reference_data(sender, **kwargs):
+    """Categories and templates changed, drop cached reference responses once committed"""
+    transaction.on_commit(bump_version)
+
+
+@receiver([post_save, post_delete], sender=Activity)
+def invalidate_activity_aggregates(sender, instance, **kwargs):
+    """A user's activities changed, drop their cached aggregates"""
+    bump_user_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Activity)
+def forget_activity_fingerprint(sender, instance, **kwargs):
+    """Deleted activities no longer count as originals for duplicate checks"""
+    DuplicateDetector.forget(instance)
+
+
+@receiver(post_save, sender=Activity)
+def record_activity_type_usage(sender, instance, created, **kwargs):
+    """Feed new activities into the user's template suggestion scores"""
+    if created:
+        record_usage(instance)
+
+
+@receiver(post_delete, sender=Activity)
+def discard_activity_type_usage(sender, instance, **kwargs):
+    discard_usage(instance)
+
+
+@receiver(pre_save, sender=Activity)
+def remember_rollup_day(sender, instance, update_fields=None, **kwargs):
+    """An activity moved to another day leaves a stale rollup behind"""
+    instance._previous_start = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and 'start_timestamp' not in update_fields:
+        return
+    instance._previous_start = Activity.objects.filter(pk=instance.pk).values_list(
+        'start_timestamp', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=Activity)
+def update_rollup_on_save(sender, instance, **kwargs):
+    """Keep the user's per-day rollup in step with their activities"""
+    day = local_date(instance.user, instance.start_timestamp)
+    refresh_daily_rollup(instance.user, day)
+    previous_start = getattr(instance, '_previous_start', None)
+    if previous_start and local_date(instance.user, previous_start) != day:
+        refresh_daily_rollup(instance.user, local_date(instance.user, previous_start))
+
+
+@receiver(post_delete, sender=Activity)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    refresh_daily_rollup(instance.user, local_date(instance.user, instance.start_timestamp))
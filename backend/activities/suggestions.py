@@ -0,0 +1,137 @@
+"""
+Ranked activity template suggestions
+Each user keeps an exponentially decayed usage counter per activity type,
+updated in place when activities are logged, so ranking never scans history.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ActivityTemplate, ActivityTypeScore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def _half_life_seconds() -> float:
+    return getattr(settings, 'TEMPLATE_SUGGESTION_HALF_LIFE_DAYS', 14) * 86400
+
+
+def decayed(score: float, scored_at: datetime, now: Optional[datetime] = None) -> float:
+    """A score recorded at ``scored_at``, decayed to ``now``"""
+    now = now or timezone.now()
+    elapsed = max((now - scored_at).total_seconds(), 0)
+    return score * 0.5 ** (elapsed / _half_life_seconds())
+
+
+def usage_weight(used_at: datetime, now: Optional[datetime] = None) -> float:
+    """Weight of one use at ``used_at`` as of ``now``, 1 for a use just now"""
+    return decayed(1.0, used_at, now)
+
+
+def _lookup(activity) -> Dict[str, Any]:
+    return {
+        'user_id': activity.user_id,
+        'category_id': activity.category_id,
+        'activity_type': activity.activity_type.strip(),
+    }
+
+
+def record_usage(activity):
+    """Add an activity to its user's decayed activity type counter"""
+    lookup = _lookup(activity)
+    now = timezone.now()
+    with transaction.atomic():
+        row = ActivityTypeScore.objects.select_for_update().filter(**lookup).first()
+        if row is None:
+            try:
+                with transaction.atomic():
+                    ActivityTypeScore.objects.create(
+                        score=usage_weight(activity.start_timestamp, now), scored_at=now,
+                        use_count=1, last_used_at=activity.start_timestamp, **lookup
+                    )
+                return
+            except IntegrityError:
+                # Created concurrently, fall back to the increment
+                row = ActivityTypeScore.objects.select_for_update().get(**lookup)
+
+        row.score = decayed(row.score, row.scored_at, now) + usage_weight(activity.start_timestamp, now)
+        row.scored_at = now
+        row.use_count += 1
+        row.last_used_at = max(row.last_used_at, activity.start_timestamp)
+        row.save(update_fields=['score', 'scored_at', 'use_count', 'last_used_at'])
+
+
+def discard_usage(activity):
+    """Remove a deleted activity's contribution from its counter"""
+    now = timezone.now()
+    with transaction.atomic():
+        row = ActivityTypeScore.objects.select_for_update().filter(**_lookup(activity)).first()
+        if row is None:
+            return
+        row.score = max(decayed(row.score, row.scored_at, now) - usage_weight(activity.start_timestamp, now), 0.0)
+        row.scored_at = now
+        row.use_count = max(row.use_count - 1, 0)
+        row.save(update_fields=['score', 'scored_at', 'use_count'])
+
+
+def suggest_templates(user, category=None, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Templates ranked by the user's decayed usage of their activity type.
+    Templates the user never used fill the remaining slots.
+    """
+    scores = ActivityTypeScore.objects.filter(user=user, score__gt=0)
+    if category:
+        scores = scores.filter(category=category)
+    # Rows were decayed at different times, so they are ranked after decaying
+    # to now. A user has one row per activity type they log, a few dozen at most.
+    now = timezone.now()
+    top = [
+        (category_id, activity_type, decayed(score, scored_at, now), use_count, last_used_at)
+        for category_id, activity_type, score, scored_at, use_count, last_used_at in scores.values_list(
+            'category_id', 'activity_type', 'score', 'scored_at', 'use_count', 'last_used_at'
+        )
+    ]
+    top.sort(key=lambda row: row[2], reverse=True)
+    # A few extra rows since not every type has a matching template
+    top = top[:limit * 3]
+
+    templates = ActivityTemplate.objects.filter(is_active=True).select_related('category')
+    if category:
+        templates = templates.filter(category=category)
+
+    ranked = {}
+    if top:
+        by_type = {(category_id, activity_type): rank for rank, (category_id, activity_type, *_) in enumerate(top)}
+        matched = templates.filter(
+            category_id__in={category_id for category_id, *_ in top},
+            activity_type__in={activity_type for _, activity_type, *_ in top},
+        )
+        for template in matched:
+            rank = by_type.get((template.category_id, template.activity_type))
+            if rank is not None:
+                ranked.setdefault(rank, []).append(template)
+
+    suggestions = []
+    for rank in sorted(ranked):
+        _, _, score, use_count, last_used_at = top[rank]
+        for template in sorted(ranked[rank], key=lambda t: t.name):
+            suggestions.append({
+                'template': template,
+                'score': round(score, 4),
+                'use_count': use_count,
+                'last_used_at': last_used_at,
+            })
+
+    if len(suggestions) < limit:
+        seen = [item['template'].id for item in suggestions]
+        for template in templates.exclude(id__in=seen).order_by('category__name', 'name')[:limit - len(suggestions)]:
+            suggestions.append({'template': template, 'score': 0.0, 'use_count': 0, 'last_used_at': None})
+
+    return suggestions[:limit]
@@ -1,3 +1,241 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from corporate.models import Organization, OrganizationMember
+from users.models import UserSettings
+from .dedupe import get_policy
+from .export import export_rows, iter_csv, iter_ndjson
+from .models import Activity, ActivityCategory, ActivityTemplate, ActivityTypeScore
+from .suggestions import decayed, suggest_templates, usage_weight
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    LEADERBOARD_STORE_BACKEND='social.leaderboard_store.InMemoryLeaderboardStore',
+    TIMELINE_STORE_BACKEND='social.timelines.InMemoryTimelineStore'
+)
+class ActivityTestCase(TestCase):
+    def setUp(self):
+        self.category = ActivityCategory.objects.create(name='Car Travel', category_type='transportation')
+        self.user = self.make_user('owner')
+
+    def make_user(self, name, privacy_level='public'):
+        user = User.objects.create_user(email=f'{name}@example.com', username=name, password='pass')
+        UserSettings.objects.create(user=user, privacy_level=privacy_level)
+        return user
+
+    def make_activity(self, user, **fields):
+        data = dict(
+            user=user, category=self.category, activity_type='car_trip', value=Decimal('10'), unit='km',
+            start_timestamp=timezone.now(), co2_kg=Decimal('2.5')
+        )
+        data.update(fields)
+        return Activity.objects.create(**data)
+
+    def get(self, path, params=None, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.user)
+        return client.get(f'/api/v1/activities/{path}', params or {}, secure=True)
+
+    def post(self, path, data, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.user)
+        return client.post(f'/api/v1/activities/{path}', data, format='json', secure=True)
+
+
+class GeoQueryTests(ActivityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.near = self.make_activity(self.user, latitude=Decimal('41.0082'), longitude=Decimal('28.9784'))
+        self.far = self.make_activity(self.user, latitude=Decimal('41.0500'), longitude=Decimal('29.0500'))
+        self.make_activity(self.user)
+
+        self.colleague = self.make_user('colleague')
+        self.make_activity(self.colleague, latitude=Decimal('41.0083'), longitude=Decimal('28.9785'))
+        self.organization = Organization.objects.create(name='Acme', domain='acme.example.com')
+        OrganizationMember.objects.create(organization=self.organization, user=self.user, role='member')
+        OrganizationMember.objects.create(organization=self.organization, user=self.colleague, role='member')
+
+    def test_bbox(self):
+        response = self.get('geo/', {'bbox': '28.9,40.9,29.0,41.1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [str(self.near.id)])
+
+    def test_bbox_rejects_invalid_coordinates(self):
+        for bbox in ['nan,40,30,42', '28,40,inf,42', '28,-91,30,42', '28,40,181,42', '30,40,28,42', '28,40,30']:
+            self.assertEqual(self.get('geo/', {'bbox': bbox}).status_code, 400, bbox)
+
+    def test_nearby(self):
+        response = self.get('geo/nearby/', {'lat': 41.0, 'lon': 28.98, 'radius_km': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [str(self.near.id), str(self.far.id)])
+
+        response = self.get('geo/nearby/', {'lat': 41.0, 'lon': 28.98, 'radius_km': 10, 'limit': -1})
+        self.assertEqual([row['id'] for row in response.data['results']], [str(self.near.id)])
+
+    def test_nearby_rejects_invalid_coordinates(self):
+        for params in [{'lat': 'nan', 'lon': 29}, {'lat': 41, 'lon': 'inf'}, {'lat': 91, 'lon': 29},
+                       {'lat': 41, 'lon': -181}, {'lat': 41, 'lon': 29, 'radius_km': 'nan'}, {'lat': 41}]:
+            self.assertEqual(self.get('geo/nearby/', params).status_code, 400, params)
+
+    def test_raw_rows_are_never_organization_scoped(self):
+        params = {'organization': str(self.organization.id)}
+        self.assertEqual(self.get('geo/', dict(params, bbox='28,40,30,42')).status_code, 400)
+        self.assertEqual(self.get('geo/nearby/', dict(params, lat=41, lon=29)).status_code, 400)
+
+    def test_organization_heatmap_needs_a_manager(self):
+        params = {'bbox': '28,40,30,42', 'precision': 5, 'organization': str(self.organization.id)}
+        self.assertEqual(self.get('geo/heatmap/', params).status_code, 404)
+
+        OrganizationMember.objects.filter(user=self.user).update(role='manager')
+        response = self.get('geo/heatmap/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(cell['activity_count'] for cell in response.data['cells']), 3)
+
+    def test_organization_heatmap_respects_privacy(self):
+        OrganizationMember.objects.filter(user=self.user).update(role='manager')
+        UserSettings.objects.filter(user=self.colleague).update(privacy_level='friends')
+        params = {'bbox': '28,40,30,42', 'precision': 5, 'organization': str(self.organization.id)}
+        response = self.get('geo/heatmap/', params)
+        self.assertEqual(sum(cell['activity_count'] for cell in response.data['cells']), 2)
+
+
+class DuplicatePolicyTests(ActivityTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.data = {
+            'category': self.category.id, 'activity_type': 'car_trip', 'value': '12.5', 'unit': 'km',
+            'start_timestamp': timezone.now().isoformat(),
+        }
+
+    def log(self, on_duplicate=None):
+        return self.post(f'?on_duplicate={on_duplicate}' if on_duplicate else '', self.data)
+
+    def test_overrides_can_only_be_stricter(self):
+        with self.settings(ACTIVITY_DUPLICATE_POLICY='reject'):
+            self.assertEqual(get_policy('off'), 'reject')
+            self.assertEqual(get_policy('merge'), 'reject')
+        with self.settings(ACTIVITY_DUPLICATE_POLICY='flag'):
+            self.assertEqual(get_policy('reject'), 'reject')
+            self.assertEqual(get_policy('off'), 'flag')
+            self.assertEqual(get_policy('bogus'), 'flag')
+
+    @override_settings(ACTIVITY_DUPLICATE_POLICY='reject')
+    def test_reject(self):
+        original = self.log()
+        self.assertEqual(original.status_code, 201)
+        for on_duplicate in [None, 'off', 'flag']:
+            response = self.log(on_duplicate)
+            self.assertEqual(response.status_code, 409, on_duplicate)
+            self.assertEqual(response.data['duplicate_of'], str(Activity.objects.get().id))
+        self.assertEqual(Activity.objects.count(), 1)
+
+    @override_settings(ACTIVITY_DUPLICATE_POLICY='flag')
+    def test_flag_allows_a_stricter_request(self):
+        self.assertEqual(self.log().status_code, 201)
+        self.assertEqual(self.log().status_code, 201)
+        flagged = Activity.objects.exclude(metadata={}).get()
+        self.assertEqual(flagged.metadata['duplicate_of'], str(Activity.objects.exclude(id=flagged.id).get().id))
+
+        self.assertEqual(self.log('reject').status_code, 409)
+        self.assertEqual(Activity.objects.count(), 2)
+
+    @override_settings(ACTIVITY_DUPLICATE_POLICY='reject')
+    def test_rejected_log_does_not_claim_the_fingerprint(self):
+        self.log()
+        self.log()
+        Activity.objects.get().delete()
+        self.assertEqual(self.log().status_code, 201)
+
+
+class ExportTests(ActivityTestCase):
+    def test_csv_and_ndjson_agree(self):
+        self.make_activity(
+            self.user, start_timestamp=timezone.now().replace(microsecond=123456),
+            latitude=Decimal('41.0082'), longitude=Decimal('28.9784'), notes='Commute, "rainy"'
+        )
+        self.make_activity(self.user, end_timestamp=timezone.now() + timedelta(minutes=30))
+        rows = list(export_rows(self.user))
+
+        from_csv = list(csv.DictReader(io.StringIO(''.join(iter_csv(rows)))))
+        from_ndjson = [json.loads(line) for line in ''.join(iter_ndjson(rows)).splitlines()]
+        self.assertEqual(len(from_csv), 2)
+        for csv_row, ndjson_row in zip(from_csv, from_ndjson):
+            self.assertEqual(csv_row, {name: '' if value is None else value for name, value in ndjson_row.items()})
+        self.assertTrue(from_csv[0]['start_timestamp'].endswith('.123456+00:00'))
+        self.assertIsNone(from_ndjson[0]['end_timestamp'])
+
+
+@override_settings(TEMPLATE_SUGGESTION_HALF_LIFE_DAYS=14)
+class SuggestionTests(ActivityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bus = ActivityTemplate.objects.create(
+            name='Bus ride', category=self.category, activity_type='bus_trip', default_unit='km'
+        )
+        self.car = ActivityTemplate.objects.create(
+            name='Car ride', category=self.category, activity_type='car_trip', default_unit='km'
+        )
+        self.train = ActivityTemplate.objects.create(
+            name='Train ride', category=self.category, activity_type='train_trip', default_unit='km'
+        )
+
+    def test_decay_halves_per_half_life(self):
+        now = timezone.now()
+        self.assertAlmostEqual(decayed(8.0, now - timedelta(days=14), now), 4.0)
+        self.assertAlmostEqual(decayed(8.0, now - timedelta(days=28), now), 2.0)
+        self.assertEqual(usage_weight(now + timedelta(days=1), now), 1.0)
+
+    def test_score_is_decayed_on_each_use(self):
+        now = timezone.now()
+        self.make_activity(self.user, start_timestamp=now - timedelta(days=14))
+        row = ActivityTypeScore.objects.get(user=self.user, activity_type='car_trip')
+        self.assertAlmostEqual(row.score, 0.5, places=3)
+
+        ActivityTypeScore.objects.filter(id=row.id).update(scored_at=row.scored_at - timedelta(days=14))
+        self.make_activity(self.user, start_timestamp=timezone.now())
+        row.refresh_from_db()
+        self.assertAlmostEqual(row.score, 1.25, places=3)
+        self.assertEqual(row.use_count, 2)
+
+    def test_recent_use_outranks_older_frequent_use(self):
+        old = timezone.now() - timedelta(days=60)
+        for _ in range(3):
+            self.make_activity(self.user, activity_type='car_trip', start_timestamp=old)
+        self.make_activity(self.user, activity_type='bus_trip')
+
+        suggestions = suggest_templates(self.user, limit=3)
+        self.assertEqual([item['template'] for item in suggestions], [self.bus, self.car, self.train])
+        self.assertEqual(suggestions[1]['use_count'], 3)
+        self.assertEqual((suggestions[2]['score'], suggestions[2]['use_count']), (0.0, 0))
+
+    def test_ranks_rows_scored_at_different_times(self):
+        # Higher stored score, but stored long ago
+        self.make_activity(self.user, activity_type='car_trip')
+        self.make_activity(self.user, activity_type='car_trip')
+        self.make_activity(self.user, activity_type='bus_trip')
+        ActivityTypeScore.objects.filter(activity_type='car_trip').update(
+            scored_at=timezone.now() - timedelta(days=28)
+        )
+        self.assertEqual(suggest_templates(self.user, limit=1)[0]['template'], self.bus)
+
+    def test_deleting_an_activity_removes_its_weight(self):
+        activity = self.make_activity(self.user)
+        self.make_activity(self.user)
+        activity.delete()
+        row = ActivityTypeScore.objects.get(user=self.user, activity_type='car_trip')
+        self.assertAlmostEqual(row.score, 1.0, places=3)
+        self.assertEqual(row.use_count, 1)
@@ -4,8 +4,14 @@ from . import views
 urlpatterns = [
     path('categories/', views.ActivityCategoryListView.as_view(), name='activity-categories'),
     path('templates/', views.ActivityTemplateListView.as_view(), name='activity-templates'),
+    path('templates/suggested/', views.suggested_templates, name='activity-templates-suggested'),
     path('', views.ActivityListCreateView.as_view(), name='activity-list-create'),
     path('<uuid:pk>/', views.ActivityDetailView.as_view(), name='activity-detail'),
     path('<uuid:activity_id>/recalculate/', views.recalculate_activity_co2, name='activity-recalculate'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('aggregates/', views.activity_aggregates, name='activity-aggregates'),
+    path('export/', views.export_activities, name='activity-export'),
+    path('geo/', views.ActivityBoundingBoxView.as_view(), name='activity-geo-bbox'),
+    path('geo/nearby/', views.nearby_activities, name='activity-geo-nearby'),
+    path('geo/heatmap/', views.activity_heatmap, name='activity-geo-heatmap'),
 ]
\ No newline at end of file
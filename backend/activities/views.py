@@ -1,34 +1,78 @@
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.http import StreamingHttpResponse
+from django.db.models.functions import Substr
 from django.utils import timezone
+from datetime import date, timedelta
+import math
+import uuid
 from django_filters.rest_framework import DjangoFilterBackend
+from . import geo
+from .aggregation import AggregationError, aggregate_activities, resolve_timezone
+from .dedupe import DuplicateDetector, get_policy
+from .export import EXPORT_FORMATS, stream_export
 from .models import ActivityCategory, Activity, ActivityTemplate
+from .projections import ProjectedListMixin
+from .reference_cache import ReferenceDataCacheMixin
 from .serializers import (
     ActivityCategorySerializer, ActivitySerializer, 
-    ActivityTemplateSerializer, ActivityCreateSerializer
+    ActivityTemplateSerializer, ActivityCreateSerializer,
+    ActivityTemplateSuggestionSerializer, ACTIVITY_LIST_PROJECTION
 )
+from .suggestions import DEFAULT_LIMIT, MAX_LIMIT, suggest_templates
 from carbon.engine import get_calculation_engine
 
 
-class ActivityCategoryListView(generics.ListAPIView):
+class ActivityCategoryListView(ReferenceDataCacheMixin, generics.ListAPIView):
     queryset = ActivityCategory.objects.filter(is_active=True)
     serializer_class = ActivityCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    reference_dataset = 'categories'
 
 
-class ActivityTemplateListView(generics.ListAPIView):
+class ActivityTemplateListView(ReferenceDataCacheMixin, generics.ListAPIView):
     serializer_class = ActivityTemplateSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['category', 'category__category_type']
+    reference_dataset = 'templates'
     
     def get_queryset(self):
-        return ActivityTemplate.objects.filter(is_active=True)
+        return ActivityTemplate.objects.filter(is_active=True).select_related('category')
 
 
-class ActivityListCreateView(generics.ListCreateAPIView):
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def suggested_templates(request):
+    """
+    Activity templates ranked by how often and how recently the user logs
+    their activity type. Optional ``category`` and ``limit``.
+    """
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    category = None
+    category_id = request.query_params.get('category')
+    if category_id:
+        category = ActivityCategory.objects.filter(id=category_id, is_active=True).first()
+        if not category:
+            return Response({'error': 'Category not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    suggestions = suggest_templates(request.user, category=category, limit=limit)
+    return Response({
+        'results': ActivityTemplateSuggestionSerializer(suggestions, many=True).data
+    })
+
+
+class ActivityListCreateView(ProjectedListMixin, generics.ListCreateAPIView):
     serializer_class = ActivitySerializer
+    projection = ACTIVITY_LIST_PROJECTION
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['category', 'category__category_type', 'co2_calculated']
@@ -37,29 +81,95 @@ class ActivityListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         return Activity.objects.filter(user=self.request.user)
     
+    duplicate_match = None
+    # Id of the activity being created, claimed in the duplicate detector before it exists
+    reserved_id = None
+    
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ActivityCreateSerializer
         return ActivitySerializer
     
-    def perform_create(self, serializer):
-        activity = serializer.save(user=self.request.user)
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        # Near-duplicate check against the user's recent fingerprints
+        policy = get_policy(request.query_params.get('on_duplicate'))
+        if policy != 'off':
+            self.reserved_id = uuid.uuid4()
+            self.duplicate_match = DuplicateDetector.reserve(
+                request.user.id, self.reserved_id, serializer.validated_data
+            )
+        
+        if self.duplicate_match and policy == 'reject':
+            DuplicateDetector.release(request.user.id, self.reserved_id, serializer.validated_data)
+            return Response(
+                {'error': 'Duplicate activity', 'duplicate_of': self.duplicate_match.activity_id},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        if self.duplicate_match and policy == 'merge':
+            existing = Activity.objects.filter(
+                id=self.duplicate_match.activity_id, user=request.user
+            ).first()
+            if existing:
+                DuplicateDetector.release(request.user.id, self.reserved_id, serializer.validated_data)
+                data = ActivitySerializer(existing).data
+                data['merged'] = True
+                return Response(data, status=status.HTTP_200_OK)
+            self.duplicate_match = None
         
-        # Trigger carbon calculation in background
-        # For now, do it synchronously
         try:
-            calculation_engine = get_calculation_engine()
-            result = calculation_engine.calculate(activity)
+            self.perform_create(serializer)
+        except Exception:
+            if self.reserved_id:
+                DuplicateDetector.release(request.user.id, self.reserved_id, serializer.validated_data)
+            raise
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+    
+    def perform_create(self, serializer):
+        extra = {}
+        if self.reserved_id:
+            extra['id'] = self.reserved_id
+        if self.duplicate_match:
+            extra['metadata'] = {
+                'duplicate_of': self.duplicate_match.activity_id,
+                'duplicate_seconds_apart': round(self.duplicate_match.seconds_apart, 1),
+            }
+        
+        # The activity and its social event commit together, the event is processed in the background
+        with transaction.atomic():
+            activity = serializer.save(user=self.request.user, **extra)
             
-            activity.co2_kg = result['co2_kg']
-            activity.co2_calculated = True
-            activity.save(update_fields=['co2_kg', 'co2_calculated'])
+            # Trigger carbon calculation in background
+            # For now, do it synchronously, in a savepoint so its failures cannot roll back the activity
+            try:
+                with transaction.atomic():
+                    calculation_engine = get_calculation_engine()
+                    result = calculation_engine.calculate(activity)
+                    
+                    activity.co2_kg = result['co2_kg']
+                    activity.co2_calculated = True
+                    activity.save(update_fields=['co2_kg', 'co2_calculated'])
+                
+            except Exception as e:
+                # Log error but don't fail the activity creation
+                import logging
+                logger = logging.getLogger(__name__)
+                logger.error(f"Failed to calculate carbon footprint for activity {activity.id}: {str(e)}")
+                activity.refresh_from_db(fields=['co2_kg', 'co2_calculated'])
             
-        except Exception as e:
-            # Log error but don't fail the activity creation
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Failed to calculate carbon footprint for activity {activity.id}: {str(e)}")
+            # Badges, challenges and leaderboards react to the new activity, via the outbox
+            if settings.ENABLE_SOCIAL_FEATURES:
+                from social.events import SocialEventHandler
+                SocialEventHandler.handle_activity_logged(
+                    self.request.user, activity, float(activity.co2_kg or 0)
+                )
+        
+        if not self.reserved_id:
+            DuplicateDetector.remember(activity)
 
 
 class ActivityDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -151,4 +261,235 @@ def recalculate_activity_co2(request, activity_id):
         return Response(
             {'error': f'Calculation failed: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+def _geo_scope_queryset(request):
+    """
+    Activities visible to an aggregated location query.
+    Defaults to the user's own activities; ``organization=<id>`` widens the
+    scope to the active members of an organization the user manages, leaving
+    out members whose privacy level is not public.
+    """
+    organization_id = request.query_params.get('organization')
+    if not organization_id:
+        return Activity.objects.filter(user=request.user)
+    
+    from corporate.models import OrganizationMember
+    from corporate.permissions import check_organization_permission
+    from corporate.utils import get_user_organizations
+    
+    organization = get_user_organizations(request.user).filter(id=organization_id).first()
+    if organization is None or not check_organization_permission(request.user, organization, 'manager'):
+        return None
+    
+    member_ids = OrganizationMember.objects.filter(
+        organization=organization,
+        status='active'
+    ).exclude(
+        user__settings__privacy_level__in=['friends', 'private']
+    ).values('user_id')
+    return Activity.objects.filter(user_id__in=member_ids)
+
+
+def _organization_scope_error(request):
+    """Raw location rows are only served for the user's own activities"""
+    if request.query_params.get('organization'):
+        return Response(
+            {'error': 'organization is only supported by the heatmap'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return None
+
+
+class ActivityBoundingBoxView(ProjectedListMixin, generics.ListAPIView):
+    """
+    Activities inside a bounding box.
+    ``bbox=min_lon,min_lat,max_lon,max_lat``
+    """
+    serializer_class = ActivitySerializer
+    projection = ACTIVITY_LIST_PROJECTION
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        bbox = geo.parse_bbox(self.request.query_params.get('bbox'))
+        if bbox is None:
+            return Activity.objects.none()
+        
+        return Activity.objects.filter(user=self.request.user).filter(geo.bbox_filter(*bbox))
+    
+    def list(self, request, *args, **kwargs):
+        error = _organization_scope_error(request)
+        if error is not None:
+            return error
+        if geo.parse_bbox(request.query_params.get('bbox')) is None:
+            return Response(
+                {'error': 'bbox must be min_lon,min_lat,max_lon,max_lat'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return super().list(request, *args, **kwargs)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def nearby_activities(request):
+    """
+    Activities within ``radius_km`` of ``lat``/``lon``, nearest first.
+    """
+    error = _organization_scope_error(request)
+    if error is not None:
+        return error
+    
+    try:
+        latitude = float(request.query_params['lat'])
+        longitude = float(request.query_params['lon'])
+        radius_km = float(request.query_params.get('radius_km', 1))
+        limit = max(1, min(int(request.query_params.get('limit', 100)), 500))
+    except (KeyError, ValueError):
+        return Response(
+            {'error': 'lat and lon are required numeric parameters'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not geo.is_valid_point(latitude, longitude):
+        return Response(
+            {'error': 'lat must be within [-90, 90] and lon within [-180, 180]'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not math.isfinite(radius_km) or radius_km <= 0:
+        return Response({'error': 'radius_km must be a positive number'}, status=status.HTTP_400_BAD_REQUEST)
+    radius_km = min(radius_km, 50.0)
+    
+    candidates = Activity.objects.filter(user=request.user).filter(
+        geo.bbox_filter(*geo.radius_bbox(latitude, longitude, radius_km))
+    ).select_related('category')
+    
+    results = []
+    for activity in candidates:
+        distance = geo.haversine_km(latitude, longitude, activity.latitude, activity.longitude)
+        if distance <= radius_km:
+            results.append((distance, activity))
+    results.sort(key=lambda item: item[0])
+    results = results[:limit]
+    
+    data = ActivitySerializer([activity for _, activity in results], many=True).data
+    for item, (distance, _) in zip(data, results):
+        item['distance_km'] = round(distance, 3)
+    
+    return Response({
+        'count': len(data),
+        'radius_km': radius_km,
+        'results': data
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def activity_heatmap(request):
+    """
+    Activity counts and CO2 totals per geohash cell inside a bounding box.
+    ``precision`` (1-9) controls the cell size, 6 is roughly a city block.
+    Organization managers can pass ``organization`` to map their members.
+    """
+    bbox = geo.parse_bbox(request.query_params.get('bbox'))
+    if bbox is None:
+        return Response(
+            {'error': 'bbox must be min_lon,min_lat,max_lon,max_lat'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        precision = max(1, min(int(request.query_params.get('precision', 6)), 9))
+    except ValueError:
+        precision = 6
+    
+    queryset = _geo_scope_queryset(request)
+    if queryset is None:
+        return Response({'error': 'Organization not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    cells = queryset.filter(geo.bbox_filter(*bbox)).annotate(
+        cell=Substr('geohash', 1, precision)
+    ).values('cell').annotate(
+        activity_count=Count('id'),
+        co2_kg=Sum('co2_kg')
+    ).order_by('cell')
+    
+    results = []
+    for cell in cells:
+        latitude, longitude = geo.decode(cell['cell'])
+        results.append({
+            'geohash': cell['cell'],
+            'latitude': round(latitude, 6),
+            'longitude': round(longitude, 6),
+            'activity_count': cell['activity_count'],
+            'co2_kg': round(float(cell['co2_kg'] or 0), 3),
+        })
+    
+    return Response({
+        'precision': precision,
+        'cells': results
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def activity_aggregates(request):
+    """
+    Time-bucketed CO2 totals for the current user.
+    ``bucket=hour|day|week|month``, optional ``group_by=category|activity_type``,
+    ``start``/``end`` local dates (YYYY-MM-DD) and ``tz`` (defaults to the profile timezone).
+    """
+    params = request.query_params
+    try:
+        tz = resolve_timezone(params.get('tz'), request.user)
+        today = timezone.now().astimezone(tz).date()
+        end = date.fromisoformat(params['end']) if params.get('end') else today
+        start = date.fromisoformat(params['start']) if params.get('start') else end - timedelta(days=29)
+        data = aggregate_activities(
+            request.user,
+            bucket=params.get('bucket', 'day'),
+            start=start,
+            end=end,
+            group_by=params.get('group_by') or None,
+            tz_name=tz.key,
+        )
+    except (AggregationError, ValueError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_activities(request):
+    """
+    Stream the current user's full activity history.
+    ``output=csv|ndjson`` and ``gzip=true`` for a compressed download.
+    """
+    from ecotrack.security import SecurityUtils
+    
+    export_format = request.query_params.get('output', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {'error': f"output must be one of {', '.join(EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    compress = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    SecurityUtils.log_security_event(
+        'data_export',
+        user=request.user,
+        details={'reason': 'activity_export', 'format': export_format}
+    )
+    
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"activities-{timezone.now():%Y%m%d}.{export_format}"
+    if compress:
+        content_type = 'application/gzip'
+        filename += '.gz'
+    
+    response = StreamingHttpResponse(
+        stream_export(request.user, export_format, compress),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,210 @@
+"""
+In-memory autocomplete index over emission factor activity types
+Built once per worker from the active factors and rebuilt when a shared
+version number (bumped by EmissionFactor signals) changes.
+"""
+import logging
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from ecotrack.cache import CacheManager, VersionedIndex
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = CacheManager.get_cache_key('emission_factors', 'autocomplete_version')
+DEFAULT_LIMIT = 10
+# Shortest word that resolves free text to the factor type containing it
+RESOLVE_MIN_TOKEN_LENGTH = 3
+
+# Scores by how a query matched an entry
+EXACT_SCORE = 1.0
+TYPE_PREFIX_SCORE = 0.8
+TOKEN_PREFIX_SCORE = 0.6
+SUBCATEGORY_PREFIX_SCORE = 0.5
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse separators, so 'Car_Petrol' == 'car petrol'"""
+    return _NON_WORD.sub(' ', (text or '').lower()).strip()
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IndexEntry(NamedTuple):
+    category: str
+    subcategory: str
+    activity_type: str
+    units: Tuple[str, ...]
+
+
+class ActivityTypeIndex:
+    """
+    Prefix and trigram index over (category, subcategory, activity_type).
+
+    Prefix lookups bisect a sorted term list; trigram lookups count shared
+    trigrams per entry and are only used when prefixes find too little.
+    """
+
+    def __init__(self, rows):
+        grouped = defaultdict(set)
+        for category, subcategory, activity_type, unit in rows:
+            grouped[(category, subcategory, activity_type)].add(unit)
+
+        self.entries: List[IndexEntry] = [
+            IndexEntry(category, subcategory, activity_type, tuple(sorted(units)))
+            for (category, subcategory, activity_type), units in sorted(grouped.items())
+        ]
+        self.normalized: List[str] = [normalize(entry.activity_type) for entry in self.entries]
+
+        terms = []
+        trigram_map = defaultdict(list)
+        for entry_id, (entry, name) in enumerate(zip(self.entries, self.normalized)):
+            tokens = name.split()
+            terms.append((name, TYPE_PREFIX_SCORE, entry_id))
+            for i in range(1, len(tokens)):
+                terms.append((' '.join(tokens[i:]), TOKEN_PREFIX_SCORE, entry_id))
+            subcategory = normalize(entry.subcategory).split()
+            for i in range(len(subcategory)):
+                terms.append((' '.join(subcategory[i:]), SUBCATEGORY_PREFIX_SCORE, entry_id))
+            for gram in trigrams(name):
+                trigram_map[gram].append(entry_id)
+
+        terms.sort()
+        self.terms = terms
+        self.term_keys = [term for term, _, _ in terms]
+        self.trigram_map = dict(trigram_map)
+        self.trigram_counts = [len(trigrams(name)) for name in self.normalized]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _prefix_matches(self, query: str, scores: Dict[int, float]):
+        i = bisect_left(self.term_keys, query)
+        while i < len(self.term_keys) and self.term_keys[i].startswith(query):
+            term, base, entry_id = self.terms[i]
+            if base == TYPE_PREFIX_SCORE and term == query:
+                score = EXACT_SCORE
+            else:
+                # Closer-length completions rank above long ones
+                score = base + 0.1 * len(query) / len(term)
+            if score > scores.get(entry_id, 0):
+                scores[entry_id] = score
+            i += 1
+
+    def _trigram_matches(self, query: str, scores: Dict[int, float]):
+        query_grams = trigrams(query)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for entry_id in self.trigram_map.get(gram, ()):
+                shared[entry_id] += 1
+        for entry_id, count in shared.items():
+            similarity = count / (len(query_grams) + self.trigram_counts[entry_id] - count)
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                score = similarity * TYPE_PREFIX_SCORE
+                if score > scores.get(entry_id, 0):
+                    scores[entry_id] = score
+
+    def search(self, query: str, category: Optional[str] = None,
+               limit: int = DEFAULT_LIMIT) -> List[Tuple[IndexEntry, float]]:
+        """Ranked (entry, score) matches for free text"""
+        query = normalize(query)
+        if not query:
+            return []
+
+        scores: Dict[int, float] = {}
+        self._prefix_matches(query, scores)
+        if len(scores) < limit:
+            self._trigram_matches(query, scores)
+
+        if category:
+            scores = {i: s for i, s in scores.items() if self.entries[i].category == category}
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], len(self.normalized[item[0]]), item[0]))
+        return [(self.entries[entry_id], round(score, 4)) for entry_id, score in ranked[:limit]]
+
+    def resolve(self, category: str, activity_type: str, subcategory: Optional[str] = None) -> Optional[str]:
+        """
+        The factor activity type that free text means, or None. Unlike search()
+        only whole names resolve: the full type name, or a trailing run of its
+        words (e.g. 'petrol' for 'car petrol'), since the result decides which
+        factor a calculation uses. Ties are broken by subcategory, ambiguous
+        text is left unresolved.
+        """
+        query = normalize(activity_type)
+        matches = defaultdict(set)
+        i = bisect_left(self.term_keys, query)
+        while query and i < len(self.term_keys) and self.term_keys[i] == query:
+            _, base, entry_id = self.terms[i]
+            entry = self.entries[entry_id]
+            if entry.category == category and (
+                base == TYPE_PREFIX_SCORE
+                or (base == TOKEN_PREFIX_SCORE and len(query) >= RESOLVE_MIN_TOKEN_LENGTH)
+            ):
+                matches[base].add(entry)
+            i += 1
+
+        for base in (TYPE_PREFIX_SCORE, TOKEN_PREFIX_SCORE):
+            best = {entry.activity_type for entry in matches[base]}
+            if len(best) > 1:
+                best = {entry.activity_type for entry in matches[base] if entry.subcategory == subcategory}
+            if best:
+                return best.pop() if len(best) == 1 else None
+        return None
+
+
+def _build_index() -> ActivityTypeIndex:
+    from .models import EmissionFactor
+
+    rows = EmissionFactor.objects.filter(is_active=True).values_list(
+        'category', 'subcategory', 'activity_type', 'unit'
+    )
+    index = ActivityTypeIndex(rows)
+    logger.info(f"Built activity type index with {len(index)} entries")
+    return index
+
+
+_index = VersionedIndex(VERSION_KEY, _build_index, 'AUTOCOMPLETE_VERSION_CHECK_SECONDS')
+
+
+def get_index() -> ActivityTypeIndex:
+    """
+    The worker's index. The shared version is checked at most every
+    AUTOCOMPLETE_VERSION_CHECK_SECONDS, so lookups normally touch no I/O.
+    """
+    return _index.get()
+
+
+def bump_version():
+    """Invalidate the index in every worker"""
+    _index.bump()
+
+
+def autocomplete(query: str, category: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> List[Dict]:
+    """Ranked activity type suggestions for an autocomplete box"""
+    return [
+        {
+            'activity_type': entry.activity_type,
+            'subcategory': entry.subcategory,
+            'category': entry.category,
+            'units': list(entry.units),
+            'score': score,
+        }
+        for entry, score in get_index().search(query, category=category, limit=limit)
+    ]
+
+
+def resolve_activity_type(category: str, activity_type: str, subcategory: Optional[str] = None) -> str:
+    """Canonical factor activity type for free text, or the text unchanged"""
+    try:
+        return get_index().resolve(category, activity_type, subcategory) or activity_type
+    except Exception as e:
+        logger.warning(f"Activity type resolution failed for {activity_type!r}: {str(e)}")
+        return activity_type
@@ -2,6 +2,7 @@ import logging
 from decimal import Decimal
 from typing import Dict, Any, Optional, Tuple
 from django.db.models import Q
+from .autocomplete import resolve_activity_type
 from .models import EmissionFactor, UnitConversion, CarbonCalculation, CalculationLog
 
 logger = logging.getLogger(__name__)
@@ -36,11 +37,17 @@ class CarbonCalculationEngine:
                 activity.category.category_type
             )
             
-            # Step 2: Find best emission factor
+            # Step 2: Find best emission factor, for the known factor type free text names
+            activity_type = resolve_activity_type(
+                activity.category.category_type, activity.activity_type, activity.category.name
+            )
+            if activity_type != activity.activity_type:
+                logger.info(f"Resolved activity type {activity.activity_type!r} to {activity_type!r} for activity {activity.id}")
+            
             emission_factor = self._find_emission_factor(
                 category=activity.category.category_type,
                 subcategory=activity.category.name,
-                activity_type=activity.activity_type,
+                activity_type=activity_type,
                 unit=normalized_unit,
                 region=user_region
             )
@@ -50,7 +57,7 @@ class CarbonCalculationEngine:
                 emission_factor = self._find_emission_factor(
                     category=activity.category.category_type,
                     subcategory=activity.category.name,
-                    activity_type=activity.activity_type,
+                    activity_type=activity_type,
                     unit=normalized_unit,
                     region='global'
                 )
@@ -81,7 +88,8 @@ class CarbonCalculationEngine:
                 metadata={
                     'version': self.calculation_version,
                     'region': user_region,
-                    'fallback_used': user_region != emission_factor.region
+                    'fallback_used': user_region != emission_factor.region,
+                    'resolved_activity_type': activity_type if activity_type != activity.activity_type else None
                 }
             )
             
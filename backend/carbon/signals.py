@@ -0,0 +1,15 @@
+"""
+Signal handlers for emission factor caches
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import bump_version
+from .models import EmissionFactor
+
+
+@receiver([post_save, post_delete], sender=EmissionFactor)
+def invalidate_activity_type_index(sender, **kwargs):
+    """Factors changed, rebuild the autocomplete index once committed"""
+    transaction.on_commit(bump_version)
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('activity-types/autocomplete/', views.activity_type_autocomplete, name='activity-type-autocomplete'),
+]
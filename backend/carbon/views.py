@@ -1,3 +1,30 @@
-from django.shortcuts import render
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
 
-# Create your views here.
+from .autocomplete import DEFAULT_LIMIT, autocomplete
+from .models import EmissionFactor
+
+MAX_LIMIT = 50
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def activity_type_autocomplete(request):
+    """
+    Ranked emission factor activity types for free text ``q``.
+    Optional ``category`` (category type) and ``limit``.
+    """
+    query = request.query_params.get('q', '')
+    category = request.query_params.get('category') or None
+    if category and category not in dict(EmissionFactor.CATEGORY_CHOICES):
+        return Response({'error': 'Unknown category'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'query': query,
+        'results': autocomplete(query, category=category, limit=limit)
+    })
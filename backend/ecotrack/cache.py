@@ -3,6 +3,8 @@ Advanced caching layer for EcoTrack
 Implements Redis-based caching with smart invalidation
 """
 import json
+import threading
+import time
 from functools import wraps
 from django.core.cache import cache
 from django.conf import settings
@@ -174,6 +176,70 @@ class ActivityCacheInvalidator:
         cls.on_activity_created(user_id)  # Same invalidation pattern
 
 
+class SharedVersion:
+    """
+    A version number shared by every worker through the cache. Worker-local
+    data remembers the version it was built for, bumping the version makes
+    every worker rebuild it.
+    """
+    
+    def __init__(self, key):
+        self.key = key
+    
+    def current(self):
+        """The shared version, one cache read and no DB access"""
+        version = cache.get(self.key)
+        if version is None:
+            version = 1
+            cache.add(self.key, version, None)
+        return version
+    
+    def bump(self):
+        try:
+            cache.incr(self.key)
+        except ValueError:
+            cache.set(self.key, 2, None)
+
+
+class VersionedIndex:
+    """
+    A worker-local object (e.g. an index over reference rows) made by
+    ``build`` and rebuilt when its shared version changes. The version is
+    checked at most every ``check_setting`` seconds, so reads normally touch
+    no I/O.
+    """
+    
+    def __init__(self, key, build, check_setting, default_interval=5):
+        self.version = SharedVersion(key)
+        self.build = build
+        self.check_setting = check_setting
+        self.default_interval = default_interval
+        self._lock = threading.Lock()
+        self._state = {'index': None, 'version': None, 'checked_at': 0.0}
+    
+    def get(self):
+        now = time.monotonic()
+        index = self._state['index']
+        interval = getattr(settings, self.check_setting, self.default_interval)
+        if index is not None and now - self._state['checked_at'] < interval:
+            return index
+        
+        version = self.version.current()
+        with self._lock:
+            if self._state['index'] is None or self._state['version'] != version:
+                self._state['index'] = self.build()
+                self._state['version'] = version
+            self._state['checked_at'] = now
+            return self._state['index']
+    
+    def bump(self):
+        """Invalidate the index in every worker"""
+        self.version.bump()
+        with self._lock:
+            self._state['index'] = None
+            self._state['checked_at'] = 0.0
+
+
 # Convenience functions for common caching patterns
 def cache_user_dashboard(user_id, data, timeout=900):
     """Cache user dashboard data"""
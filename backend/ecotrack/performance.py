@@ -272,28 +272,33 @@ class BackgroundTaskOptimizer:
         Update user stats in batches
         """
         from django.contrib.auth import get_user_model
+        from social.models import UserStats
         from social.services import SocialService
         
         User = get_user_model()
         
+        # Users without a stats row get one first
+        missing = list(User.objects.filter(social_stats__isnull=True).values_list('id', flat=True))
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user_id) for user_id in missing],
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+        
         # Get users who need stats updates
         cutoff_time = timezone.now() - timedelta(hours=24)
-        users_to_update = User.objects.filter(
-            models.Q(social_stats__last_updated__lt=cutoff_time) |
-            models.Q(social_stats__isnull=True)
-        ).values_list('id', flat=True)
+        stale_ids = list(UserStats.objects.filter(
+            models.Q(last_updated__lt=cutoff_time) | models.Q(user_id__in=missing)
+        ).values_list('id', flat=True))
         
         updated_count = 0
-        for i in range(0, len(users_to_update), batch_size):
-            batch = users_to_update[i:i+batch_size]
-            
-            for user_id in batch:
-                try:
-                    user = User.objects.get(id=user_id)
-                    SocialService.update_user_stats(user)
-                    updated_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to update stats for user {user_id}: {e}")
+        for i in range(0, len(stale_ids), batch_size):
+            try:
+                updated_count += SocialService.recompute_stats(
+                    UserStats.objects.filter(id__in=stale_ids[i:i + batch_size])
+                )
+            except Exception as e:
+                logger.error(f"Failed to update stats batch at offset {i}: {e}")
         
         logger.info(f"Updated stats for {updated_count} users")
         return updated_count
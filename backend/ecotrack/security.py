@@ -127,6 +127,7 @@ class DataPrivacyManager:
                 location_name='Anonymized',
                 latitude=None,
                 longitude=None,
+                geohash='',
                 notes='Data anonymized upon user request'
             )
             
@@ -169,8 +170,8 @@ class DataPrivacyManager:
             
             # Get activities
             from activities.models import Activity
-            activities = Activity.objects.filter(user=user)
-            for activity in activities:
+            activities = Activity.objects.filter(user=user).select_related('category')
+            for activity in activities.iterator(chunk_size=2000):
                 user_data['activities'].append({
                     'id': str(activity.id),
                     'category': activity.category.name,
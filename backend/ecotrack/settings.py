@@ -2,6 +2,7 @@ import os
 import environ
 from pathlib import Path
 from datetime import timedelta
+from celery.schedules import crontab
 
 env = environ.Env(
     DEBUG=(bool, False)
@@ -176,6 +177,36 @@ CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 60
 CELERY_WORKER_SEND_TASK_EVENTS = True
 CELERY_TASK_SEND_SENT_EVENT = True
+CELERY_BEAT_SCHEDULE = {
+    'persist-leaderboards': {
+        'task': 'social.tasks.persist_leaderboards',
+        'schedule': env.int('LEADERBOARD_PERSIST_INTERVAL', default=300),
+    },
+    'rollover-leaderboards': {
+        'task': 'social.tasks.rollover_leaderboards',
+        'schedule': crontab(hour=0, minute=0),
+    },
+    'rebuild-streaks': {
+        'task': 'social.tasks.rebuild_streaks',
+        'schedule': crontab(minute=5),
+    },
+    'compact-leaderboard-history': {
+        'task': 'social.tasks.compact_leaderboard_history',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    'process-social-events': {
+        'task': 'social.tasks.process_social_events',
+        'schedule': env.int('SOCIAL_EVENT_SWEEP_INTERVAL', default=60),
+    },
+    'purge-social-events': {
+        'task': 'social.tasks.purge_social_events',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'rebuild-leaderboards-nightly': {
+        'task': 'social.tasks.rebuild_all_leaderboards',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
 
 CACHES = {
     'default': {
@@ -235,6 +266,51 @@ ENABLE_AI_RECOMMENDATIONS = env.bool('ENABLE_AI_RECOMMENDATIONS', default=True)
 ENABLE_SOCIAL_FEATURES = env.bool('ENABLE_SOCIAL_FEATURES', default=True)
 ENABLE_CORPORATE_FEATURES = env.bool('ENABLE_CORPORATE_FEATURES', default=False)
 
+# Reference data (activity categories/templates) HTTP caching
+REFERENCE_DATA_MAX_AGE = env.int('REFERENCE_DATA_MAX_AGE', default=0)
+
+# Serve activity aggregates from the per-day UserMetrics rollups (kept current by activity signals)
+ACTIVITY_DAILY_ROLLUPS = env.bool('ACTIVITY_DAILY_ROLLUPS', default=True)
+
+# Near-duplicate activity detection: off, flag, reject or merge
+ACTIVITY_DUPLICATE_POLICY = env('ACTIVITY_DUPLICATE_POLICY', default='flag')
+ACTIVITY_DUPLICATE_WINDOW_SECONDS = env.int('ACTIVITY_DUPLICATE_WINDOW_SECONDS', default=600)
+ACTIVITY_DUPLICATE_TTL = env.int('ACTIVITY_DUPLICATE_TTL', default=86400)
+
+# Half-life of activity type usage when ranking template suggestions
+TEMPLATE_SUGGESTION_HALF_LIFE_DAYS = env.int('TEMPLATE_SUGGESTION_HALF_LIFE_DAYS', default=14)
+
+# How often workers check whether the activity type autocomplete index is stale
+AUTOCOMPLETE_VERSION_CHECK_SECONDS = env.int('AUTOCOMPLETE_VERSION_CHECK_SECONDS', default=5)
+
+# How often workers check whether the badge evaluation index is stale
+BADGE_INDEX_VERSION_CHECK_SECONDS = env.int('BADGE_INDEX_VERSION_CHECK_SECONDS', default=5)
+
+# Live leaderboard scores (Redis sorted sets), persisted to LeaderboardEntry by celery beat
+LEADERBOARD_STORE_BACKEND = env('LEADERBOARD_STORE_BACKEND', default='social.leaderboard_store.RedisLeaderboardStore')
+# Seconds to coalesce leaderboard updates from logged activities (0 updates synchronously)
+LEADERBOARD_UPDATE_INTERVAL = env.int('LEADERBOARD_UPDATE_INTERVAL', default=30)
+# Seconds a serialized leaderboard snapshot is shared by WebSocket consumers
+LEADERBOARD_SNAPSHOT_INTERVAL = env.int('LEADERBOARD_SNAPSHOT_INTERVAL', default=5)
+# Seconds within which a 'refresh' on a leaderboard connection gets the snapshot it was last sent
+LEADERBOARD_REFRESH_THROTTLE_SECONDS = env.int('LEADERBOARD_REFRESH_THROTTLE_SECONDS', default=5)
+
+# Precomputed social feed timelines (Redis sorted sets), filled on feed item creation
+TIMELINE_STORE_BACKEND = env('TIMELINE_STORE_BACKEND', default='social.timelines.RedisTimelineStore')
+# Newest items kept per timeline
+TIMELINE_MAX_LENGTH = env.int('TIMELINE_MAX_LENGTH', default=1000)
+# Repeated badge and challenge events within this many minutes share one feed item
+FEED_AGGREGATION_WINDOW_MINUTES = env.int('FEED_AGGREGATION_WINDOW_MINUTES', default=60)
+
+# Social event outbox: seconds to gather events before a worker runs (a beat sweep catches stragglers)
+SOCIAL_EVENT_DELAY = env.int('SOCIAL_EVENT_DELAY', default=2)
+# Events claimed per worker run, grouped per user
+SOCIAL_EVENT_BATCH_SIZE = env.int('SOCIAL_EVENT_BATCH_SIZE', default=500)
+# Failed events are retried this many times, then left for inspection
+SOCIAL_EVENT_MAX_ATTEMPTS = env.int('SOCIAL_EVENT_MAX_ATTEMPTS', default=5)
+# Days processed events are kept
+SOCIAL_EVENT_RETENTION_DAYS = env.int('SOCIAL_EVENT_RETENTION_DAYS', default=7)
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
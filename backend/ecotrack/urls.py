@@ -27,6 +27,7 @@ def api_root(request):
         'endpoints': {
             'auth': '/api/v1/auth/',
             'activities': '/api/v1/activities/',
+            'carbon': '/api/v1/carbon/',
             'ai': '/api/v1/ai/',
             'social': '/api/v1/social/',
             'corporate': '/api/v1/corporate/',
@@ -47,6 +48,7 @@ urlpatterns = [
     # API endpoints
     path('api/v1/auth/', include('users.urls')),
     path('api/v1/activities/', include('activities.urls')),
+    path('api/v1/carbon/', include('carbon.urls')),
     path('api/v1/ai/', include('ai_recommendations.urls')),
     path('api/v1/social/', include('social.urls')),
     path('api/v1/corporate/', include('corporate.urls')),
@@ -0,0 +1,228 @@
+"""
+Indexed badge evaluation
+Active badges are indexed per worker by (criteria_type, criteria_period)
+with thresholds sorted, so finding every badge a user qualifies for is one
+bisect per criteria. The index is rebuilt when a shared version number
+(bumped by Badge signals) changes.
+"""
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.core.cache import cache
+from django.db import models, transaction
+
+from ecotrack.cache import CacheManager, VersionedIndex
+from .models import Badge, UserBadge, UserStats
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = CacheManager.get_cache_key('badges', 'index_version')
+EVALUATION_SCHEDULED_KEY = CacheManager.get_cache_key('badges', 'evaluation_scheduled')
+EVALUATION_BATCH_SIZE = 500
+# Seconds between a badge definition change and re-evaluating every user
+EVALUATION_DELAY = 60
+
+# UserStats field holding the value each criteria is measured against
+CRITERIA_FIELDS = {
+    ('activity_count', None): 'total_activities',
+    ('co2_reduction', 'all_time'): 'total_co2_saved',
+    ('co2_reduction', 'monthly'): 'monthly_co2_saved',
+    ('co2_reduction', 'weekly'): 'weekly_co2_saved',
+    ('streak_days', None): 'current_streak',
+    ('challenge_completion', None): 'challenges_completed',
+    ('social_engagement', None): 'badges_earned',
+}
+STATS_FIELDS = sorted(set(CRITERIA_FIELDS.values()))
+
+
+def criteria_field(criteria_type: str, criteria_period: str) -> Optional[str]:
+    """Stats field for a badge's criteria, None if it cannot be measured"""
+    return CRITERIA_FIELDS.get((criteria_type, criteria_period)) or CRITERIA_FIELDS.get((criteria_type, None))
+
+
+class BadgeIndex:
+    """Sorted badge thresholds per stats field"""
+
+    def __init__(self, badges: Iterable[Badge]):
+        grouped = defaultdict(list)
+        for badge in badges:
+            field = criteria_field(badge.criteria_type, badge.criteria_period)
+            if field:
+                grouped[field].append((badge.criteria_value, str(badge.id), badge))
+
+        self.thresholds: Dict[str, List[float]] = {}
+        self.badges: Dict[str, List[Badge]] = {}
+        for field, rows in grouped.items():
+            rows.sort(key=lambda row: (row[0], row[1]))
+            self.thresholds[field] = [threshold for threshold, _, _ in rows]
+            self.badges[field] = [badge for _, _, badge in rows]
+
+    def __len__(self):
+        return sum(len(badges) for badges in self.badges.values())
+
+    def crossed(self, field: str, value: float) -> List[Badge]:
+        """Badges on a field whose threshold the value reaches"""
+        thresholds = self.thresholds.get(field)
+        if not thresholds:
+            return []
+        return self.badges[field][:bisect_right(thresholds, value)]
+
+    def evaluate(self, values: Dict[str, float], earned: Set[str]) -> List[Tuple[Badge, float]]:
+        """
+        New (badge, value) awards for one user's stat values. Engagement
+        badges count badges, so they are re-checked after each round of awards.
+        """
+        awards = []
+        earned = set(earned)
+        for field in self.thresholds:
+            if field == 'badges_earned':
+                continue
+            for badge in self.crossed(field, values.get(field) or 0):
+                if str(badge.id) not in earned:
+                    earned.add(str(badge.id))
+                    awards.append((badge, values[field]))
+
+        badge_count = (values.get('badges_earned') or 0) + len(awards)
+        while True:
+            new = [
+                badge for badge in self.crossed('badges_earned', badge_count)
+                if str(badge.id) not in earned
+            ]
+            if not new:
+                return awards
+            for badge in new:
+                earned.add(str(badge.id))
+                awards.append((badge, badge_count))
+            badge_count += len(new)
+
+
+def _build_index() -> BadgeIndex:
+    index = BadgeIndex(Badge.objects.filter(is_active=True))
+    logger.info(f"Built badge index with {len(index)} badges")
+    return index
+
+
+_index = VersionedIndex(VERSION_KEY, _build_index, 'BADGE_INDEX_VERSION_CHECK_SECONDS')
+
+
+def get_index() -> BadgeIndex:
+    """The worker's index, re-checked against the shared version every few seconds"""
+    return _index.get()
+
+
+def bump_version():
+    """Invalidate the index in every worker"""
+    _index.bump()
+
+
+def _write_awards(awards: Dict[str, List[Tuple[Badge, float]]]) -> Dict[str, List[Tuple[Badge, float]]]:
+    """
+    One bulk insert for every award and one UPDATE for every affected user's
+    stats. Callers hold the users' stats row locks, so awards already in the
+    table are dropped here and the rest are counted exactly once. Returns the
+    awards written.
+    """
+    existing = {
+        (str(user_id), str(badge_id))
+        for user_id, badge_id in UserBadge.objects.filter(user_id__in=list(awards)).values_list('user_id', 'badge_id')
+    }
+    new_awards = {}
+    for user_id, user_awards in awards.items():
+        user_awards = [(badge, value) for badge, value in user_awards if (user_id, str(badge.id)) not in existing]
+        if user_awards:
+            new_awards[user_id] = user_awards
+    awards = new_awards
+    if not awards:
+        return {}
+
+    UserBadge.objects.bulk_create(
+        [
+            UserBadge(user_id=user_id, badge=badge, progress_value=value)
+            for user_id, user_awards in awards.items()
+            for badge, value in user_awards
+        ],
+        batch_size=EVALUATION_BATCH_SIZE
+    )
+
+    def per_user(field, amount):
+        return models.Case(
+            *[
+                models.When(user_id=user_id, then=models.F(field) + amount(user_awards))
+                for user_id, user_awards in awards.items()
+            ],
+            default=models.F(field)
+        )
+
+    UserStats.objects.filter(user_id__in=list(awards)).update(
+        badges_earned=per_user('badges_earned', len),
+        total_badge_points=per_user(
+            'total_badge_points', lambda user_awards: sum(badge.points for badge, _ in user_awards)
+        ),
+    )
+    return awards
+
+
+def evaluate_user(user) -> List[Badge]:
+    """Award every badge a user newly qualifies for, returns the new badges"""
+    index = get_index()
+    if not len(index):
+        return []
+
+    with transaction.atomic():
+        # Locking the stats row keeps concurrent evaluations from double counting
+        values = UserStats.objects.select_for_update().filter(user=user).values(*STATS_FIELDS).first()
+        if values is None:
+            return []
+        earned = {
+            str(badge_id) for badge_id in UserBadge.objects.filter(user=user).values_list('badge_id', flat=True)
+        }
+        awards = index.evaluate(values, earned)
+        if awards:
+            awards = _write_awards({str(user.id): awards}).get(str(user.id), [])
+
+    for badge, _ in awards:
+        logger.info(f"Badge '{badge.name}' awarded to user {user.email}")
+    return [badge for badge, _ in awards]
+
+
+def evaluate_all_users(batch_size: int = EVALUATION_BATCH_SIZE) -> Dict[str, List[Badge]]:
+    """
+    Evaluate every user in chunks, for after badge definitions change.
+    Returns the new badges per user id.
+    """
+    cache.delete(EVALUATION_SCHEDULED_KEY)
+    index = get_index()
+    if not len(index):
+        return {}
+
+    user_ids = list(UserStats.objects.order_by('user_id').values_list('user_id', flat=True))
+    new_badges = {}
+    for i in range(0, len(user_ids), batch_size):
+        chunk = user_ids[i:i + batch_size]
+        # Locks the chunk's stats rows like evaluate_user, so concurrent evaluations wait
+        with transaction.atomic():
+            rows = list(
+                UserStats.objects.select_for_update().filter(user_id__in=chunk).order_by('user_id').values(
+                    'user_id', *STATS_FIELDS
+                )
+            )
+            earned = defaultdict(set)
+            for user_id, badge_id in UserBadge.objects.filter(user_id__in=chunk).values_list('user_id', 'badge_id'):
+                earned[str(user_id)].add(str(badge_id))
+
+            awards = {}
+            for values in rows:
+                user_id = str(values['user_id'])
+                user_awards = index.evaluate(values, earned[user_id])
+                if user_awards:
+                    awards[user_id] = user_awards
+            if awards:
+                awards = _write_awards(awards)
+
+        for user_id, user_awards in awards.items():
+            new_badges[user_id] = [badge for badge, _ in user_awards]
+
+    logger.info(f"Evaluated badges for {len(user_ids)} users, {len(new_badges)} earned new badges")
+    return new_badges
@@ -0,0 +1,210 @@
+"""
+Challenge progress engine
+All of a user's active challenges are measured by one conditional
+aggregate over their activities in the union of the challenge windows,
+and written back with one bulk_update.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import Challenge, ChallengeParticipation, UserStats
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FIELDS = ['current_progress', 'progress_percentage', 'is_completed', 'completed_at']
+RECOMPUTE_BATCH_SIZE = 2000
+# Challenge fields that change how progress is measured
+RULE_FIELDS = ['goal_type', 'goal_value', 'start_date', 'end_date', 'metadata', 'is_active']
+# Goals measured from the user's current streak rather than their activities
+STREAK_GOALS = {'streak_days'}
+
+
+def activity_filter(challenge: Challenge) -> models.Q:
+    """Activities counting towards a challenge"""
+    condition = models.Q(created_at__gte=challenge.start_date, created_at__lte=challenge.end_date)
+    if challenge.goal_type == 'category_focus':
+        target_category = challenge.metadata.get('target_category', 'transportation')
+        condition &= models.Q(category__category_type=target_category)
+    return condition
+
+
+def progress_aggregate(challenge: Challenge) -> Optional[models.Aggregate]:
+    """Aggregate measuring a challenge's goal over activities, None for streak goals"""
+    condition = activity_filter(challenge)
+    if challenge.goal_type in ('activity_count', 'category_focus'):
+        return models.Count('id', filter=condition)
+    if challenge.goal_type == 'co2_reduction':
+        return models.Sum('co2_kg', filter=condition)
+    return None
+
+
+def activity_delta(challenge: Challenge, activity, carbon_saved: float) -> float:
+    """How much one newly logged activity moves a challenge's progress"""
+    if activity.created_at and not challenge.start_date <= activity.created_at <= challenge.end_date:
+        return 0.0
+    if challenge.goal_type == 'activity_count':
+        return 1.0
+    if challenge.goal_type == 'co2_reduction':
+        return float(carbon_saved or 0)
+    if challenge.goal_type == 'category_focus':
+        target_category = challenge.metadata.get('target_category', 'transportation')
+        return 1.0 if activity.category.category_type == target_category else 0.0
+    return 0.0
+
+
+def set_progress(participation: ChallengeParticipation, value: float, now: datetime) -> bool:
+    """Set a participation's progress in memory, True if it just completed"""
+    goal = participation.challenge.goal_value
+    participation.current_progress = value
+    participation.progress_percentage = min(value / goal * 100, 100) if goal else 100
+    if participation.progress_percentage >= 100 and not participation.is_completed:
+        participation.is_completed = True
+        participation.completed_at = now
+        return True
+    return False
+
+
+def active_participations(user, lock: bool = False) -> List[ChallengeParticipation]:
+    now = timezone.now()
+    participations = ChallengeParticipation.objects.filter(
+        user=user,
+        is_active=True,
+        challenge__is_active=True,
+        challenge__start_date__lte=now,
+        challenge__end_date__gte=now
+    ).select_related('challenge')
+    if lock:
+        participations = participations.select_for_update(of=('self',))
+    return list(participations)
+
+
+def _current_streak(user) -> float:
+    return UserStats.objects.filter(user=user).values_list('current_streak', flat=True).first() or 0
+
+
+def _streak_progress(participation: ChallengeParticipation, streak: float) -> float:
+    """Streak goals keep the best streak reached, a broken streak does not undo progress"""
+    return max(float(streak), participation.current_progress)
+
+
+def _save(participations: List[ChallengeParticipation], values: Dict[str, float]) -> List[Challenge]:
+    """Write changed progress back in one bulk_update, returns newly completed challenges"""
+    now = timezone.now()
+    changed = []
+    completed = []
+    for participation in participations:
+        value = values.get(str(participation.id), participation.current_progress)
+        if value == participation.current_progress:
+            continue
+        if set_progress(participation, value, now):
+            completed.append(participation.challenge)
+        changed.append(participation)
+    if changed:
+        ChallengeParticipation.objects.bulk_update(changed, PROGRESS_FIELDS)
+    return completed
+
+
+def recompute_user(user) -> List[Challenge]:
+    """Recompute a user's progress in every active challenge from their activities"""
+    from activities.models import Activity
+
+    with transaction.atomic():
+        participations = active_participations(user, lock=True)
+        if not participations:
+            return []
+
+        aggregates = {}
+        for participation in participations:
+            aggregate = progress_aggregate(participation.challenge)
+            if aggregate is not None:
+                aggregates[f'p{len(aggregates)}'] = (participation, aggregate)
+
+        values = {}
+        if aggregates:
+            totals = Activity.objects.filter(
+                user=user,
+                created_at__gte=min(p.challenge.start_date for p, _ in aggregates.values()),
+                created_at__lte=max(p.challenge.end_date for p, _ in aggregates.values()),
+            ).aggregate(**{key: aggregate for key, (_, aggregate) in aggregates.items()})
+            for key, (participation, _) in aggregates.items():
+                values[str(participation.id)] = float(totals[key] or 0)
+
+        if any(p.challenge.goal_type in STREAK_GOALS for p in participations):
+            streak = _current_streak(user)
+            for participation in participations:
+                if participation.challenge.goal_type in STREAK_GOALS:
+                    values[str(participation.id)] = _streak_progress(participation, streak)
+
+        return _save(participations, values)
+
+
+def apply_activity(user, activity, carbon_saved: float) -> List[Challenge]:
+    """Move a user's active challenges forward by one logged activity, without re-aggregating"""
+    with transaction.atomic():
+        participations = active_participations(user, lock=True)
+        if not participations:
+            return []
+
+        streak = None
+        values = {}
+        for participation in participations:
+            challenge = participation.challenge
+            if challenge.goal_type in STREAK_GOALS:
+                if streak is None:
+                    streak = _current_streak(user)
+                values[str(participation.id)] = _streak_progress(participation, streak)
+            else:
+                delta = activity_delta(challenge, activity, carbon_saved)
+                if delta:
+                    values[str(participation.id)] = participation.current_progress + delta
+
+        return _save(participations, values)
+
+
+def recompute_challenge(challenge: Challenge) -> List:
+    """
+    Recompute every active participant of one challenge, e.g. after its rules
+    or dates change. Progress comes from one aggregate grouped by user and is
+    written in bulk_update batches. Returns the user ids that just completed.
+    """
+    from activities.models import Activity
+
+    participants = ChallengeParticipation.objects.filter(challenge=challenge, is_active=True)
+    aggregate = progress_aggregate(challenge)
+    if aggregate is None:
+        values = dict(UserStats.objects.filter(
+            user__in=participants.values('user')
+        ).values_list('user_id', 'current_streak'))
+    else:
+        values = dict(Activity.objects.filter(
+            activity_filter(challenge),
+            user__in=participants.values('user')
+        ).values('user').annotate(progress=aggregate).values_list('user', 'progress'))
+
+    now = timezone.now()
+    completed = []
+    batch = []
+    with transaction.atomic():
+        for participation in participants.only('id', 'user_id', *PROGRESS_FIELDS).iterator(chunk_size=RECOMPUTE_BATCH_SIZE):
+            participation.challenge = challenge
+            before = (participation.current_progress, participation.progress_percentage)
+            value = float(values.get(participation.user_id) or 0)
+            if aggregate is None:
+                value = _streak_progress(participation, value)
+            if set_progress(participation, value, now):
+                completed.append(participation.user_id)
+            elif (participation.current_progress, participation.progress_percentage) == before:
+                continue
+            batch.append(participation)
+            if len(batch) >= RECOMPUTE_BATCH_SIZE:
+                ChallengeParticipation.objects.bulk_update(batch, PROGRESS_FIELDS)
+                batch = []
+        if batch:
+            ChallengeParticipation.objects.bulk_update(batch, PROGRESS_FIELDS)
+
+    logger.info(f"Recomputed challenge {challenge.title}: {len(completed)} newly completed")
+    return completed
@@ -3,12 +3,16 @@ WebSocket Consumers for Real-time Social Features
 """
 import json
 import logging
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.auth import login
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.utils import timezone
 from asgiref.sync import sync_to_async
 
+from .snapshots import snapshots
+
 logger = logging.getLogger(__name__)
 
 
@@ -123,7 +127,12 @@ class LeaderboardConsumer(AsyncWebsocketConsumer):
             message_type = data.get('type', 'unknown')
             
             if message_type == 'refresh':
-                await self.send_leaderboard_data()
+                # Refreshing faster than snapshots are rebuilt gets the snapshot already sent
+                throttle = getattr(settings, 'LEADERBOARD_REFRESH_THROTTLE_SECONDS', 5)
+                if time.monotonic() - self.last_sent_at < throttle:
+                    await self.send(text_data=self.last_sent)
+                else:
+                    await self.send_leaderboard_data()
             elif message_type == 'ping':
                 await self.send(text_data=json.dumps({
                     'type': 'pong',
@@ -133,50 +142,11 @@ class LeaderboardConsumer(AsyncWebsocketConsumer):
         except json.JSONDecodeError:
             logger.error(f"Invalid JSON received: {text_data}")
     
-    @sync_to_async
-    def get_leaderboard_data(self):
-        """Fetch current leaderboard data"""
-        from .models import Leaderboard, LeaderboardEntry
-        
-        try:
-            # Get the leaderboard configuration
-            leaderboard = Leaderboard.objects.filter(
-                leaderboard_type=self.leaderboard_type,
-                is_active=True
-            ).first()
-            
-            if not leaderboard:
-                return []
-            
-            # Get top entries
-            entries = LeaderboardEntry.objects.filter(
-                leaderboard=leaderboard
-            ).select_related('user')[:20]
-            
-            return [
-                {
-                    'rank': entry.rank,
-                    'user_id': str(entry.user.id),
-                    'username': entry.user.username,
-                    'score': entry.score,
-                    'rank_change': entry.rank_change
-                }
-                for entry in entries
-            ]
-        except Exception as e:
-            logger.error(f"Error fetching leaderboard data: {e}")
-            return []
-    
     async def send_leaderboard_data(self):
-        """Send current leaderboard data to client"""
-        leaderboard_data = await self.get_leaderboard_data()
-        
-        await self.send(text_data=json.dumps({
-            'type': 'leaderboard_data',
-            'leaderboard_type': self.leaderboard_type,
-            'entries': leaderboard_data,
-            'timestamp': str(timezone.now())
-        }))
+        """Send the shared, already encoded leaderboard snapshot to the client"""
+        self.last_sent = await snapshots.get(self.leaderboard_type)
+        self.last_sent_at = time.monotonic()
+        await self.send(text_data=self.last_sent)
     
     async def leaderboard_update(self, event):
         """Send leaderboard update to users"""
@@ -2,7 +2,8 @@
 Real-time Events System for Social Features
 """
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from django.db import transaction
 from django.utils import timezone
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
@@ -11,71 +12,72 @@ logger = logging.getLogger(__name__)
 channel_layer = get_channel_layer()
 
 
+def _group_send_on_commit(group: str, message: Dict[str, Any], description: str):
+    """
+    Push to a channel group once the surrounding transaction commits, so work
+    that rolls back (and is retried) never reaches connected clients.
+    Outside a transaction the push happens right away.
+    """
+    def send():
+        try:
+            if channel_layer:
+                async_to_sync(channel_layer.group_send)(group, message)
+                logger.info(f"{description} sent")
+            else:
+                logger.warning(f"Channel layer not configured - {description} not sent")
+        except Exception as e:
+            logger.error(f"Failed to send {description}: {e}")
+    
+    transaction.on_commit(send)
+
+
 class EventDispatcher:
     """Centralized event dispatcher for real-time updates"""
     
     @staticmethod
     def send_notification(user_id: str, notification_type: str, title: str, message: str, data: Dict[str, Any] = None):
         """Send real-time notification to a user"""
-        try:
-            if channel_layer:
-                async_to_sync(channel_layer.group_send)(
-                    f"user_{user_id}_notifications",
-                    {
-                        'type': 'notification_message',
-                        'notification_type': notification_type,
-                        'title': title,
-                        'message': message,
-                        'data': data or {},
-                        'timestamp': timezone.now().isoformat()
-                    }
-                )
-                logger.info(f"Notification sent to user {user_id}: {notification_type}")
-            else:
-                logger.warning("Channel layer not configured - notification not sent")
-        except Exception as e:
-            logger.error(f"Failed to send notification to user {user_id}: {e}")
+        _group_send_on_commit(
+            f"user_{user_id}_notifications",
+            {
+                'type': 'notification_message',
+                'notification_type': notification_type,
+                'title': title,
+                'message': message,
+                'data': data or {},
+                'timestamp': timezone.now().isoformat()
+            },
+            f"notification to user {user_id}: {notification_type}"
+        )
     
     @staticmethod
     def send_leaderboard_update(leaderboard_type: str, update_type: str, data: Dict[str, Any]):
         """Send leaderboard update to all connected users"""
-        try:
-            if channel_layer:
-                async_to_sync(channel_layer.group_send)(
-                    f"leaderboard_{leaderboard_type}",
-                    {
-                        'type': 'leaderboard_update',
-                        'update_type': update_type,
-                        'leaderboard_type': leaderboard_type,
-                        'data': data,
-                        'timestamp': timezone.now().isoformat()
-                    }
-                )
-                logger.info(f"Leaderboard update sent: {leaderboard_type} - {update_type}")
-            else:
-                logger.warning("Channel layer not configured - leaderboard update not sent")
-        except Exception as e:
-            logger.error(f"Failed to send leaderboard update: {e}")
+        _group_send_on_commit(
+            f"leaderboard_{leaderboard_type}",
+            {
+                'type': 'leaderboard_update',
+                'update_type': update_type,
+                'leaderboard_type': leaderboard_type,
+                'data': data,
+                'timestamp': timezone.now().isoformat()
+            },
+            f"leaderboard update: {leaderboard_type} - {update_type}"
+        )
     
     @staticmethod
     def send_challenge_update(challenge_id: str, update_type: str, data: Dict[str, Any]):
         """Send challenge update to all participants"""
-        try:
-            if channel_layer:
-                async_to_sync(channel_layer.group_send)(
-                    f"challenge_{challenge_id}",
-                    {
-                        'type': 'challenge_update',
-                        'update_type': update_type,
-                        'data': data,
-                        'timestamp': timezone.now().isoformat()
-                    }
-                )
-                logger.info(f"Challenge update sent: {challenge_id} - {update_type}")
-            else:
-                logger.warning("Channel layer not configured - challenge update not sent")
-        except Exception as e:
-            logger.error(f"Failed to send challenge update: {e}")
+        _group_send_on_commit(
+            f"challenge_{challenge_id}",
+            {
+                'type': 'challenge_update',
+                'update_type': update_type,
+                'data': data,
+                'timestamp': timezone.now().isoformat()
+            },
+            f"challenge update: {challenge_id} - {update_type}"
+        )
 
 
 class SocialEventHandler:
@@ -83,51 +85,78 @@ class SocialEventHandler:
     
     @staticmethod
     def handle_activity_logged(user, activity, carbon_saved):
-        """Handle when user logs an activity"""
+        """Handle when user logs an activity, queued for the background pipeline"""
+        from . import outbox
+        
+        outbox.record_activity_logged(activity, carbon_saved)
+    
+    @staticmethod
+    def handle_activities_logged(user, logged: List[Tuple[Optional[Any], float]]):
+        """
+        Handle one or more (activity, carbon_saved) a user logged, in one pass.
+        The activity is None if it was deleted before processing.
+        """
+        from .models import UserStats
         from .services import BadgeService, ChallengeService, LeaderboardService
         
-        # Update user stats
-        stats = user.social_stats if hasattr(user, 'social_stats') else None
-        if stats:
-            stats.total_activities += 1
-            stats.total_co2_saved += carbon_saved
-            stats.update_streak()
-            stats.save()
+        # Activity totals and streaks are kept by the daily rollup signals
+        stats = UserStats.objects.filter(user=user).first()
         
         # Check for badge achievements
         new_badges = BadgeService.check_user_badges(user)
         for badge in new_badges:
             SocialEventHandler.handle_badge_earned(user, badge)
         
-        # Update challenge progress
-        ChallengeService.update_user_challenges(user, activity, carbon_saved)
+        # Update challenge progress, several activities are recounted in one aggregate
+        activity, carbon_saved = logged[0]
+        if len(logged) == 1 and activity is not None:
+            ChallengeService.update_user_challenges(user, activity, carbon_saved)
+        else:
+            ChallengeService.update_user_progress(user)
         
-        # Update leaderboards
-        LeaderboardService.update_user_rankings(user)
+        # Update leaderboards (debounced, applied by a background flush)
+        LeaderboardService.queue_user_rankings(user)
         
         # Send activity logged notification
-        EventDispatcher.send_notification(
-            str(user.id),
-            'activity_logged',
-            'Activity Logged',
-            f'Great! You saved {carbon_saved:.2f} kg CO₂e with your recent activity.',
-            {
-                'activity_type': activity.activity_type,
-                'carbon_saved': carbon_saved,
-                'total_saved': stats.total_co2_saved if stats else carbon_saved
-            }
-        )
+        carbon_saved = sum(saved for _, saved in logged)
+        total_saved = stats.total_co2_saved if stats else carbon_saved
+        if len(logged) == 1:
+            EventDispatcher.send_notification(
+                str(user.id),
+                'activity_logged',
+                'Activity Logged',
+                f'Great! You saved {carbon_saved:.2f} kg CO₂e with your recent activity.',
+                {
+                    'activity_type': activity.activity_type if activity else None,
+                    'carbon_saved': carbon_saved,
+                    'total_saved': total_saved
+                }
+            )
+        else:
+            EventDispatcher.send_notification(
+                str(user.id),
+                'activity_logged',
+                'Activities Logged',
+                f'Great! You saved {carbon_saved:.2f} kg CO₂e with your {len(logged)} recent activities.',
+                {
+                    'activity_count': len(logged),
+                    'carbon_saved': carbon_saved,
+                    'total_saved': total_saved
+                }
+            )
     
     @staticmethod
     def handle_badge_earned(user, badge):
         """Handle when user earns a badge"""
-        from .models import SocialFeed
+        from . import feed
         
-        # Create social feed entry
-        SocialFeed.objects.create(
-            user=user,
-            activity_type='badge_earned',
+        # Create social feed entry, or join others who just earned it
+        feed.publish(
+            [user.id],
+            'badge_earned',
+            f'badge:{badge.id}',
             title=f'Badge Earned: {badge.name}',
+            action=f'earned {badge.name}',
             description=badge.description,
             metadata={
                 'badge_id': str(badge.id),
@@ -155,13 +184,15 @@ class SocialEventHandler:
     @staticmethod
     def handle_challenge_completed(user, challenge):
         """Handle when user completes a challenge"""
-        from .models import SocialFeed
+        from . import feed
         
-        # Create social feed entry
-        SocialFeed.objects.create(
-            user=user,
-            activity_type='challenge_completed',
+        # Create social feed entry, or join others who just completed it
+        feed.publish(
+            [user.id],
+            'challenge_completed',
+            f'challenge:{challenge.id}',
             title=f'Challenge Completed: {challenge.title}',
+            action=f'completed the {challenge.title} challenge',
             description=f'Successfully completed the {challenge.title} challenge!',
             metadata={
                 'challenge_id': str(challenge.id),
@@ -194,6 +225,46 @@ class SocialEventHandler:
             }
         )
     
+    @staticmethod
+    def handle_challenge_completions(challenge, user_ids):
+        """Handle many users completing a challenge at once, e.g. after a recompute"""
+        from . import feed
+        
+        metadata = {
+            'challenge_id': str(challenge.id),
+            'challenge_title': challenge.title,
+            'reward_points': challenge.reward_points
+        }
+        # One aggregated feed item for everyone instead of one per participant
+        feed.publish(
+            user_ids,
+            'challenge_completed',
+            f'challenge:{challenge.id}',
+            title=f'Challenge Completed: {challenge.title}',
+            action=f'completed the {challenge.title} challenge',
+            description=f'Successfully completed the {challenge.title} challenge!',
+            metadata=metadata
+        )
+        
+        for user_id in user_ids:
+            EventDispatcher.send_notification(
+                str(user_id),
+                'challenge_completed',
+                'Challenge Completed!',
+                f'Amazing! You completed the "{challenge.title}" challenge.',
+                metadata
+            )
+        
+        # One update for the challenge group instead of one per participant
+        EventDispatcher.send_challenge_update(
+            str(challenge.id),
+            'participants_completed',
+            {
+                'completed_count': len(user_ids),
+                'challenge_title': challenge.title
+            }
+        )
+    
     @staticmethod
     def handle_leaderboard_rank_change(user, leaderboard_type, new_rank, old_rank):
         """Handle when user's leaderboard ranking changes"""
@@ -0,0 +1,94 @@
+"""
+Write-time aggregation of repeated feed events
+Events many users repeat (earning a badge, completing a challenge) join the
+item for the same key in the current aggregation window instead of adding a
+row, so "Alex and 12 others earned Eco Warrior" is one feed item
+however many users earn it.
+"""
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import SocialFeed
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Actor ids kept on an aggregated item for clients to show avatars
+SAMPLE_ACTORS = 10
+
+
+def group_title(username: str, others: int, action: str) -> str:
+    return f"{username} and {others} other{'' if others == 1 else 's'} {action}"
+
+
+def aggregate_window() -> int:
+    """The current aggregation window number"""
+    minutes = getattr(settings, 'FEED_AGGREGATION_WINDOW_MINUTES', 60)
+    return int(timezone.now().timestamp() // (minutes * 60))
+
+
+def publish(user_ids: Iterable, activity_type: str, aggregate_key: str, title: str, action: str,
+            description: str, metadata: Optional[Dict[str, Any]] = None) -> SocialFeed:
+    """
+    Record users doing the same thing. The first event creates an item titled
+    ``title``, later ones in the same window are counted on it and retitle it
+    "<first user> and N others <action>". Returns the feed item.
+    """
+    from .tasks import fan_out_feed_items
+
+    user_ids = [str(user_id) for user_id in user_ids]
+    window = aggregate_window()
+
+    with transaction.atomic():
+        items = SocialFeed.objects.select_for_update().filter(
+            aggregate_key=aggregate_key,
+            aggregate_window=window
+        )
+        item = items.first()
+
+        created = False
+        if item is None:
+            item = SocialFeed(
+                user_id=user_ids[0],
+                activity_type=activity_type,
+                title=title,
+                description=description,
+                metadata=dict(metadata or {}, actor_ids=user_ids[:SAMPLE_ACTORS]),
+                aggregate_key=aggregate_key,
+                aggregate_window=window,
+                actor_count=len(user_ids)
+            )
+            if len(user_ids) > 1:
+                username = User.objects.filter(id=user_ids[0]).values_list('username', flat=True).first()
+                item.title = group_title(username, len(user_ids) - 1, action)
+            try:
+                # The (aggregate_key, aggregate_window) key lets one concurrent first event win
+                with transaction.atomic():
+                    item.save()
+                created = True
+            except IntegrityError:
+                item = items.get()
+
+        if created:
+            # The author is fanned out by the post_save signal
+            joined = user_ids[1:]
+        else:
+            actors = item.metadata.get('actor_ids', [])
+            item.metadata['actor_ids'] = (actors + user_ids)[:SAMPLE_ACTORS]
+            item.actor_count += len(user_ids)
+            item.title = group_title(item.user.username, item.actor_count - 1, action)
+            item.save(update_fields=['metadata', 'actor_count', 'title'])
+            joined = user_ids
+
+        if joined:
+            item_id = str(item.id)
+            transaction.on_commit(lambda: fan_out_feed_items.delay([item_id], joined))
+
+    logger.debug(f"Feed item {item.id} ({aggregate_key}) now has {item.actor_count} actors")
+    return item
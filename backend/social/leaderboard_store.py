@@ -0,0 +1,245 @@
+"""
+Leaderboard score stores
+Live leaderboard scores are kept per (leaderboard, period) in a sorted set so
+score updates are O(log n) and top-N / rank reads never touch the database.
+LeaderboardEntry rows are the persisted history, written back periodically.
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ecotrack.cache import CacheManager
+from .stores import SortedSet, StoreLoader
+
+# Users whose leaderboard scores changed since the last flush
+PENDING_KEY = CacheManager.get_cache_key('leaderboard', 'pending_users')
+
+# (user_id, score, rank), ranks follow RANK() semantics: ties share a rank
+RankedEntry = Tuple[str, float, int]
+
+
+def period_key(period_start: datetime) -> str:
+    return period_start.strftime('%Y%m%d')
+
+
+def _rank_page(rows: List[Tuple[str, float]], first_rank: int) -> List[RankedEntry]:
+    """Competition ranks for a page of (member, score) rows sorted by score desc"""
+    ranked = []
+    rank = first_rank
+    for position, (member, score) in enumerate(rows):
+        if position and score != rows[position - 1][1]:
+            rank = first_rank + position
+        ranked.append((member, score, rank))
+    return ranked
+
+
+class LeaderboardStore:
+    """Interface for leaderboard score stores"""
+
+    def set_score(self, leaderboard_id, period_start: datetime, user_id, score: float):
+        raise NotImplementedError
+
+    def set_scores(self, leaderboard_id, period_start: datetime, scores: Dict[str, float]):
+        for user_id, score in scores.items():
+            self.set_score(leaderboard_id, period_start, user_id, score)
+
+    def remove(self, leaderboard_id, period_start: datetime, user_id):
+        raise NotImplementedError
+
+    def rank(self, leaderboard_id, period_start: datetime, user_id) -> Optional[Tuple[int, float]]:
+        """(rank, score) for a user, or None if they have no score"""
+        raise NotImplementedError
+
+    def top(self, leaderboard_id, period_start: datetime, limit: int, offset: int = 0) -> List[RankedEntry]:
+        raise NotImplementedError
+
+    def around(self, leaderboard_id, period_start: datetime, user_id, radius: int) -> List[RankedEntry]:
+        """Up to ``radius`` entries either side of a user and the user, [] if unscored"""
+        raise NotImplementedError
+
+    def count(self, leaderboard_id, period_start: datetime) -> int:
+        raise NotImplementedError
+
+    def scores(self, leaderboard_id, period_start: datetime) -> Iterator[Tuple[str, float]]:
+        """Every (user_id, score), highest first"""
+        raise NotImplementedError
+
+    def clear(self, leaderboard_id, period_start: datetime):
+        raise NotImplementedError
+
+    def add_pending(self, user_ids):
+        """Queue users whose scores changed, for the next debounced flush"""
+        raise NotImplementedError
+
+    def pop_pending(self) -> List[str]:
+        """Atomically take every queued user"""
+        raise NotImplementedError
+
+
+class RedisLeaderboardStore(LeaderboardStore):
+    """Sorted set per (leaderboard, period) on the cache Redis server"""
+
+    SCAN_BATCH = 1000
+
+    def __init__(self, alias: str = 'default'):
+        self.alias = alias
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from django_redis import get_redis_connection
+            self._client = get_redis_connection(self.alias)
+        return self._client
+
+    @staticmethod
+    def _key(leaderboard_id, period_start: datetime) -> str:
+        return CacheManager.get_cache_key('leaderboard', leaderboard_id, period=period_key(period_start))
+
+    def set_score(self, leaderboard_id, period_start, user_id, score):
+        self.client.zadd(self._key(leaderboard_id, period_start), {str(user_id): float(score)})
+
+    def set_scores(self, leaderboard_id, period_start, scores):
+        key = self._key(leaderboard_id, period_start)
+        items = [(str(user_id), float(score)) for user_id, score in scores.items()]
+        pipe = self.client.pipeline(transaction=False)
+        for i in range(0, len(items), self.SCAN_BATCH):
+            pipe.zadd(key, dict(items[i:i + self.SCAN_BATCH]))
+        pipe.execute()
+
+    def remove(self, leaderboard_id, period_start, user_id):
+        self.client.zrem(self._key(leaderboard_id, period_start), str(user_id))
+
+    def _count_above(self, key: str, score: float) -> int:
+        return self.client.zcount(key, f'({score}', '+inf')
+
+    def rank(self, leaderboard_id, period_start, user_id):
+        key = self._key(leaderboard_id, period_start)
+        score = self.client.zscore(key, str(user_id))
+        if score is None:
+            return None
+        return self._count_above(key, score) + 1, score
+
+    def top(self, leaderboard_id, period_start, limit, offset=0):
+        key = self._key(leaderboard_id, period_start)
+        rows = [
+            (member.decode() if isinstance(member, bytes) else member, score)
+            for member, score in self.client.zrevrange(key, offset, offset + limit - 1, withscores=True)
+        ]
+        if not rows:
+            return []
+        first_rank = self._count_above(key, rows[0][1]) + 1 if offset else 1
+        return _rank_page(rows, first_rank)
+
+    def around(self, leaderboard_id, period_start, user_id, radius):
+        position = self.client.zrevrank(self._key(leaderboard_id, period_start), str(user_id))
+        if position is None:
+            return []
+        offset = max(position - radius, 0)
+        return self.top(leaderboard_id, period_start, position - offset + radius + 1, offset)
+
+    def count(self, leaderboard_id, period_start):
+        return self.client.zcard(self._key(leaderboard_id, period_start))
+
+    def scores(self, leaderboard_id, period_start):
+        key = self._key(leaderboard_id, period_start)
+        offset = 0
+        while True:
+            batch = self.client.zrevrange(key, offset, offset + self.SCAN_BATCH - 1, withscores=True)
+            for member, score in batch:
+                yield (member.decode() if isinstance(member, bytes) else member), score
+            if len(batch) < self.SCAN_BATCH:
+                return
+            offset += self.SCAN_BATCH
+
+    def clear(self, leaderboard_id, period_start):
+        self.client.delete(self._key(leaderboard_id, period_start))
+
+    def add_pending(self, user_ids):
+        members = [str(user_id) for user_id in user_ids]
+        if members:
+            self.client.sadd(PENDING_KEY, *members)
+
+    def pop_pending(self):
+        pending = []
+        while True:
+            batch = self.client.spop(PENDING_KEY, self.SCAN_BATCH)
+            if not batch:
+                return pending
+            pending.extend(member.decode() if isinstance(member, bytes) else member for member in batch)
+
+
+class InMemoryLeaderboardStore(LeaderboardStore):
+    """In-process leaderboard store for tests and single process development servers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards: Dict[tuple, SortedSet] = {}
+        self._pending = set()
+
+    @staticmethod
+    def _key(leaderboard_id, period_start):
+        return str(leaderboard_id), period_key(period_start)
+
+    def set_score(self, leaderboard_id, period_start, user_id, score):
+        with self._lock:
+            self._boards.setdefault(self._key(leaderboard_id, period_start), SortedSet()).add(str(user_id), score)
+
+    def remove(self, leaderboard_id, period_start, user_id):
+        with self._lock:
+            board = self._boards.get(self._key(leaderboard_id, period_start))
+            if board is not None:
+                board.discard(str(user_id))
+
+    def rank(self, leaderboard_id, period_start, user_id):
+        with self._lock:
+            board = self._boards.get(self._key(leaderboard_id, period_start))
+            score = board.score(str(user_id)) if board is not None else None
+            if score is None:
+                return None
+            return board.count_above(score) + 1, score
+
+    def top(self, leaderboard_id, period_start, limit, offset=0):
+        with self._lock:
+            board = self._boards.get(self._key(leaderboard_id, period_start))
+            rows = board.range(offset, limit) if board is not None else []
+            if not rows:
+                return []
+            first_rank = board.count_above(rows[0][1]) + 1
+        return _rank_page(rows, first_rank)
+
+    def around(self, leaderboard_id, period_start, user_id, radius):
+        with self._lock:
+            board = self._boards.get(self._key(leaderboard_id, period_start))
+            position = board.position(str(user_id)) if board is not None else None
+            if position is None:
+                return []
+        offset = max(position - radius, 0)
+        return self.top(leaderboard_id, period_start, position - offset + radius + 1, offset)
+
+    def count(self, leaderboard_id, period_start):
+        board = self._boards.get(self._key(leaderboard_id, period_start))
+        return len(board) if board is not None else 0
+
+    def scores(self, leaderboard_id, period_start):
+        with self._lock:
+            board = self._boards.get(self._key(leaderboard_id, period_start))
+            rows = board.range(0, len(board)) if board is not None else []
+        return iter(rows)
+
+    def clear(self, leaderboard_id, period_start):
+        with self._lock:
+            self._boards.pop(self._key(leaderboard_id, period_start), None)
+
+    def add_pending(self, user_ids):
+        with self._lock:
+            self._pending.update(str(user_id) for user_id in user_ids)
+
+    def pop_pending(self):
+        with self._lock:
+            pending, self._pending = list(self._pending), set()
+        return pending
+
+
+# The configured store (LEADERBOARD_STORE_BACKEND), one per process
+get_leaderboard_store = StoreLoader('LEADERBOARD_STORE_BACKEND', 'social.leaderboard_store.RedisLeaderboardStore')
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from social.timelines import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Fan social feed items out to the precomputed timelines again, e.g. after Redis is flushed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', dest='days', type=int, help='Only feed items from the last N days')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        items = rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f'Fanned out {items} feed items'))
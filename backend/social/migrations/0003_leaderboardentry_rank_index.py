@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social", "0002_challenge_metadata"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="leaderboardentry",
+            index=models.Index(
+                fields=["leaderboard", "period_start", "rank"],
+                name="social_lead_leaderb_f46e9a_idx",
+            ),
+        ),
+    ]
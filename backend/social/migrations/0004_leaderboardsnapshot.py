@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social", "0003_leaderboardentry_rank_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaderboardSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("period_start", models.DateTimeField()),
+                ("period_end", models.DateTimeField()),
+                ("total_entries", models.IntegerField(default=0)),
+                ("top_entries", models.JSONField(default=list)),
+                ("ranks", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "leaderboard",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="social.leaderboard",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["leaderboard", "-period_start"],
+                "unique_together": {("leaderboard", "period_start")},
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations, models
+from django.db.models.functions import Cast, Coalesce
+
+BATCH_SIZE = 2000
+
+
+def user_total(queryset, aggregate, output_field):
+    subquery = (
+        queryset.filter(user=models.OuterRef("user"))
+        .values("user")
+        .annotate(total=aggregate)
+        .values("total")
+    )
+    return Coalesce(
+        Cast(models.Subquery(subquery), output_field),
+        models.Value(0),
+        output_field=output_field,
+    )
+
+
+def backfill_user_stats(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    UserMetrics = apps.get_model("users", "UserMetrics")
+    UserStats = apps.get_model("social", "UserStats")
+    UserBadge = apps.get_model("social", "UserBadge")
+    ChallengeParticipation = apps.get_model("social", "ChallengeParticipation")
+
+    missing = User.objects.filter(social_stats__isnull=True).values_list(
+        "id", flat=True
+    )
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in missing.iterator()],
+        batch_size=BATCH_SIZE,
+    )
+
+    # Period totals are refreshed by the nightly rollover
+    UserStats.objects.update(
+        total_activities=user_total(
+            UserMetrics.objects.all(),
+            models.Sum("activities_count"),
+            models.IntegerField(),
+        ),
+        total_co2_saved=user_total(
+            UserMetrics.objects.all(), models.Sum("co2_kg"), models.FloatField()
+        ),
+        badges_earned=user_total(
+            UserBadge.objects.all(), models.Count("id"), models.IntegerField()
+        ),
+        total_badge_points=user_total(
+            UserBadge.objects.all(), models.Sum("badge__points"), models.IntegerField()
+        ),
+        challenges_completed=user_total(
+            ChallengeParticipation.objects.filter(is_completed=True),
+            models.Count("id"),
+            models.IntegerField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social", "0004_leaderboardsnapshot"),
+        ("activities", "0007_backfill_daily_rollups"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
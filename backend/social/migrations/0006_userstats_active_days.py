@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social", "0005_backfill_user_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userstats",
+            name="active_days",
+            field=models.BinaryField(default=bytes),
+        ),
+    ]
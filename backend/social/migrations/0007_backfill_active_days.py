@@ -0,0 +1,72 @@
+from datetime import date
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import migrations
+from django.utils import timezone
+
+STREAK_EPOCH = date(2020, 1, 1)
+BATCH_SIZE = 1000
+
+
+def local_today_offset(timezone_name):
+    try:
+        tz = ZoneInfo(timezone_name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo("UTC")
+    return (timezone.now().astimezone(tz).date() - STREAK_EPOCH).days
+
+
+def streaks(offsets, today):
+    longest = run = 0
+    previous = None
+    for offset in offsets:
+        run = run + 1 if previous is not None and offset == previous + 1 else 1
+        longest = max(longest, run)
+        previous = offset
+    current = run if previous is not None and previous >= today - 1 else 0
+    return current, longest
+
+
+def backfill_active_days(apps, schema_editor):
+    UserStats = apps.get_model("social", "UserStats")
+    UserMetrics = apps.get_model("users", "UserMetrics")
+
+    pending = []
+    for stats in UserStats.objects.select_related("user").iterator():
+        offsets = sorted(
+            (metric_date - STREAK_EPOCH).days
+            for metric_date in UserMetrics.objects.filter(
+                user_id=stats.user_id,
+                activities_count__gt=0,
+                metric_date__gte=STREAK_EPOCH,
+            ).values_list("metric_date", flat=True)
+        )
+        value = 0
+        for offset in offsets:
+            value |= 1 << offset
+        stats.active_days = value.to_bytes((value.bit_length() + 7) // 8, "little")
+        stats.current_streak, stats.longest_streak = streaks(
+            offsets, local_today_offset(stats.user.timezone)
+        )
+        pending.append(stats)
+        if len(pending) >= BATCH_SIZE:
+            UserStats.objects.bulk_update(
+                pending, ["active_days", "current_streak", "longest_streak"]
+            )
+            pending = []
+    if pending:
+        UserStats.objects.bulk_update(
+            pending, ["active_days", "current_streak", "longest_streak"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social", "0006_userstats_active_days"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_active_days, migrations.RunPython.noop),
+    ]
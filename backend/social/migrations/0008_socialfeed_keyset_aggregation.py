@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social", "0007_backfill_active_days"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="socialfeed",
+            options={"ordering": ["-created_at", "-id"]},
+        ),
+        migrations.AddField(
+            model_name="socialfeed",
+            name="actor_count",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="socialfeed",
+            name="aggregate_key",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name="socialfeed",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="social_soci_created_adfa92_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="socialfeed",
+            index=models.Index(
+                fields=["is_public", "-created_at", "-id"],
+                name="social_soci_is_publ_2b3f18_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="socialfeed",
+            index=models.Index(
+                fields=["aggregate_key", "-created_at"],
+                name="social_soci_aggrega_0bd618_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social", "0009_socialevent"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="socialfeed",
+            name="social_soci_aggrega_0bd618_idx",
+        ),
+        migrations.AddField(
+            model_name="socialfeed",
+            name="aggregate_window",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name="socialfeed",
+            unique_together={("aggregate_key", "aggregate_window")},
+        ),
+    ]
@@ -6,7 +6,6 @@ import uuid
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from datetime import timedelta
 
 User = get_user_model()
 
@@ -257,6 +256,9 @@ class LeaderboardEntry(models.Model):
     class Meta:
         unique_together = ['leaderboard', 'user', 'period_start']
         ordering = ['leaderboard', 'rank']
+        indexes = [
+            models.Index(fields=['leaderboard', 'period_start', 'rank']),
+        ]
         
     @property
     def rank_change(self):
@@ -268,6 +270,30 @@ class LeaderboardEntry(models.Model):
         return f"{self.leaderboard.name} - {self.user.email} (#{self.rank})"
 
 
+class LeaderboardSnapshot(models.Model):
+    """Final standings of a closed leaderboard period, compacted from its entries"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    leaderboard = models.ForeignKey(Leaderboard, on_delete=models.CASCADE, related_name='snapshots')
+    
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    total_entries = models.IntegerField(default=0)
+    
+    # [{'user_id', 'rank', 'score'}, ...] for the top of the board
+    top_entries = models.JSONField(default=list)
+    # {user_id: [rank, score]} for every ranked user
+    ranks = models.JSONField(default=dict)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['leaderboard', 'period_start']
+        ordering = ['leaderboard', '-period_start']
+        
+    def __str__(self):
+        return f"{self.leaderboard.name} - {self.period_start:%Y-%m-%d}"
+
+
 class SocialFeed(models.Model):
     """Social activity feed"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -293,10 +319,22 @@ class SocialFeed(models.Model):
     is_public = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
     
+    # Repeated events (same badge, same challenge) share one item, see social/feed.py
+    aggregate_key = models.CharField(max_length=100, blank=True, default='')
+    # Aggregation window number, unique per key so concurrent first events create one item
+    aggregate_window = models.IntegerField(null=True, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['is_public', '-created_at', '-id']),
+        ]
+        unique_together = ['aggregate_key', 'aggregate_window']
         
     def __str__(self):
         return f"{self.user.email} - {self.activity_type}"
@@ -324,35 +362,44 @@ class UserStats(models.Model):
     yearly_co2_saved = models.FloatField(default=0.0)
     
     last_activity_date = models.DateTimeField(null=True, blank=True)
+    # Bitset of local days with activity, see social.streaks
+    active_days = models.BinaryField(default=bytes, editable=False)
     last_updated = models.DateTimeField(auto_now=True)
     
     def update_streak(self):
-        """Update user's activity streak"""
-        from activities.models import Activity
+        """Recount the activity streaks from the active day bitset"""
+        from .streaks import local_today_offset, streaks_from_bits
         
-        today = timezone.now().date()
-        yesterday = today - timedelta(days=1)
-        
-        # Check if user has activity today or yesterday
-        recent_activity = Activity.objects.filter(
-            user=self.user,
-            created_at__date__in=[today, yesterday]
-        ).exists()
-        
-        if recent_activity:
-            if self.last_activity_date and (today - self.last_activity_date.date()).days == 1:
-                self.current_streak += 1
-            elif self.last_activity_date is None or (today - self.last_activity_date.date()).days > 1:
-                self.current_streak = 1
-            
-            self.longest_streak = max(self.longest_streak, self.current_streak)
-            self.last_activity_date = timezone.now()
-        else:
-            # Reset streak if no recent activity
-            if self.last_activity_date and (today - self.last_activity_date.date()).days > 1:
-                self.current_streak = 0
-        
-        self.save()
+        today = local_today_offset(self.user.timezone)
+        self.current_streak, self.longest_streak = streaks_from_bits(bytes(self.active_days or b''), today)
+        self.save(update_fields=['current_streak', 'longest_streak', 'last_updated'])
     
     def __str__(self):
         return f"{self.user.email} - Stats"
+
+
+class SocialEvent(models.Model):
+    """Outbox of social events, written with the change and consumed by background workers"""
+    EVENT_TYPES = [
+        ('activity_logged', 'Activity Logged'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='social_events')
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPES)
+    payload = models.JSONField(default=dict, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Workers claim the oldest unprocessed events
+            models.Index(fields=['id'], name='social_event_pending_idx', condition=models.Q(processed_at__isnull=True)),
+        ]
+        
+    def __str__(self):
+        return f"{self.user_id} - {self.event_type}"
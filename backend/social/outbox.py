@@ -0,0 +1,120 @@
+"""
+Social event outbox
+Logging an activity only writes a SocialEvent row and returns. Workers claim
+pending events in id order, group them per user and run the badge,
+challenge, leaderboard and notification work once per user per batch.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
+
+from ecotrack.cache import CacheManager
+from .models import SocialEvent
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+PROCESS_SCHEDULED_KEY = CacheManager.get_cache_key('social_events', 'process_scheduled')
+
+
+def schedule():
+    """Kick a worker once committed, events recorded within the delay share one run"""
+    delay = getattr(settings, 'SOCIAL_EVENT_DELAY', 2)
+    if cache.add(PROCESS_SCHEDULED_KEY, True, max(delay, 1)):
+        from .tasks import process_social_events
+        transaction.on_commit(lambda: process_social_events.apply_async(countdown=delay))
+
+
+def record_activity_logged(activity, carbon_saved: float) -> SocialEvent:
+    event = SocialEvent.objects.create(
+        user_id=activity.user_id,
+        event_type='activity_logged',
+        payload={'activity_id': str(activity.id), 'carbon_saved': float(carbon_saved or 0)}
+    )
+    schedule()
+    return event
+
+
+def _handle_user_events(user, events):
+    from activities.models import Activity
+    from .events import SocialEventHandler
+
+    activity_ids = [event.payload.get('activity_id') for event in events]
+    activities = {
+        str(activity_id): activity
+        for activity_id, activity in Activity.objects.select_related('category').in_bulk(
+            [activity_id for activity_id in activity_ids if activity_id]
+        ).items()
+    }
+    # Activities deleted before processing still count towards badges and leaderboards
+    logged = [
+        (activities.get(event.payload.get('activity_id')), event.payload.get('carbon_saved', 0.0))
+        for event in events
+    ]
+    SocialEventHandler.handle_activities_logged(user, logged)
+
+
+def process_pending(batch_size: int = None) -> int:
+    """
+    Process one batch of pending events, returns how many were handled. A
+    full batch schedules another run. Locked rows are skipped, so several
+    workers can drain the outbox at once.
+    """
+    cache.delete(PROCESS_SCHEDULED_KEY)
+    batch_size = batch_size or getattr(settings, 'SOCIAL_EVENT_BATCH_SIZE', 500)
+    max_attempts = getattr(settings, 'SOCIAL_EVENT_MAX_ATTEMPTS', 5)
+
+    with transaction.atomic():
+        events = list(SocialEvent.objects.select_for_update(skip_locked=True).filter(
+            processed_at__isnull=True,
+            attempts__lt=max_attempts
+        ).order_by('id')[:batch_size])
+        if not events:
+            return 0
+
+        by_user = defaultdict(list)
+        for event in events:
+            by_user[event.user_id].append(event)
+        users = User.objects.in_bulk(list(by_user))
+
+        done = []
+        failed = []
+        for user_id, user_events in by_user.items():
+            try:
+                # A failing user rolls back only their own work
+                with transaction.atomic():
+                    _handle_user_events(users[user_id], user_events)
+                done.extend(event.id for event in user_events)
+            except Exception as e:
+                logger.error(f"Failed to process {len(user_events)} social events for user {user_id}: {e}")
+                for event in user_events:
+                    event.attempts += 1
+                    event.last_error = str(e)
+                failed.extend(user_events)
+
+        SocialEvent.objects.filter(id__in=done).update(
+            processed_at=timezone.now(), attempts=models.F('attempts') + 1
+        )
+        if failed:
+            SocialEvent.objects.bulk_update(failed, ['attempts', 'last_error'])
+
+    if len(events) == batch_size:
+        schedule()
+    logger.info(f"Processed {len(done)} social events for {len(by_user)} users, {len(failed)} failed")
+    return len(done)
+
+
+def purge_processed() -> int:
+    """Delete processed events past the retention period"""
+    retention = getattr(settings, 'SOCIAL_EVENT_RETENTION_DAYS', 7)
+    deleted, _ = SocialEvent.objects.filter(
+        processed_at__lt=timezone.now() - timedelta(days=retention)
+    ).delete()
+    return deleted
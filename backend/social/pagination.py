@@ -0,0 +1,93 @@
+"""
+Keyset pagination for the social feed
+Pages continue after the (created_at, id) of the last item seen, so deep
+pages cost the same as the first and new items never shift a page.
+
+Responses are ``{"next": <url or null>, "results": [...]}``. Unlike the page
+number pagination used elsewhere there is no ``count`` (it would need a full
+count query per page) and no ``previous``, clients follow ``next`` and keep
+the pages they already have.
+"""
+import base64
+import binascii
+import uuid
+from typing import Optional
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .timelines import Timeline, TimelineEntry, item_cursor, keyset_after
+
+
+class FeedCursorPagination(BasePagination):
+    """
+    Paginates a SocialFeed queryset (ordered by -created_at, -id) or a
+    precomputed Timeline with the same opaque cursor.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    @staticmethod
+    def encode_cursor(cursor: TimelineEntry) -> str:
+        item_id, score = cursor
+        return base64.urlsafe_b64encode(f'{int(score)}:{item_id}'.encode()).decode()
+
+    def decode_cursor(self, request) -> Optional[TimelineEntry]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            score, item_id = base64.urlsafe_b64decode(encoded.encode()).decode().split(':', 1)
+            return str(uuid.UUID(item_id)), int(score)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        if isinstance(queryset, Timeline):
+            page, next_cursor = queryset.after(cursor, page_size)
+        else:
+            page = list(keyset_after(queryset, cursor)[:page_size + 1])
+            next_cursor = None
+            if len(page) > page_size:
+                page = page[:page_size]
+                next_cursor = item_cursor(page[-1])
+
+        self.next_cursor = next_cursor
+        return page
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_cursor))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
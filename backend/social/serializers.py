@@ -5,7 +5,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import (
     Badge, UserBadge, Challenge, ChallengeParticipation,
-    Leaderboard, LeaderboardEntry, SocialFeed, UserStats
+    Leaderboard, LeaderboardEntry, LeaderboardSnapshot, SocialFeed, UserStats
 )
 
 User = get_user_model()
@@ -104,6 +104,34 @@ class LeaderboardEntrySerializer(serializers.ModelSerializer):
         ]
 
 
+class LeaderboardSnapshotSerializer(serializers.ModelSerializer):
+    """Closed leaderboard period with its top entries and the user's own rank"""
+    top_entries = serializers.SerializerMethodField()
+    user_rank = serializers.SerializerMethodField()
+    user_score = serializers.SerializerMethodField()
+    
+    def get_top_entries(self, obj):
+        users = self.context.get('users', {})
+        return [
+            {**entry, 'user': UserBasicSerializer(users[entry['user_id']]).data}
+            for entry in obj.top_entries
+            if entry['user_id'] in users
+        ]
+    
+    def get_user_rank(self, obj):
+        return obj.user_standing[0] if obj.user_standing else None
+    
+    def get_user_score(self, obj):
+        return obj.user_standing[1] if obj.user_standing else None
+    
+    class Meta:
+        model = LeaderboardSnapshot
+        fields = [
+            'id', 'period_start', 'period_end', 'total_entries',
+            'top_entries', 'user_rank', 'user_score'
+        ]
+
+
 class SocialFeedSerializer(serializers.ModelSerializer):
     """Social feed serializer"""
     user = UserBasicSerializer(read_only=True)
@@ -112,7 +140,7 @@ class SocialFeedSerializer(serializers.ModelSerializer):
         model = SocialFeed
         fields = [
             'id', 'user', 'activity_type', 'title', 'description', 'metadata',
-            'is_public', 'is_featured', 'created_at'
+            'actor_count', 'is_public', 'is_featured', 'created_at'
         ]
 
 
@@ -130,9 +158,21 @@ class UserStatsSerializer(serializers.ModelSerializer):
         ]
 
 
+class LeaderboardStandingSerializer(serializers.Serializer):
+    """Live leaderboard position"""
+    user = UserBasicSerializer(read_only=True)
+    rank = serializers.IntegerField()
+    score = serializers.FloatField()
+
+
 class LeaderboardWithEntriesSerializer(serializers.ModelSerializer):
-    """Leaderboard with entries"""
-    entries = LeaderboardEntrySerializer(many=True, read_only=True)
+    """Leaderboard with its live top entries"""
+    entries = serializers.SerializerMethodField()
+    
+    def get_entries(self, obj):
+        from .services import LeaderboardService
+        standings = LeaderboardService.get_standings(obj, limit=obj.max_entries)
+        return LeaderboardStandingSerializer(standings, many=True).data
     
     class Meta:
         model = Leaderboard
@@ -3,20 +3,48 @@ Social Features Services
 Badge engine, challenge management, and leaderboard services
 """
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 from typing import List, Dict, Any, Optional
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Cast, Coalesce
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
+from activities.rollups import PERIOD_CO2_FIELDS
+from ecotrack.cache import CacheManager
+from . import badges, challenges
+from .leaderboard_store import get_leaderboard_store
 from .models import (
     Badge, UserBadge, Challenge, ChallengeParticipation, 
-    Leaderboard, LeaderboardEntry, UserStats
+    Leaderboard, LeaderboardEntry, LeaderboardSnapshot, UserStats
 )
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+RANK_UPDATE_BATCH_SIZE = 1000
+# Rank reported for users who were not on a leaderboard yet
+UNRANKED = 999999
+# Entries kept with scores at the top of a compacted period snapshot
+SNAPSHOT_TOP_ENTRIES = 100
+# Set while a debounced leaderboard flush is scheduled
+FLUSH_SCHEDULED_KEY = CacheManager.get_cache_key('leaderboard', 'flush_scheduled')
+
+# All-time entries keep one fixed period start
+ALL_TIME_START = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+# UserStats field behind each leaderboard metric
+METRIC_FIELDS = {
+    'total_co2_saved': 'total_co2_saved',
+    'activity_count': 'total_activities',
+    'streak_days': 'current_streak',
+    'badge_points': 'total_badge_points',
+    'challenge_completions': 'challenges_completed',
+}
+
 
 class BadgeService:
     """Service for managing badges and achievements"""
@@ -24,68 +52,26 @@ class BadgeService:
     @staticmethod
     def check_user_badges(user) -> List[Badge]:
         """Check if user has earned any new badges"""
-        new_badges = []
-        
         try:
-            # Get user stats
-            stats, created = UserStats.objects.get_or_create(user=user)
-            
-            # Get all active badges user hasn't earned
-            earned_badge_ids = user.badges.values_list('badge_id', flat=True)
-            available_badges = Badge.objects.filter(
-                is_active=True
-            ).exclude(id__in=earned_badge_ids)
-            
-            for badge in available_badges:
-                if BadgeService._check_badge_criteria(user, stats, badge):
-                    # Award the badge
-                    user_badge = UserBadge.objects.create(
-                        user=user,
-                        badge=badge,
-                        progress_value=BadgeService._get_current_value(user, stats, badge)
-                    )
-                    
-                    # Update user's badge points
-                    stats.total_badge_points += badge.points
-                    stats.badges_earned += 1
-                    stats.save()
-                    
-                    new_badges.append(badge)
-                    logger.info(f"Badge '{badge.name}' awarded to user {user.email}")
-            
+            return badges.evaluate_user(user)
         except Exception as e:
             logger.error(f"Error checking badges for user {user.email}: {e}")
-        
-        return new_badges
+            return []
     
     @staticmethod
-    def _check_badge_criteria(user, stats: UserStats, badge: Badge) -> bool:
-        """Check if user meets badge criteria"""
-        current_value = BadgeService._get_current_value(user, stats, badge)
-        return current_value >= badge.criteria_value
-    
-    @staticmethod
-    def _get_current_value(user, stats: UserStats, badge: Badge) -> float:
-        """Get current value for badge criteria"""
-        criteria_type = badge.criteria_type
-        
-        if criteria_type == 'activity_count':
-            return stats.total_activities
-        elif criteria_type == 'co2_reduction':
-            if badge.criteria_period == 'all_time':
-                return stats.total_co2_saved
-            elif badge.criteria_period == 'monthly':
-                return stats.monthly_co2_saved
-            elif badge.criteria_period == 'weekly':
-                return stats.weekly_co2_saved
-        elif criteria_type == 'streak_days':
-            return stats.current_streak
-        elif criteria_type == 'challenge_completion':
-            return stats.challenges_completed
-        elif criteria_type == 'social_engagement':
-            return stats.badges_earned  # Could be more sophisticated
+    def check_all_users() -> int:
+        """Award newly reachable badges to every user and announce them, returns the award count"""
+        from .events import SocialEventHandler
         
-        return 0.0
+        new_badges = badges.evaluate_all_users()
+        users = {str(user.id): user for user in User.objects.filter(id__in=list(new_badges))}
+        awarded = 0
+        for user_id, user_badges in new_badges.items():
+            awarded += len(user_badges)
+            if user_id in users:
+                for badge in user_badges:
+                    SocialEventHandler.handle_badge_earned(users[user_id], badge)
+        return awarded
     
     @staticmethod
     def create_default_badges():
@@ -170,112 +156,46 @@ class ChallengeService:
     
     @staticmethod
     def update_user_progress(user):
-        """Update user's progress in all challenges"""
+        """Recompute user's progress in all active challenges"""
         try:
-            # Get user's active challenge participations
-            participations = ChallengeParticipation.objects.filter(
-                user=user,
-                is_active=True,
-                challenge__is_active=True,
-                challenge__start_date__lte=timezone.now(),
-                challenge__end_date__gte=timezone.now()
-            ).select_related('challenge')
-            
-            for participation in participations:
-                challenge = participation.challenge
-                new_progress = ChallengeService._calculate_progress(
-                    user, challenge, None, 0
-                )
-                
-                if new_progress > participation.current_progress:
-                    old_progress = participation.current_progress
-                    participation.update_progress(new_progress)
-                    
-                    # Check if challenge was just completed
-                    if participation.is_completed and old_progress < challenge.goal_value:
-                        # Update user stats
-                        stats, _ = UserStats.objects.get_or_create(user=user)
-                        stats.challenges_completed += 1
-                        stats.save()
-            
+            completed = challenges.recompute_user(user)
+            ChallengeService._record_completions(user, completed)
         except Exception as e:
             logger.error(f"Error updating user progress for {user.email}: {e}")
     
     @staticmethod
     def update_user_challenges(user, activity, carbon_saved):
-        """Update user's progress in all active challenges"""
+        """Advance user's progress in all active challenges by a newly logged activity"""
         try:
-            # Get user's active challenge participations
-            participations = ChallengeParticipation.objects.filter(
-                user=user,
-                is_active=True,
-                challenge__is_active=True,
-                challenge__start_date__lte=timezone.now(),
-                challenge__end_date__gte=timezone.now()
-            ).select_related('challenge')
-            
-            for participation in participations:
-                challenge = participation.challenge
-                new_progress = ChallengeService._calculate_progress(
-                    user, challenge, activity, carbon_saved
-                )
-                
-                if new_progress > participation.current_progress:
-                    old_progress = participation.current_progress
-                    participation.update_progress(new_progress)
-                    
-                    # Check if challenge was just completed
-                    if participation.is_completed and old_progress < challenge.goal_value:
-                        from .events import SocialEventHandler
-                        SocialEventHandler.handle_challenge_completed(user, challenge)
-                        
-                        # Update user stats
-                        stats, _ = UserStats.objects.get_or_create(user=user)
-                        stats.challenges_completed += 1
-                        stats.save()
-            
+            completed = challenges.apply_activity(user, activity, carbon_saved)
+            ChallengeService._record_completions(user, completed)
         except Exception as e:
             logger.error(f"Error updating challenges for user {user.email}: {e}")
     
     @staticmethod
-    def _calculate_progress(user, challenge: Challenge, activity, carbon_saved) -> float:
-        """Calculate user's progress for a specific challenge"""
-        goal_type = challenge.goal_type
+    def recompute_challenge(challenge: Challenge) -> int:
+        """Recompute all participants of a challenge and announce completions in bulk"""
+        from .events import SocialEventHandler
         
-        if goal_type == 'activity_count':
-            # Count activities in challenge period
-            return user.activities.filter(
-                created_at__gte=challenge.start_date,
-                created_at__lte=challenge.end_date
-            ).count()
-            
-        elif goal_type == 'co2_reduction':
-            # Sum CO2 savings in challenge period
-            from carbon.models import CarbonCalculation
-            total_saved = CarbonCalculation.objects.filter(
-                activity__user=user,
-                activity__created_at__gte=challenge.start_date,
-                activity__created_at__lte=challenge.end_date
-            ).aggregate(
-                total=models.Sum('co2_equivalent_kg')
-            )['total'] or 0
-            return total_saved
-            
-        elif goal_type == 'streak_days':
-            # Calculate streak during challenge period
-            stats, _ = UserStats.objects.get_or_create(user=user)
-            return stats.current_streak
-            
-        elif goal_type == 'category_focus':
-            # Count activities in specific category
-            target_category = challenge.metadata.get('target_category', 'transportation')
-            return user.activities.filter(
-                created_at__gte=challenge.start_date,
-                created_at__lte=challenge.end_date,
-                category__category_type=target_category
-            ).count()
+        completed_user_ids = challenges.recompute_challenge(challenge)
+        for i in range(0, len(completed_user_ids), challenges.RECOMPUTE_BATCH_SIZE):
+            UserStats.objects.filter(
+                user_id__in=completed_user_ids[i:i + challenges.RECOMPUTE_BATCH_SIZE]
+            ).update(challenges_completed=F('challenges_completed') + 1)
+        if completed_user_ids:
+            SocialEventHandler.handle_challenge_completions(challenge, completed_user_ids)
+        return len(completed_user_ids)
+    
+    @staticmethod
+    def _record_completions(user, completed: List[Challenge]):
+        """Count and announce challenges a user just completed"""
+        if not completed:
+            return
+        from .events import SocialEventHandler
         
-        return 0.0
+        SocialService.increment_stats(user, challenges_completed=len(completed))
+        for challenge in completed:
+            SocialEventHandler.handle_challenge_completed(user, challenge)
     
     @staticmethod
     def join_challenge(user, challenge: Challenge) -> ChallengeParticipation:
@@ -374,149 +294,478 @@ class LeaderboardService:
         except Exception as e:
             logger.error(f"Error updating leaderboards for user {user.email}: {e}")
     
+    @staticmethod
+    def queue_user_rankings(user):
+        """
+        Mark a user's leaderboard scores stale. Queued users are applied to
+        every active leaderboard by one background flush per
+        LEADERBOARD_UPDATE_INTERVAL, so bursts of activity coalesce.
+        """
+        interval = getattr(settings, 'LEADERBOARD_UPDATE_INTERVAL', 30)
+        if interval <= 0:
+            LeaderboardService.update_user_rankings(user)
+            return
+        
+        try:
+            get_leaderboard_store().add_pending([user.id])
+            # Only the first change in an interval schedules the flush
+            if cache.add(FLUSH_SCHEDULED_KEY, True, interval):
+                from .tasks import flush_leaderboard_updates
+                flush_leaderboard_updates.apply_async(countdown=interval)
+        except Exception as e:
+            logger.error(f"Error queueing leaderboard update for user {user.email}: {e}")
+            cache.delete(FLUSH_SCHEDULED_KEY)
+            LeaderboardService.update_user_rankings(user)
+    
+    @staticmethod
+    def flush_pending_rankings() -> int:
+        """Apply every queued user's scores, each active leaderboard once"""
+        cache.delete(FLUSH_SCHEDULED_KEY)
+        user_ids = get_leaderboard_store().pop_pending()
+        if not user_ids:
+            return 0
+        
+        for leaderboard in Leaderboard.objects.filter(is_active=True):
+            try:
+                LeaderboardService.apply_score_updates(leaderboard, user_ids)
+            except Exception as e:
+                logger.error(f"Error applying queued updates to leaderboard {leaderboard.name}: {e}")
+        return len(user_ids)
+    
+    @staticmethod
+    def apply_score_updates(leaderboard: Leaderboard, user_ids: List[str]):
+        """Refresh several users' live scores on one leaderboard and notify rank changes"""
+        period_start, _ = LeaderboardService._get_period_dates(leaderboard.time_period)
+        store = LeaderboardService._load_store(leaderboard, period_start)
+        
+        old_ranks = {}
+        for user_id in user_ids:
+            position = store.rank(leaderboard.id, period_start, user_id)
+            old_ranks[str(user_id)] = position[0] if position else UNRANKED
+        # Users just outside the top 10 can move up when a queued user drops
+        for user_id, _, rank in store.top(leaderboard.id, period_start, 10 + len(user_ids)):
+            old_ranks.setdefault(user_id, rank)
+        
+        for i in range(0, len(user_ids), RANK_UPDATE_BATCH_SIZE):
+            batch = [str(user_id) for user_id in user_ids[i:i + RANK_UPDATE_BATCH_SIZE]]
+            scores = {
+                str(user_id): score
+                for user_id, score in LeaderboardService._score_queryset(leaderboard).filter(user_id__in=batch)
+            }
+            if scores:
+                store.set_scores(leaderboard.id, period_start, scores)
+            for user_id in batch:
+                if user_id not in scores:
+                    store.remove(leaderboard.id, period_start, user_id)
+        
+        rank_changes = [
+            {'user_id': user_id, 'new_rank': rank, 'old_rank': old_ranks.get(user_id, UNRANKED)}
+            for user_id, _, rank in store.top(leaderboard.id, period_start, 10)
+            if old_ranks.get(user_id, UNRANKED) != rank
+        ]
+        LeaderboardService._notify_rank_changes(leaderboard, rank_changes)
+    
     @staticmethod
     def update_leaderboard(leaderboard: Leaderboard):
-        """Update all entries for a specific leaderboard"""
+        """
+        Rebuild all entries for a specific leaderboard.
+        
+        Scores come from one query, entries are upserted and ranked in the
+        same pass, and the live store is replaced with the result.
+        """
         try:
             # Get time period for this leaderboard
             period_start, period_end = LeaderboardService._get_period_dates(leaderboard.time_period)
+            rebuild_started = timezone.now()
             
-            # Get all users who have stats
-            users_with_stats = UserStats.objects.select_related('user').all()
+            scores = list(LeaderboardService._score_queryset(leaderboard))
+            rank_changes = LeaderboardService._upsert_entries(
+                leaderboard, period_start, period_end, scores, check_users=False
+            )
             
-            # Update entries for all users
-            for stats in users_with_stats:
-                user = stats.user
-                
-                # Calculate user's score
-                score = LeaderboardService._calculate_score(user, leaderboard)
-                
-                # Skip users with 0 score unless it's a streak leaderboard where 0 is valid
-                if score == 0 and leaderboard.metric_type != 'streak_days':
-                    continue
-                
-                # Get or create entry
-                entry, created = LeaderboardEntry.objects.get_or_create(
-                    leaderboard=leaderboard,
-                    user=user,
-                    period_start=period_start,
-                    defaults={
-                        'score': score,
-                        'period_end': period_end,
-                        'rank': 999999  # Temporary rank
-                    }
-                )
-                
-                if not created:
-                    entry.previous_rank = entry.rank
-                    entry.score = score
-                    entry.period_end = period_end
-                    entry.save()
+            # Users who no longer score drop off the board
+            LeaderboardEntry.objects.filter(
+                leaderboard=leaderboard,
+                period_start=period_start,
+                last_updated__lt=rebuild_started
+            ).delete()
             
-            # Recalculate rankings for this leaderboard
-            LeaderboardService._recalculate_rankings(leaderboard, period_start)
+            # Replace the live scores with the rebuilt ones
+            store = get_leaderboard_store()
+            store.clear(leaderboard.id, period_start)
+            if scores:
+                store.set_scores(leaderboard.id, period_start, dict(scores))
+            
+            LeaderboardService._notify_rank_changes(leaderboard, rank_changes)
+            return len(scores)
             
         except Exception as e:
             logger.error(f"Error updating leaderboard {leaderboard.name}: {e}")
             raise
     
+    @staticmethod
+    def _score_queryset(leaderboard: Leaderboard):
+        """
+        (user_id, score) for every scoring user, highest first, in one query.
+        
+        Period boards score CO2 from the period totals kept on UserStats and
+        activity counts from the per-day rollups inside the period window.
+        Streaks, badge points and challenge completions have no per-period
+        history and always use the current value.
+        """
+        metric_type = leaderboard.metric_type
+        time_period = leaderboard.time_period
+        
+        if time_period in PERIOD_CO2_FIELDS and metric_type == 'activity_count':
+            from users.models import UserMetrics
+            
+            period_start, period_end = LeaderboardService._get_period_dates(time_period)
+            return UserMetrics.objects.filter(
+                metric_date__gte=period_start.date(),
+                metric_date__lt=period_end.date()
+            ).values('user_id').annotate(
+                score=models.Sum('activities_count')
+            ).exclude(score=0).order_by('-score', 'user_id').values_list('user_id', 'score')
+        
+        if time_period in PERIOD_CO2_FIELDS and metric_type == 'total_co2_saved':
+            field = PERIOD_CO2_FIELDS[time_period]
+        else:
+            field = METRIC_FIELDS.get(metric_type)
+        if not field:
+            return UserStats.objects.none().values_list('user_id', 'id')
+        
+        queryset = UserStats.objects.annotate(score=F(field))
+        # Skip users with 0 score unless it's a streak leaderboard where 0 is valid
+        if metric_type != 'streak_days':
+            queryset = queryset.exclude(score=0)
+        return queryset.order_by('-score', 'user_id').values_list('user_id', 'score')
+    
     @staticmethod
     def _update_leaderboard_entry(user, leaderboard: Leaderboard):
-        """Update a specific leaderboard entry for a user"""
-        period_start, period_end = LeaderboardService._get_period_dates(leaderboard.time_period)
+        """Update a user's live score in the leaderboard store"""
+        period_start, _ = LeaderboardService._get_period_dates(leaderboard.time_period)
         
         # Calculate user's score
         score = LeaderboardService._calculate_score(user, leaderboard)
         
-        # Get existing entry or create new one
-        entry, created = LeaderboardEntry.objects.get_or_create(
-            leaderboard=leaderboard,
-            user=user,
-            period_start=period_start,
-            defaults={
-                'score': score,
-                'period_end': period_end,
-                'rank': 999999  # Temporary rank
+        store = LeaderboardService._load_store(leaderboard, period_start)
+        previous = store.rank(leaderboard.id, period_start, user.id)
+        store.set_score(leaderboard.id, period_start, user.id, score)
+        new_rank, _ = store.rank(leaderboard.id, period_start, user.id)
+        
+        old_rank = previous[0] if previous else UNRANKED
+        if new_rank != old_rank and new_rank <= 10:  # Only notify for top 10
+            from .events import SocialEventHandler
+            SocialEventHandler.handle_leaderboard_rank_change(
+                user, leaderboard.leaderboard_type, new_rank, old_rank
+            )
+    
+    @staticmethod
+    def _load_store(leaderboard: Leaderboard, period_start: datetime):
+        """The leaderboard store, seeded from persisted entries if it is empty"""
+        store = get_leaderboard_store()
+        if not store.count(leaderboard.id, period_start):
+            persisted = dict(LeaderboardEntry.objects.filter(
+                leaderboard=leaderboard,
+                period_start=period_start
+            ).values_list('user_id', 'score'))
+            if persisted:
+                store.set_scores(leaderboard.id, period_start, persisted)
+        return store
+    
+    @staticmethod
+    def get_standings(leaderboard: Leaderboard, limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """Live top entries, read from the leaderboard store"""
+        period_start, _ = LeaderboardService._get_period_dates(leaderboard.time_period)
+        store = LeaderboardService._load_store(leaderboard, period_start)
+        ranked = store.top(leaderboard.id, period_start, limit, offset)
+        users = {
+            str(user.id): user
+            for user in User.objects.filter(id__in=[user_id for user_id, _, _ in ranked])
+        }
+        return [
+            {'user': users[user_id], 'rank': rank, 'score': score}
+            for user_id, score, rank in ranked
+            if user_id in users
+        ]
+    
+    @staticmethod
+    def get_user_position(leaderboard: Leaderboard, user) -> Optional[Dict[str, Any]]:
+        """A user's live rank and score, None if they are not on the board"""
+        period_start, period_end = LeaderboardService._get_period_dates(leaderboard.time_period)
+        store = LeaderboardService._load_store(leaderboard, period_start)
+        position = store.rank(leaderboard.id, period_start, user.id)
+        if position is None:
+            return None
+        return {
+            'rank': position[0],
+            'score': position[1],
+            'total_entries': store.count(leaderboard.id, period_start),
+            'period_start': period_start,
+            'period_end': period_end,
+        }
+    
+    @staticmethod
+    def get_user_entry(leaderboard: Leaderboard, user) -> Optional[LeaderboardEntry]:
+        """
+        A user's entry with the live rank and score, None if they are not on
+        the board. Not saved, scores are written back by the periodic flush.
+        """
+        position = LeaderboardService.get_user_position(leaderboard, user)
+        if position is None:
+            return None
+        entry = LeaderboardEntry.objects.filter(
+            leaderboard=leaderboard, user=user, period_start=position['period_start']
+        ).first()
+        if entry is None:
+            # Scored since the last flush
+            entry = LeaderboardEntry(
+                id=None,
+                leaderboard=leaderboard,
+                user=user,
+                period_start=position['period_start'],
+                period_end=position['period_end'],
+                last_updated=timezone.now()
+            )
+        else:
+            # As the next flush will record it
+            entry.previous_rank = entry.rank
+        entry.rank = position['rank']
+        entry.score = position['score']
+        return entry
+    
+    @staticmethod
+    def get_neighbours(leaderboard: Leaderboard, user, radius: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Entries up to ``radius`` places above and below a user, None if they
+        are not on the board. Read from the live store, or from persisted
+        entries by rank when the store holds nothing for the period.
+        """
+        period_start, _ = LeaderboardService._get_period_dates(leaderboard.time_period)
+        store = get_leaderboard_store()
+        if store.count(leaderboard.id, period_start):
+            ranked = store.around(leaderboard.id, period_start, user.id, radius)
+            if not ranked:
+                return None
+            users = {
+                str(u.id): u
+                for u in User.objects.filter(id__in=[user_id for user_id, _, _ in ranked])
             }
+            return [
+                {'user': users[user_id], 'rank': rank, 'score': score}
+                for user_id, score, rank in ranked
+                if user_id in users
+            ]
+        
+        entries = LeaderboardEntry.objects.filter(leaderboard=leaderboard, period_start=period_start)
+        own = entries.filter(user=user).select_related('user').first()
+        if own is None:
+            return None
+        # Ties are ordered by user id so the window is stable
+        above = entries.filter(
+            models.Q(rank__lt=own.rank) | models.Q(rank=own.rank, user_id__lt=own.user_id)
+        ).select_related('user').order_by('-rank', '-user_id')[:radius]
+        below = entries.filter(
+            models.Q(rank__gt=own.rank) | models.Q(rank=own.rank, user_id__gt=own.user_id)
+        ).select_related('user').order_by('rank', 'user_id')[:radius]
+        return [
+            {'user': entry.user, 'rank': entry.rank, 'score': entry.score}
+            for entry in [*reversed(above), own, *below]
+        ]
+    
+    @staticmethod
+    def persist_leaderboard(leaderboard: Leaderboard) -> int:
+        """Write live scores for the current period back to LeaderboardEntry"""
+        period_start, period_end = LeaderboardService._get_period_dates(leaderboard.time_period)
+        store = get_leaderboard_store()
+        scores = list(store.scores(leaderboard.id, period_start))
+        if not scores:
+            return 0
+        LeaderboardService._upsert_entries(leaderboard, period_start, period_end, scores)
+        return len(scores)
+    
+    @staticmethod
+    def rollover_leaderboard(leaderboard: Leaderboard) -> int:
+        """
+        Close the previous period and start the current one in one transaction.
+        
+        The closing period's live scores are written back with their final
+        ranks and its sorted set is dropped. The new period starts from its
+        actual scores: on CO2 and activity count boards the period totals were
+        just reset, so it starts (nearly) empty and users join on their next
+        activity. Metrics without per-period history (streaks, badge points,
+        challenges) carry their current values over. Returns the users seeded.
+        """
+        period_start, period_end = LeaderboardService._get_period_dates(leaderboard.time_period)
+        previous_start, previous_end = LeaderboardService._get_period_dates(
+            leaderboard.time_period, at=period_start - timedelta(microseconds=1)
         )
+        store = get_leaderboard_store()
+        closing = list(store.scores(leaderboard.id, previous_start))
+        scores = list(LeaderboardService._score_queryset(leaderboard))
         
-        if not created:
-            entry.previous_rank = entry.rank
-            entry.score = score
-            entry.save()
+        with transaction.atomic():
+            if closing:
+                LeaderboardService._upsert_entries(leaderboard, previous_start, previous_end, closing)
+            LeaderboardService._upsert_entries(
+                leaderboard, period_start, period_end, scores, check_users=False
+            )
         
-        # Recalculate rankings for this leaderboard
-        LeaderboardService._recalculate_rankings(leaderboard, period_start)
+        store.clear(leaderboard.id, previous_start)
+        store.clear(leaderboard.id, period_start)
+        if scores:
+            store.set_scores(leaderboard.id, period_start, dict(scores))
+        logger.info(f"Rolled over leaderboard {leaderboard.name}: {len(closing)} closed, {len(scores)} seeded")
+        return len(scores)
     
     @staticmethod
-    def _calculate_score(user, leaderboard: Leaderboard) -> float:
-        """Calculate user's score for a leaderboard"""
-        metric_type = leaderboard.metric_type
-        stats, _ = UserStats.objects.get_or_create(user=user)
+    def compact_leaderboard(leaderboard: Leaderboard) -> int:
+        """
+        Fold the entries of every closed period into one LeaderboardSnapshot
+        per period and delete the per-user rows. Returns the periods compacted.
+        """
+        if leaderboard.time_period == 'all_time':
+            return 0
         
-        if metric_type == 'total_co2_saved':
-            return stats.total_co2_saved
-        elif metric_type == 'activity_count':
-            return stats.total_activities
-        elif metric_type == 'streak_days':
-            return stats.current_streak
-        elif metric_type == 'badge_points':
-            return stats.total_badge_points
-        elif metric_type == 'challenge_completions':
-            return stats.challenges_completed
+        period_start, _ = LeaderboardService._get_period_dates(leaderboard.time_period)
+        closed_periods = LeaderboardEntry.objects.filter(
+            leaderboard=leaderboard,
+            period_start__lt=period_start
+        ).order_by('period_start').values_list('period_start', flat=True).distinct()
         
-        return 0.0
+        compacted = 0
+        for closed_start in list(closed_periods):
+            entries = LeaderboardEntry.objects.filter(leaderboard=leaderboard, period_start=closed_start)
+            rows = list(entries.order_by('rank', 'user_id').values_list('user_id', 'rank', 'score', 'period_end'))
+            
+            with transaction.atomic():
+                LeaderboardSnapshot.objects.update_or_create(
+                    leaderboard=leaderboard,
+                    period_start=closed_start,
+                    defaults={
+                        'period_end': max(period_end for _, _, _, period_end in rows),
+                        'total_entries': len(rows),
+                        'top_entries': [
+                            {'user_id': str(user_id), 'rank': rank, 'score': score}
+                            for user_id, rank, score, _ in rows[:SNAPSHOT_TOP_ENTRIES]
+                        ],
+                        'ranks': {str(user_id): [rank, score] for user_id, rank, score, _ in rows},
+                    }
+                )
+                entries.delete()
+            compacted += 1
+        
+        if compacted:
+            logger.info(f"Compacted {compacted} closed periods of leaderboard {leaderboard.name}")
+        return compacted
     
     @staticmethod
-    def _get_period_dates(time_period: str) -> tuple:
-        """Get start and end dates for a time period"""
-        now = timezone.now()
+    def _upsert_entries(leaderboard: Leaderboard, period_start: datetime, period_end: datetime,
+                        scores: List[tuple], check_users: bool = True) -> List[Dict[str, Any]]:
+        """
+        Upsert entries from (user_id, score) pairs sorted by score descending,
+        ranking them in the same pass. Returns the rank changes.
+        
+        ``check_users`` skips users that no longer exist, for scores that do
+        not come from a database join (the live store).
+        """
+        previous_ranks = {
+            str(user_id): rank
+            for user_id, rank in LeaderboardEntry.objects.filter(
+                leaderboard=leaderboard,
+                period_start=period_start
+            ).values_list('user_id', 'rank')
+        }
+        existing_users = None
+        if check_users:
+            existing_users = set()
+            for i in range(0, len(scores), RANK_UPDATE_BATCH_SIZE):
+                existing_users.update(
+                    str(user_id) for user_id in User.objects.filter(
+                        id__in=[user_id for user_id, _ in scores[i:i + RANK_UPDATE_BATCH_SIZE]]
+                    ).values_list('id', flat=True)
+                )
+        
+        entries = []
+        rank_changes = []
+        rank = 0
+        previous_score = None
+        for position, (user_id, score) in enumerate(scores, 1):
+            user_id = str(user_id)
+            if score != previous_score:
+                rank = position
+                previous_score = score
+            if existing_users is not None and user_id not in existing_users:
+                continue
+            old_rank = previous_ranks.get(user_id)
+            entries.append(LeaderboardEntry(
+                leaderboard=leaderboard,
+                user_id=user_id,
+                score=score,
+                rank=rank,
+                previous_rank=old_rank,
+                period_start=period_start,
+                period_end=period_end,
+            ))
+            if old_rank != rank:
+                rank_changes.append({'user_id': user_id, 'new_rank': rank, 'old_rank': old_rank or UNRANKED})
+        
+        LeaderboardEntry.objects.bulk_create(
+            entries,
+            batch_size=RANK_UPDATE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['leaderboard', 'user', 'period_start'],
+            update_fields=['score', 'rank', 'previous_rank', 'period_end', 'last_updated'],
+        )
+        return rank_changes
+    
+    @staticmethod
+    def _calculate_score(user, leaderboard: Leaderboard) -> float:
+        """Calculate user's score for a leaderboard"""
+        row = LeaderboardService._score_queryset(leaderboard).filter(user_id=user.id).first()
+        return float(row[1]) if row else 0.0
+    
+    @staticmethod
+    def _get_period_dates(time_period: str, at: Optional[datetime] = None) -> tuple:
+        """Get start and end dates for the period containing ``at`` (default now), periods start at midnight"""
+        now = timezone.localtime(at)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
         
         if time_period == 'weekly':
-            start = now - timedelta(days=now.weekday())
+            start = today - timedelta(days=today.weekday())
             end = start + timedelta(days=7)
         elif time_period == 'monthly':
-            start = now.replace(day=1)
+            start = today.replace(day=1)
             if start.month == 12:
                 end = start.replace(year=start.year + 1, month=1)
             else:
                 end = start.replace(month=start.month + 1)
         elif time_period == 'yearly':
-            start = now.replace(month=1, day=1)
+            start = today.replace(month=1, day=1)
             end = start.replace(year=start.year + 1)
-        else:  # all_time
-            start = datetime(2020, 1, 1, tzinfo=timezone.utc)
-            end = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        else:  # all_time, open-ended
+            start = ALL_TIME_START
+            end = now
         
         return start, end
     
     @staticmethod
-    def _recalculate_rankings(leaderboard: Leaderboard, period_start: datetime):
-        """Recalculate rankings for a leaderboard"""
-        entries = LeaderboardEntry.objects.filter(
-            leaderboard=leaderboard,
-            period_start=period_start
-        ).order_by('-score')
-        
-        rank_changes = []
-        for rank, entry in enumerate(entries, 1):
-            old_rank = entry.rank
-            entry.rank = rank
-            entry.save()
-            
-            if old_rank != rank:
-                rank_changes.append({
-                    'user': entry.user,
-                    'new_rank': rank,
-                    'old_rank': old_rank
-                })
+    def _notify_rank_changes(leaderboard: Leaderboard, rank_changes: List[Dict[str, Any]]):
+        """Send real-time updates for significant rank changes"""
+        notify = [change for change in rank_changes if change['new_rank'] <= 10]  # Only notify for top 10
+        if not notify:
+            return
         
-        # Send real-time updates for significant rank changes
         from .events import SocialEventHandler
-        for change in rank_changes:
-            if change['new_rank'] <= 10:  # Only notify for top 10
+        users = {
+            str(user.id): user
+            for user in User.objects.filter(id__in=[change['user_id'] for change in notify])
+        }
+        for change in notify:
+            user = users.get(str(change['user_id']))
+            if user:
                 SocialEventHandler.handle_leaderboard_rank_change(
-                    change['user'],
+                    user,
                     leaderboard.leaderboard_type,
                     change['new_rank'],
                     change['old_rank']
@@ -574,62 +823,90 @@ class SocialService:
     
     @staticmethod
     def update_user_stats(user) -> UserStats:
-        """Update user's social statistics"""
-        from activities.models import Activity
-        
+        """
+        Recompute a user's stats from scratch in one UPDATE. Activity, badge
+        and challenge events keep them current, this is the repair path.
+        """
         try:
             stats, created = UserStats.objects.get_or_create(user=user)
-            
-            # Calculate activity statistics
-            activities = Activity.objects.filter(user=user)
-            total_activities = activities.count()
-            total_co2_saved = float(activities.aggregate(
-                total=models.Sum('co2_kg')
-            )['total'] or 0)
-            
-            # Calculate time-based statistics
-            now = timezone.now()
-            week_start = now - timedelta(days=7)
-            month_start = now.replace(day=1)
-            year_start = now.replace(month=1, day=1)
-            
-            weekly_co2 = float(activities.filter(
-                created_at__gte=week_start
-            ).aggregate(total=models.Sum('co2_kg'))['total'] or 0)
-            
-            monthly_co2 = float(activities.filter(
-                created_at__gte=month_start
-            ).aggregate(total=models.Sum('co2_kg'))['total'] or 0)
-            
-            yearly_co2 = float(activities.filter(
-                created_at__gte=year_start
-            ).aggregate(total=models.Sum('co2_kg'))['total'] or 0)
-            
-            # Update stats
-            stats.total_activities = total_activities
-            stats.total_co2_saved = total_co2_saved
-            stats.weekly_co2_saved = weekly_co2
-            stats.monthly_co2_saved = monthly_co2
-            stats.yearly_co2_saved = yearly_co2
-            
-            # Update badges and challenges counts
-            stats.badges_earned = UserBadge.objects.filter(user=user).count()
-            stats.challenges_completed = ChallengeParticipation.objects.filter(
-                user=user, is_completed=True
-            ).count()
-            
-            # Calculate badge points
-            stats.total_badge_points = UserBadge.objects.filter(user=user).aggregate(
-                total=models.Sum('badge__points')
-            )['total'] or 0
-            
-            # Update streak
-            stats.update_streak()
-            
-            stats.save()
+            SocialService.recompute_stats(UserStats.objects.filter(pk=stats.pk))
+            stats.refresh_from_db()
             logger.info(f"Updated stats for user {user.email}")
             return stats
             
         except Exception as e:
             logger.error(f"Error updating user stats for {user.email}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    @staticmethod
+    def increment_stats(user, **deltas):
+        """Atomically add to a user's stat counters, e.g. badges_earned=1"""
+        UserStats.objects.filter(user=user).update(**{
+            field: F(field) + delta for field, delta in deltas.items()
+        })
+    
+    @staticmethod
+    def _stats_expressions() -> Dict[str, Any]:
+        """
+        Correlated subqueries for every aggregated UserStats counter, so any
+        number of rows can be recomputed by a single UPDATE. Activity totals
+        come from the per-day rollups rather than the activities table.
+        """
+        from users.models import UserMetrics
+        
+        def user_total(queryset, aggregate, output_field):
+            subquery = queryset.filter(user=models.OuterRef('user')).values('user').annotate(
+                total=aggregate
+            ).values('total')
+            return Coalesce(
+                Cast(models.Subquery(subquery), output_field),
+                models.Value(0),
+                output_field=output_field
+            )
+        
+        expressions = {
+            'total_activities': user_total(
+                UserMetrics.objects.all(), models.Sum('activities_count'), models.IntegerField()
+            ),
+            'total_co2_saved': user_total(
+                UserMetrics.objects.all(), models.Sum('co2_kg'), models.FloatField()
+            ),
+            'badges_earned': user_total(
+                UserBadge.objects.all(), models.Count('id'), models.IntegerField()
+            ),
+            'total_badge_points': user_total(
+                UserBadge.objects.all(), models.Sum('badge__points'), models.IntegerField()
+            ),
+            'challenges_completed': user_total(
+                ChallengeParticipation.objects.filter(is_completed=True), models.Count('id'), models.IntegerField()
+            ),
+        }
+        for period, field in PERIOD_CO2_FIELDS.items():
+            period_start, period_end = LeaderboardService._get_period_dates(period)
+            expressions[field] = user_total(
+                UserMetrics.objects.filter(
+                    metric_date__gte=period_start.date(),
+                    metric_date__lt=period_end.date()
+                ),
+                models.Sum('co2_kg'),
+                models.FloatField()
+            )
+        return expressions
+    
+    @staticmethod
+    def recompute_stats(queryset=None) -> int:
+        """Recompute the counters of every UserStats row in ``queryset`` (default all)"""
+        if queryset is None:
+            queryset = UserStats.objects.all()
+        return queryset.update(last_updated=timezone.now(), **SocialService._stats_expressions())
+    
+    @staticmethod
+    def refresh_period_totals():
+        """
+        Recompute every user's period CO2 totals from the daily rollups.
+        Run when periods roll over, activity changes keep them current in between.
+        """
+        expressions = SocialService._stats_expressions()
+        UserStats.objects.update(**{
+            field: expressions[field] for field in PERIOD_CO2_FIELDS.values()
+        })
@@ -0,0 +1,79 @@
+"""
+Signal handlers for social stats, badge definitions, challenge rules and feed timelines
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .badges import EVALUATION_DELAY, EVALUATION_SCHEDULED_KEY, bump_version
+from .challenges import RULE_FIELDS
+from .models import Badge, Challenge, SocialFeed, UserStats
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    """Every user has a stats row for event-driven counter updates to land in"""
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver([post_save, post_delete], sender=Badge)
+def invalidate_badge_index(sender, **kwargs):
+    """Badge definitions changed, rebuild the index once committed"""
+    transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=Badge)
+def evaluate_changed_badge(sender, instance, **kwargs):
+    """A new or changed badge may already be earned by existing users"""
+    # Edits in quick succession (e.g. seeding defaults) share one evaluation
+    if instance.is_active and cache.add(EVALUATION_SCHEDULED_KEY, True, EVALUATION_DELAY):
+        from .tasks import evaluate_all_badges
+        transaction.on_commit(lambda: evaluate_all_badges.apply_async(countdown=EVALUATION_DELAY))
+
+
+@receiver(pre_save, sender=Challenge)
+def remember_challenge_rules(sender, instance, **kwargs):
+    instance._previous_rules = None
+    if not instance._state.adding:
+        instance._previous_rules = Challenge.objects.filter(pk=instance.pk).values(*RULE_FIELDS).first()
+
+
+@receiver(post_save, sender=Challenge)
+def recompute_changed_challenge(sender, instance, created, **kwargs):
+    """Participants' progress is stale once a challenge's goal or window changes"""
+    previous = getattr(instance, '_previous_rules', None)
+    if created or not previous:
+        return
+    if any(previous[field] != getattr(instance, field) for field in RULE_FIELDS):
+        from .tasks import recompute_challenge_progress
+        challenge_id = str(instance.id)
+        transaction.on_commit(lambda: recompute_challenge_progress.delay(challenge_id))
+
+
+@receiver(pre_save, sender=SocialFeed)
+def remember_feed_visibility(sender, instance, **kwargs):
+    instance._previous_visibility = None
+    if not instance._state.adding:
+        instance._previous_visibility = SocialFeed.objects.filter(pk=instance.pk).values(
+            'is_public', 'is_featured'
+        ).first()
+
+
+@receiver(post_save, sender=SocialFeed)
+def fan_out_feed_item(sender, instance, created, **kwargs):
+    """Push new feed items onto their timelines, and move edited ones, once committed"""
+    item_id = str(instance.id)
+    if created:
+        from .tasks import fan_out_feed_items
+        transaction.on_commit(lambda: fan_out_feed_items.delay([item_id]))
+        return
+    
+    previous = getattr(instance, '_previous_visibility', None)
+    if previous and any(previous[field] != getattr(instance, field) for field in previous):
+        from .tasks import refresh_feed_item_timelines
+        transaction.on_commit(lambda: refresh_feed_item_timelines.delay(item_id, previous))
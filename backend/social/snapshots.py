@@ -0,0 +1,113 @@
+"""
+Shared leaderboard snapshots for WebSocket consumers
+The top of each leaderboard is serialized once per interval and the encoded
+message is shared by every consumer in the process, and through the cache by
+every other process, instead of each connection querying on its own.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from ecotrack.cache import CacheManager
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SIZE = 20
+
+
+def snapshot_interval() -> int:
+    return getattr(settings, 'LEADERBOARD_SNAPSHOT_INTERVAL', 5)
+
+
+def build_snapshot(leaderboard_type: str) -> str:
+    """The encoded leaderboard_data message for a leaderboard type"""
+    from .models import Leaderboard, LeaderboardEntry
+    from .services import LeaderboardService
+
+    entries = []
+    leaderboard = Leaderboard.objects.filter(leaderboard_type=leaderboard_type, is_active=True).first()
+    if leaderboard:
+        standings = LeaderboardService.get_standings(leaderboard, SNAPSHOT_SIZE)
+        period_start, _ = LeaderboardService._get_period_dates(leaderboard.time_period)
+        rank_changes = {
+            entry.user_id: entry.rank_change
+            for entry in LeaderboardEntry.objects.filter(
+                leaderboard=leaderboard,
+                period_start=period_start,
+                user_id__in=[standing['user'].id for standing in standings]
+            ).only('user_id', 'rank', 'previous_rank')
+        }
+        entries = [
+            {
+                'rank': standing['rank'],
+                'user_id': str(standing['user'].id),
+                'username': standing['user'].username,
+                'score': standing['score'],
+                'rank_change': rank_changes.get(standing['user'].id, 0)
+            }
+            for standing in standings
+        ]
+
+    return json.dumps({
+        'type': 'leaderboard_data',
+        'leaderboard_type': leaderboard_type,
+        'entries': entries,
+        'timestamp': str(timezone.now())
+    })
+
+
+def load_snapshot(leaderboard_type: str) -> str:
+    """The snapshot shared through the cache, built by whichever process misses first"""
+    key = CacheManager.get_cache_key('leaderboard_snapshot', leaderboard_type)
+    encoded = cache.get(key)
+    if encoded is None:
+        encoded = build_snapshot(leaderboard_type)
+        cache.set(key, encoded, snapshot_interval())
+    return encoded
+
+
+class SnapshotCache:
+    """Per-process snapshots, one build at a time per leaderboard type"""
+
+    def __init__(self):
+        self._snapshots: Dict[str, Tuple[str, float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _fresh(self, leaderboard_type: str):
+        snapshot = self._snapshots.get(leaderboard_type)
+        if snapshot and time.monotonic() - snapshot[1] < snapshot_interval():
+            return snapshot[0]
+        return None
+
+    async def get(self, leaderboard_type: str) -> str:
+        encoded = self._fresh(leaderboard_type)
+        if encoded is not None:
+            return encoded
+
+        # Connections arriving together wait for one load instead of each running it
+        lock = self._locks.setdefault(leaderboard_type, asyncio.Lock())
+        async with lock:
+            encoded = self._fresh(leaderboard_type)
+            if encoded is None:
+                try:
+                    encoded = await sync_to_async(load_snapshot)(leaderboard_type)
+                except Exception as e:
+                    logger.error(f"Error building leaderboard snapshot for {leaderboard_type}: {e}")
+                    encoded = json.dumps({
+                        'type': 'leaderboard_data',
+                        'leaderboard_type': leaderboard_type,
+                        'entries': [],
+                        'timestamp': str(timezone.now())
+                    })
+                self._snapshots[leaderboard_type] = (encoded, time.monotonic())
+            return encoded
+
+
+snapshots = SnapshotCache()
@@ -0,0 +1,96 @@
+"""
+Building blocks shared by the Redis-backed social stores
+(leaderboard scores, feed timelines): a process-local sorted set that
+mirrors Redis ordering for the in-memory backends, and a loader for the
+backend class named in settings.
+"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class SortedSet:
+    """
+    Members ordered by score, highest first, ties by member descending like
+    Redis ZREVRANGE. Not locked, the owning store serialises access.
+    """
+
+    # Sorts after any member, for bisecting past every member with a score
+    _LAST = chr(0x10FFFF)
+
+    def __init__(self):
+        self._scores: Dict[str, float] = {}
+        # Sorted (score, member) ascending, read from the end
+        self._ordered: List[Tuple[float, str]] = []
+
+    def __len__(self):
+        return len(self._scores)
+
+    def score(self, member: str) -> Optional[float]:
+        return self._scores.get(member)
+
+    def add(self, member: str, score: float):
+        self.discard(member)
+        self._scores[member] = float(score)
+        insort(self._ordered, (float(score), member))
+
+    def discard(self, member: str):
+        old = self._scores.pop(member, None)
+        if old is not None:
+            del self._ordered[bisect_left(self._ordered, (old, member))]
+
+    def position(self, member: str) -> Optional[int]:
+        """Zero-based index of a member, highest first, None if absent"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        return len(self._ordered) - 1 - bisect_left(self._ordered, (score, member))
+
+    def count_above(self, score: float) -> int:
+        """Members scoring strictly higher"""
+        return len(self._ordered) - bisect_right(self._ordered, (float(score), self._LAST))
+
+    def _descending(self, end: int, limit: int) -> List[Tuple[str, float]]:
+        """(member, score) rows below ascending index ``end``, highest first"""
+        return [(member, score) for score, member in reversed(self._ordered[max(end - limit, 0):end])]
+
+    def range(self, offset: int, limit: int) -> List[Tuple[str, float]]:
+        """(member, score) rows from an index, highest first"""
+        return self._descending(len(self._ordered) - offset, limit)
+
+    def after(self, member: str, score: float, limit: int) -> List[Tuple[str, float]]:
+        """Rows ordered after (member, score), whether or not it is still present"""
+        return self._descending(bisect_left(self._ordered, (float(score), member)), limit)
+
+    def trim(self, length: int):
+        """Keep only the ``length`` highest scoring members"""
+        excess = len(self._ordered) - length
+        if excess > 0:
+            for _, member in self._ordered[:excess]:
+                del self._scores[member]
+            del self._ordered[:excess]
+
+
+class StoreLoader:
+    """The store class named by a setting, instantiated once per process"""
+
+    def __init__(self, setting: str, default: str):
+        self.setting = setting
+        self.default = default
+        self._store = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = import_string(getattr(settings, self.setting, self.default))()
+        return self._store
+
+    def reset(self):
+        """Forget the instance, e.g. after the setting changes in tests"""
+        with self._lock:
+            self._store = None
@@ -0,0 +1,164 @@
+"""
+Activity streaks from per-user active day bitsets
+Bit i of UserStats.active_days marks activity on STREAK_EPOCH + i days in
+the user's local calendar, so streaks are read off the bits rather than
+queried from activities.
+"""
+import logging
+from datetime import date, datetime
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserStats
+
+logger = logging.getLogger(__name__)
+
+STREAK_EPOCH = date(2020, 1, 1)
+REBUILD_BATCH_SIZE = 1000
+
+
+def day_offset(day: date) -> int:
+    return (day - STREAK_EPOCH).days
+
+
+def local_today_offset(timezone_name: Optional[str], now: Optional[datetime] = None) -> int:
+    try:
+        tz = ZoneInfo(timezone_name or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo('UTC')
+    return day_offset((now or timezone.now()).astimezone(tz).date())
+
+
+def set_day(bits: bytes, offset: int, active: bool) -> bytes:
+    """The bitset with one day set or cleared, trailing empty bytes trimmed"""
+    buffer = bytearray(bits)
+    index, mask = divmod(offset, 8)
+    if index >= len(buffer):
+        if not active:
+            return bytes(buffer)
+        buffer.extend(bytes(index + 1 - len(buffer)))
+    if active:
+        buffer[index] |= 1 << mask
+    else:
+        buffer[index] &= ~(1 << mask) & 0xFF
+    return bytes(buffer.rstrip(b'\x00'))
+
+
+def last_day(bits: bytes) -> Optional[int]:
+    """Offset of the latest active day, bitsets are kept trimmed so this is O(1)"""
+    if not bits:
+        return None
+    return (len(bits) - 1) * 8 + bits[-1].bit_length() - 1
+
+
+def streaks_from_bits(bits: bytes, today: int) -> Tuple[int, int]:
+    """
+    (current, longest) streak. The current streak ends today, or yesterday
+    while today has nothing logged yet.
+    """
+    value = int.from_bytes(bits, 'little')
+
+    # Each AND with the shifted value shortens every run by one day
+    longest = 0
+    runs = value
+    while runs:
+        runs &= runs >> 1
+        longest += 1
+
+    end = today if value >> today & 1 else today - 1
+    current = 0
+    while end - current >= 0 and value >> (end - current) & 1:
+        current += 1
+    return current, longest
+
+
+def record_active_day(user, day: date, active: bool):
+    """
+    Mark a local day as active or inactive for a user. A new day right after
+    a live streak extends it in O(1), anything else is recounted from the bits.
+    """
+    offset = day_offset(day)
+    if offset < 0:
+        return
+
+    with transaction.atomic():
+        stats = UserStats.objects.select_for_update().filter(user=user).first()
+        if stats is None:
+            return
+
+        bits = bytes(stats.active_days or b'')
+        previous_last = last_day(bits)
+        stats.active_days = set_day(bits, offset, active)
+        today = local_today_offset(getattr(user, 'timezone', None))
+
+        if (active and stats.current_streak and previous_last is not None
+                and offset == previous_last + 1 and offset >= today - 1):
+            stats.current_streak += 1
+            stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+        else:
+            stats.current_streak, stats.longest_streak = streaks_from_bits(stats.active_days, today)
+
+        fields = ['active_days', 'current_streak', 'longest_streak', 'last_updated']
+        if active and offset == last_day(stats.active_days):
+            stats.last_activity_date = timezone.now()
+            fields.append('last_activity_date')
+        stats.save(update_fields=fields)
+
+
+def rebuild_streaks(queryset=None, now: Optional[datetime] = None) -> int:
+    """
+    Recount current and longest streaks for many users at once, one numpy
+    day matrix per batch, and write the rows whose streaks changed. Run
+    regularly so streaks break on days without activity. Returns the users
+    whose streaks changed.
+    """
+    if queryset is None:
+        queryset = UserStats.objects.all()
+    stats_ids = list(queryset.values_list('id', flat=True))
+
+    checked = 0
+    updated = 0
+    for i in range(0, len(stats_ids), REBUILD_BATCH_SIZE):
+        rows = list(UserStats.objects.filter(id__in=stats_ids[i:i + REBUILD_BATCH_SIZE]).values_list(
+            'id', 'active_days', 'user__timezone', 'current_streak', 'longest_streak'
+        ))
+        if not rows:
+            continue
+
+        today = np.array([local_today_offset(tz_name, now) for _, _, tz_name, _, _ in rows])
+        width = max(max(len(bits or b'') for _, bits, _, _, _ in rows), int(today.max()) // 8 + 1)
+        packed = np.zeros((len(rows), width), dtype=np.uint8)
+        for row, (_, bits, _, _, _) in enumerate(rows):
+            if bits:
+                packed[row, :len(bits)] = np.frombuffer(bytes(bits), dtype=np.uint8)
+        days = np.unpackbits(packed, axis=1, bitorder='little').astype(bool)
+
+        # Length of the run ending at each day: distance to the last inactive day
+        positions = np.arange(days.shape[1])
+        last_inactive = np.maximum.accumulate(np.where(days, -1, positions), axis=1)
+        runs = positions - last_inactive
+
+        users = np.arange(len(rows))
+        today_runs = runs[users, today]
+        # today - 1 would wrap to the last column on the epoch day itself
+        yesterday_runs = np.where(today > 0, runs[users, np.maximum(today - 1, 0)], 0)
+        current = np.where(today_runs > 0, today_runs, yesterday_runs)
+        longest = runs.max(axis=1)
+
+        # Most streaks are unchanged from day to day, only the others are written
+        changed = [
+            UserStats(id=stats_id, current_streak=int(current[row]), longest_streak=int(longest[row]))
+            for row, (stats_id, _, _, current_streak, longest_streak) in enumerate(rows)
+            if (current_streak, longest_streak) != (current[row], longest[row])
+        ]
+        if changed:
+            UserStats.objects.bulk_update(changed, ['current_streak', 'longest_streak'], batch_size=REBUILD_BATCH_SIZE)
+        checked += len(rows)
+        updated += len(changed)
+
+    logger.info(f"Rebuilt streaks for {checked} users, {updated} changed")
+    return updated
@@ -0,0 +1,129 @@
+"""
+Background tasks for social features
+"""
+import logging
+
+from celery import group, shared_task
+from django.utils import timezone
+
+from . import outbox, streaks, timelines
+from .models import Challenge, Leaderboard
+from .services import BadgeService, ChallengeService, LeaderboardService, SocialService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def persist_leaderboards():
+    """Write live leaderboard scores back to LeaderboardEntry for history"""
+    persisted = 0
+    for leaderboard in Leaderboard.objects.filter(is_active=True):
+        try:
+            persisted += LeaderboardService.persist_leaderboard(leaderboard)
+        except Exception as e:
+            logger.error(f"Error persisting leaderboard {leaderboard.name}: {e}")
+    logger.info(f"Persisted {persisted} leaderboard entries")
+    return persisted
+
+
+@shared_task
+def rebuild_leaderboard(leaderboard_id):
+    """Rebuild one leaderboard from scratch"""
+    leaderboard = Leaderboard.objects.filter(id=leaderboard_id, is_active=True).first()
+    if not leaderboard:
+        return 0
+    return LeaderboardService.update_leaderboard(leaderboard)
+
+
+@shared_task
+def rebuild_all_leaderboards():
+    """Fan the nightly rebuild out so each active leaderboard runs on its own worker"""
+    leaderboard_ids = [str(pk) for pk in Leaderboard.objects.filter(is_active=True).values_list('id', flat=True)]
+    group(rebuild_leaderboard.s(leaderboard_id) for leaderboard_id in leaderboard_ids).apply_async()
+    logger.info(f"Queued rebuild of {len(leaderboard_ids)} leaderboards")
+    return len(leaderboard_ids)
+
+
+@shared_task
+def flush_leaderboard_updates():
+    """Apply queued leaderboard score changes, scheduled by queue_user_rankings"""
+    return LeaderboardService.flush_pending_rankings()
+
+
+@shared_task
+def rollover_leaderboards():
+    """
+    Run just after midnight: reset the period CO2 totals, then close every
+    period leaderboard whose period starts today and start the new period
+    from its actual scores.
+    """
+    SocialService.refresh_period_totals()
+    
+    today = timezone.localdate()
+    seeded = 0
+    for leaderboard in Leaderboard.objects.filter(is_active=True).exclude(time_period='all_time'):
+        period_start, _ = LeaderboardService._get_period_dates(leaderboard.time_period)
+        if period_start.date() != today:
+            continue
+        try:
+            seeded += LeaderboardService.rollover_leaderboard(leaderboard)
+        except Exception as e:
+            logger.error(f"Error rolling over leaderboard {leaderboard.name}: {e}")
+    return seeded
+
+
+@shared_task
+def compact_leaderboard_history():
+    """Compact entries of closed leaderboard periods into snapshots"""
+    compacted = 0
+    for leaderboard in Leaderboard.objects.filter(is_active=True):
+        try:
+            compacted += LeaderboardService.compact_leaderboard(leaderboard)
+        except Exception as e:
+            logger.error(f"Error compacting leaderboard {leaderboard.name}: {e}")
+    return compacted
+
+
+@shared_task
+def rebuild_streaks():
+    """Recount every user's streaks so days without activity break them"""
+    return streaks.rebuild_streaks()
+
+
+@shared_task
+def evaluate_all_badges():
+    """Award badges every user has reached, after badge definitions change"""
+    return BadgeService.check_all_users()
+
+
+@shared_task
+def recompute_challenge_progress(challenge_id):
+    """Recompute every participant of a challenge after its rules change"""
+    challenge = Challenge.objects.filter(id=challenge_id).first()
+    if not challenge:
+        return 0
+    return ChallengeService.recompute_challenge(challenge)
+
+
+@shared_task
+def process_social_events():
+    """Consume a batch of the social event outbox"""
+    return outbox.process_pending()
+
+
+@shared_task
+def purge_social_events():
+    """Delete processed outbox events past their retention"""
+    return outbox.purge_processed()
+
+
+@shared_task
+def fan_out_feed_items(item_ids, user_ids=None):
+    """Push feed items onto the timelines of everyone who should see them"""
+    return timelines.fan_out(item_ids, user_ids)
+
+
+@shared_task
+def refresh_feed_item_timelines(item_id, previous):
+    """Move a feed item between timelines after its visibility changed"""
+    return timelines.refresh_item(item_id, previous)
@@ -1,3 +1,340 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import events, feed, outbox, streaks, timelines
+from .leaderboard_store import InMemoryLeaderboardStore, get_leaderboard_store
+from .models import Leaderboard, LeaderboardEntry, SocialEvent, SocialFeed, UserStats
+from .pagination import FeedCursorPagination
+from .services import LeaderboardService
+from .serializers import LeaderboardEntrySerializer
+from .stores import SortedSet
+
+User = get_user_model()
+
+
+class SortedSetTests(TestCase):
+    def test_orders_by_score_then_member_descending(self):
+        ranked = SortedSet()
+        ranked.add('a', 10)
+        ranked.add('b', 10)
+        ranked.add('c', 20)
+        self.assertEqual(ranked.range(0, 10), [('c', 20.0), ('b', 10.0), ('a', 10.0)])
+        self.assertEqual(ranked.range(1, 1), [('b', 10.0)])
+        self.assertEqual(ranked.position('a'), 2)
+        self.assertEqual(ranked.count_above(10), 1)
+
+    def test_add_replaces_score(self):
+        ranked = SortedSet()
+        ranked.add('a', 5)
+        ranked.add('a', 50)
+        self.assertEqual(len(ranked), 1)
+        self.assertEqual(ranked.range(0, 10), [('a', 50.0)])
+
+    def test_after_missing_member_continues_from_score(self):
+        ranked = SortedSet()
+        for member, score in [('a', 30), ('b', 20), ('c', 10)]:
+            ranked.add(member, score)
+        ranked.discard('b')
+        self.assertEqual(ranked.after('b', 20, 10), [('c', 10.0)])
+
+    def test_trim_keeps_highest(self):
+        ranked = SortedSet()
+        for score in range(5):
+            ranked.add(str(score), score)
+        ranked.trim(2)
+        self.assertEqual([member for member, _ in ranked.range(0, 10)], ['4', '3'])
+        self.assertIsNone(ranked.score('0'))
+
+
+class LeaderboardStoreTests(TestCase):
+    def setUp(self):
+        self.store = InMemoryLeaderboardStore()
+        self.period = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.store.set_scores(1, self.period, {'a': 5, 'b': 7, 'c': 5, 'd': 1, 'e': 5})
+
+    def test_ties_share_a_rank(self):
+        self.assertEqual(
+            self.store.top(1, self.period, 10),
+            [('b', 7.0, 1), ('e', 5.0, 2), ('c', 5.0, 2), ('a', 5.0, 2), ('d', 1.0, 5)]
+        )
+        self.assertEqual(self.store.rank(1, self.period, 'a'), (2, 5.0))
+        self.assertIsNone(self.store.rank(1, self.period, 'z'))
+
+    def test_top_with_offset_keeps_absolute_ranks(self):
+        self.assertEqual(self.store.top(1, self.period, 2, 2), [('c', 5.0, 2), ('a', 5.0, 2)])
+        self.assertEqual(self.store.top(1, self.period, 2, 4), [('d', 1.0, 5)])
+        self.assertEqual(self.store.top(1, self.period, 2, 10), [])
+
+    def test_around(self):
+        self.assertEqual([row[0] for row in self.store.around(1, self.period, 'c', 1)], ['e', 'c', 'a'])
+        self.assertEqual([row[0] for row in self.store.around(1, self.period, 'b', 2)], ['b', 'e', 'c'])
+        self.assertEqual([row[0] for row in self.store.around(1, self.period, 'd', 1)], ['a', 'd'])
+        self.assertEqual(self.store.around(1, self.period, 'z', 1), [])
+
+    def test_updates_and_removal(self):
+        self.store.set_score(1, self.period, 'd', 9)
+        self.assertEqual(self.store.rank(1, self.period, 'd'), (1, 9.0))
+        self.store.remove(1, self.period, 'd')
+        self.assertEqual(self.store.count(1, self.period), 4)
+        self.assertEqual(self.store.count(2, self.period), 0)
+
+
+@override_settings(
+    LEADERBOARD_STORE_BACKEND='social.leaderboard_store.InMemoryLeaderboardStore',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class LeaderboardPersistenceTests(TestCase):
+    def setUp(self):
+        get_leaderboard_store.reset()
+        cache.clear()
+        self.leaderboard = Leaderboard.objects.create(
+            name='Most active', description='', leaderboard_type='global',
+            metric_type='activity_count', time_period='all_time'
+        )
+        self.users = [
+            User.objects.create_user(email=f'player{i}@example.com', username=f'player{i}', password='pass')
+            for i in range(3)
+        ]
+        for activities, user in zip([3, 5, 3], self.users):
+            UserStats.objects.filter(user=user).update(total_activities=activities)
+        LeaderboardService.update_leaderboard(self.leaderboard)
+        self.period_start, _ = LeaderboardService._get_period_dates(self.leaderboard.time_period)
+
+    def tearDown(self):
+        get_leaderboard_store.reset()
+
+    def test_live_scores_persist_and_reseed_an_empty_store(self):
+        get_leaderboard_store().set_score(self.leaderboard.id, self.period_start, self.users[0].id, 8)
+        self.assertEqual(LeaderboardService.persist_leaderboard(self.leaderboard), 3)
+        entry = LeaderboardEntry.objects.get(leaderboard=self.leaderboard, user=self.users[0])
+        self.assertEqual((entry.rank, entry.score), (1, 8))
+
+        get_leaderboard_store.reset()
+        self.assertEqual(LeaderboardService.get_user_position(self.leaderboard, self.users[0])['rank'], 1)
+        self.assertEqual(get_leaderboard_store().count(self.leaderboard.id, self.period_start), 3)
+
+    def test_position_keeps_the_entry_shape(self):
+        get_leaderboard_store().set_score(self.leaderboard.id, self.period_start, self.users[2].id, 6)
+        client = APIClient()
+        client.force_authenticate(self.users[2])
+        response = client.get(f'/api/v1/social/leaderboards/{self.leaderboard.id}/position/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), set(LeaderboardEntrySerializer.Meta.fields))
+        self.assertEqual((response.data['rank'], response.data['score']), (1, 6))
+        self.assertEqual(response.data['previous_rank'], 2)
+        self.assertEqual(response.data['rank_change'], 1)
+
+
+@override_settings(TIMELINE_STORE_BACKEND='social.timelines.InMemoryTimelineStore', TIMELINE_MAX_LENGTH=3)
+class TimelineTests(TestCase):
+    def setUp(self):
+        timelines.get_timeline_store.reset()
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='pass')
+        self.items = []
+        now = timezone.now()
+        for minutes in range(5):
+            item = SocialFeed.objects.create(
+                user=self.author, activity_type='badge_earned', title=f'Item {minutes}', description=''
+            )
+            SocialFeed.objects.filter(id=item.id).update(created_at=now - timedelta(minutes=minutes))
+            item.refresh_from_db()
+            self.items.append(item)
+        timelines.fan_out([item.id for item in self.items])
+
+    def tearDown(self):
+        timelines.get_timeline_store.reset()
+
+    def read_all(self, key, fallback, limit=2):
+        timeline = timelines.Timeline(key, fallback)
+        seen, cursor = [], None
+        while True:
+            page, cursor = timeline.after(cursor, limit)
+            seen += page
+            if cursor is None:
+                return seen
+
+    def test_pages_continue_from_database_past_cap(self):
+        fallback = SocialFeed.objects.filter(is_public=True).order_by('-created_at', '-id')
+        self.assertEqual(timelines.get_timeline_store().count(timelines.public_key()), 3)
+        self.assertEqual(self.read_all(timelines.public_key(), fallback), self.items)
+
+    def test_hidden_items_are_not_served(self):
+        hidden = self.items[1]
+        SocialFeed.objects.filter(id=hidden.id).update(is_public=False)
+        fallback = SocialFeed.objects.filter(is_public=True).order_by('-created_at', '-id')
+
+        page, _ = timelines.Timeline(timelines.public_key(), fallback).after(None, 3)
+        self.assertNotIn(hidden, page)
+        self.assertEqual(len(page), 3)
+        # Pruned from the shared timeline, still on the author's own
+        store = timelines.get_timeline_store()
+        self.assertNotIn(str(hidden.id), [item_id for item_id, _ in store.page(timelines.public_key(), 10)])
+        self.assertIn(hidden, timelines.merged([timelines.home_key(self.author.id)], 3))
+
+    def test_refresh_item_moves_between_timelines(self):
+        item = self.items[0]
+        store = timelines.get_timeline_store()
+        SocialFeed.objects.filter(id=item.id).update(is_featured=True)
+        timelines.refresh_item(item.id, {'is_public': True, 'is_featured': False})
+        self.assertEqual(store.page(timelines.FEATURED_KEY, 10)[0][0], str(item.id))
+
+        SocialFeed.objects.filter(id=item.id).update(is_public=False)
+        timelines.refresh_item(item.id, {'is_public': True, 'is_featured': True})
+        self.assertEqual(store.count(timelines.FEATURED_KEY), 0)
+        self.assertNotIn(str(item.id), [item_id for item_id, _ in store.page(timelines.public_key(), 10)])
+        self.assertIn(str(item.id), [item_id for item_id, _ in store.page(timelines.home_key(self.author.id), 10)])
+
+    def test_cursor_pagination_over_queryset(self):
+        paginator = FeedCursorPagination()
+        factory = APIRequestFactory()
+        queryset = SocialFeed.objects.all()
+
+        page = paginator.paginate_queryset(queryset, Request(factory.get('/feed/', {'page_size': 3})))
+        self.assertEqual(page, self.items[:3])
+        cursor = paginator.encode_cursor(paginator.next_cursor)
+        page = paginator.paginate_queryset(queryset, Request(factory.get('/feed/', {'page_size': 3, 'cursor': cursor})))
+        self.assertEqual(page, self.items[3:])
+        self.assertIsNone(paginator.get_next_link())
+
+        with self.assertRaises(NotFound):
+            paginator.paginate_queryset(queryset, Request(factory.get('/feed/', {'cursor': 'not-a-cursor'})))
+
+
+class FeedAggregationTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(email=f'user{i}@example.com', username=f'user{i}', password='pass')
+            for i in range(3)
+        ]
+
+    def publish(self, users):
+        return feed.publish(
+            [user.id for user in users], 'badge_earned', 'badge:eco', 'Earned Eco', 'earned Eco', ''
+        )
+
+    def test_repeated_events_share_one_item(self):
+        first = self.publish(self.users[:1])
+        second = self.publish(self.users[1:])
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(SocialFeed.objects.filter(aggregate_key='badge:eco').count(), 1)
+        self.assertEqual(second.actor_count, 3)
+        self.assertEqual(second.title, 'user0 and 2 others earned Eco')
+
+    def test_new_window_starts_a_new_item(self):
+        first = self.publish(self.users[:1])
+        SocialFeed.objects.filter(id=first.id).update(aggregate_window=first.aggregate_window - 1)
+        self.assertNotEqual(self.publish(self.users[1:2]).id, first.id)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    SOCIAL_EVENT_MAX_ATTEMPTS=3
+)
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='outbox@example.com', username='outbox', password='pass')
+        SocialEvent.objects.create(user=self.user, event_type='activity_logged', payload={'carbon_saved': 1.5})
+        self.channel_layer = mock.Mock(group_send=mock.AsyncMock())
+        self.calls = 0
+
+    def handle(self, user, logged):
+        # Notifies, then fails on the first attempt
+        self.calls += 1
+        events.EventDispatcher.send_notification(str(user.id), 'activity_logged', 'Activity Logged', '')
+        if self.calls == 1:
+            raise RuntimeError('leaderboard store unavailable')
+
+    def process(self):
+        with mock.patch.object(events, 'channel_layer', self.channel_layer), \
+                mock.patch.object(events.SocialEventHandler, 'handle_activities_logged', self.handle), \
+                self.captureOnCommitCallbacks(execute=True):
+            return outbox.process_pending()
+
+    def test_failed_batch_notifies_only_once_retried(self):
+        self.assertEqual(self.process(), 0)
+        event = SocialEvent.objects.get()
+        self.assertEqual((event.attempts, event.processed_at), (1, None))
+        self.assertIn('leaderboard store unavailable', event.last_error)
+        self.channel_layer.group_send.assert_not_called()
+
+        self.assertEqual(self.process(), 1)
+        self.assertIsNotNone(SocialEvent.objects.get().processed_at)
+        self.channel_layer.group_send.assert_called_once()
+        self.assertEqual(self.channel_layer.group_send.call_args.args[0], f'user_{self.user.id}_notifications')
+
+
+class StreakTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='streak@example.com', username='streak', password='pass')
+
+    def stats(self):
+        return UserStats.objects.get(user=self.user)
+
+    def set_days(self, *days):
+        bits = b''
+        for day in days:
+            bits = streaks.set_day(bits, streaks.day_offset(day), True)
+        UserStats.objects.filter(user=self.user).update(active_days=bits, current_streak=0, longest_streak=0)
+
+    def test_bitset_helpers(self):
+        bits = streaks.set_day(b'', 9, True)
+        self.assertEqual(streaks.last_day(bits), 9)
+        bits = streaks.set_day(bits, 3, True)
+        self.assertEqual(streaks.last_day(streaks.set_day(bits, 9, False)), 3)
+        self.assertEqual(streaks.set_day(b'', 20, False), b'')
+        # 3 and 8-10 active
+        bits = streaks.set_day(streaks.set_day(streaks.set_day(bits, 8, True), 10, True), 9, True)
+        self.assertEqual(streaks.streaks_from_bits(bits, 10), (3, 3))
+        self.assertEqual(streaks.streaks_from_bits(bits, 11), (3, 3))
+        self.assertEqual(streaks.streaks_from_bits(bits, 12), (0, 3))
+
+    def test_recorded_days_continue_and_break(self):
+        today = timezone.now().date()
+        for days_ago in (2, 1, 0):
+            streaks.record_active_day(self.user, today - timedelta(days=days_ago), True)
+        self.assertEqual((self.stats().current_streak, self.stats().longest_streak), (3, 3))
+
+        streaks.record_active_day(self.user, today - timedelta(days=1), False)
+        self.assertEqual((self.stats().current_streak, self.stats().longest_streak), (1, 1))
+
+        streaks.record_active_day(self.user, today - timedelta(days=1), True)
+        self.assertEqual(self.stats().current_streak, 3)
+
+    def test_rebuild_continues_then_breaks(self):
+        self.set_days(date(2024, 3, 7), date(2024, 3, 8), date(2024, 3, 9))
+        noon = datetime(2024, 3, 10, 12, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(streaks.rebuild_streaks(now=noon), 1)
+        self.assertEqual((self.stats().current_streak, self.stats().longest_streak), (3, 3))
+        self.assertEqual(streaks.rebuild_streaks(now=noon), 0)
+
+        streaks.rebuild_streaks(now=noon + timedelta(days=1))
+        self.assertEqual((self.stats().current_streak, self.stats().longest_streak), (0, 3))
+
+    def test_rebuild_across_a_timezone_boundary(self):
+        self.set_days(date(2024, 3, 8), date(2024, 3, 9))
+        # Still March 10th in UTC and Los Angeles, already March 11th in Auckland
+        noon = datetime(2024, 3, 10, 12, tzinfo=dt_timezone.utc)
+        for tz_name, current in [('UTC', 2), ('America/Los_Angeles', 2), ('Pacific/Auckland', 0)]:
+            User.objects.filter(id=self.user.id).update(timezone=tz_name)
+            streaks.rebuild_streaks(now=noon)
+            self.assertEqual(self.stats().current_streak, current, tz_name)
+            self.assertEqual(self.stats().current_streak, streaks.streaks_from_bits(
+                self.stats().active_days, streaks.local_today_offset(tz_name, noon)
+            )[0])
+
+    def test_rebuild_on_the_epoch_day(self):
+        # A day logged ahead of the user's clock must not count as yesterday
+        self.set_days(streaks.STREAK_EPOCH + timedelta(days=7))
+        epoch = datetime.combine(streaks.STREAK_EPOCH, datetime.min.time(), dt_timezone.utc)
+        streaks.rebuild_streaks(now=epoch)
+        self.assertEqual((self.stats().current_streak, self.stats().longest_streak), (0, 1))
@@ -0,0 +1,400 @@
+"""
+Fan-out-on-write social timelines
+When a feed item is created its id is pushed to every timeline it belongs on
+(the author's and their organisation co-members' home timelines, the public
+timeline and its per-type and per-author views, featured), each a capped
+sorted set scored by creation time. Reading a page is one range read plus one
+in_bulk query, however large the SocialFeed table grows.
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import models
+
+from ecotrack.cache import CacheManager
+from .models import SocialFeed
+from .stores import SortedSet, StoreLoader
+
+logger = logging.getLogger(__name__)
+
+FAN_OUT_BATCH_SIZE = 1000
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# (item_id, score), score is the item's creation time from entry_score()
+TimelineEntry = Tuple[str, float]
+
+
+def entry_score(created_at: datetime) -> int:
+    """Microseconds since the epoch, exact as a Redis (double) score"""
+    return (created_at - EPOCH) // timedelta(microseconds=1)
+
+
+def score_time(score: float) -> datetime:
+    return EPOCH + timedelta(microseconds=int(score))
+
+
+def home_key(user_id) -> str:
+    return f'home:{user_id}'
+
+
+def author_key(user_id) -> str:
+    return f'author:{user_id}'
+
+
+def public_key(activity_type: Optional[str] = None) -> str:
+    return f'public:{activity_type}' if activity_type else 'public'
+
+
+FEATURED_KEY = 'featured'
+
+
+def max_length() -> int:
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 1000)
+
+
+class TimelineStore:
+    """Interface for timeline stores"""
+
+    def add(self, entries: Dict[str, List[TimelineEntry]]):
+        """Add (item_id, score) entries per timeline key, trimming each to the cap"""
+        raise NotImplementedError
+
+    def page(self, key: str, limit: int, offset: int = 0) -> List[TimelineEntry]:
+        """Entries newest first"""
+        raise NotImplementedError
+
+    def after(self, key: str, limit: int, cursor: Optional[TimelineEntry] = None) -> List[TimelineEntry]:
+        """Entries newest first, starting after the cursor entry"""
+        raise NotImplementedError
+
+    def count(self, key: str) -> int:
+        raise NotImplementedError
+
+    def remove(self, key: str, item_ids: Iterable[str]):
+        raise NotImplementedError
+
+    def clear(self, key: str):
+        raise NotImplementedError
+
+
+class RedisTimelineStore(TimelineStore):
+    """Capped sorted set per timeline on the cache Redis server"""
+
+    def __init__(self, alias: str = 'default'):
+        self.alias = alias
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from django_redis import get_redis_connection
+            self._client = get_redis_connection(self.alias)
+        return self._client
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return CacheManager.get_cache_key('timeline', key)
+
+    def add(self, entries):
+        cap = max_length()
+        pipe = self.client.pipeline(transaction=False)
+        for key, rows in entries.items():
+            if not rows:
+                continue
+            redis_key = self._key(key)
+            pipe.zadd(redis_key, {str(item_id): float(score) for item_id, score in rows})
+            # Keep only the newest ``cap`` items
+            pipe.zremrangebyrank(redis_key, 0, -cap - 1)
+        pipe.execute()
+
+    def page(self, key, limit, offset=0):
+        return [
+            (member.decode() if isinstance(member, bytes) else member, score)
+            for member, score in self.client.zrevrange(self._key(key), offset, offset + limit - 1, withscores=True)
+        ]
+
+    def after(self, key, limit, cursor=None):
+        if cursor is None:
+            return self.page(key, limit)
+        redis_key = self._key(key)
+        member, score = str(cursor[0]), float(cursor[1])
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrevrank(redis_key, member)
+        pipe.zscore(redis_key, member)
+        position, current = pipe.execute()
+        if position is not None and current == score:
+            return self.page(key, limit, position + 1)
+        # The cursor entry was trimmed or pruned, continue from its score
+        return [
+            (member.decode() if isinstance(member, bytes) else member, score)
+            for member, score in self.client.zrevrangebyscore(
+                redis_key, f'({score}', '-inf', start=0, num=limit, withscores=True
+            )
+        ]
+
+    def count(self, key):
+        return self.client.zcard(self._key(key))
+
+    def remove(self, key, item_ids):
+        members = [str(item_id) for item_id in item_ids]
+        if members:
+            self.client.zrem(self._key(key), *members)
+
+    def clear(self, key):
+        self.client.delete(self._key(key))
+
+
+class InMemoryTimelineStore(TimelineStore):
+    """In-process timeline store for tests and single process development servers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timelines: Dict[str, SortedSet] = {}
+
+    def add(self, entries):
+        cap = max_length()
+        with self._lock:
+            for key, rows in entries.items():
+                timeline = self._timelines.setdefault(key, SortedSet())
+                for item_id, score in rows:
+                    timeline.add(str(item_id), score)
+                timeline.trim(cap)
+
+    def page(self, key, limit, offset=0):
+        with self._lock:
+            timeline = self._timelines.get(key)
+            return timeline.range(offset, limit) if timeline is not None else []
+
+    def after(self, key, limit, cursor=None):
+        if cursor is None:
+            return self.page(key, limit)
+        with self._lock:
+            timeline = self._timelines.get(key)
+            return timeline.after(str(cursor[0]), cursor[1], limit) if timeline is not None else []
+
+    def count(self, key):
+        timeline = self._timelines.get(key)
+        return len(timeline) if timeline is not None else 0
+
+    def remove(self, key, item_ids):
+        with self._lock:
+            timeline = self._timelines.get(key)
+            if timeline is not None:
+                for item_id in item_ids:
+                    timeline.discard(str(item_id))
+
+    def clear(self, key):
+        with self._lock:
+            self._timelines.pop(key, None)
+
+
+# The configured store (TIMELINE_STORE_BACKEND), one per process
+get_timeline_store = StoreLoader('TIMELINE_STORE_BACKEND', 'social.timelines.RedisTimelineStore')
+
+
+def _co_members(user_ids: Set[str]) -> Dict[str, Set[str]]:
+    """Active members sharing an active organisation membership with each user"""
+    from corporate.models import OrganizationMember
+
+    organizations = defaultdict(set)
+    for organization_id, user_id in OrganizationMember.objects.filter(
+        user_id__in=user_ids, status='active'
+    ).values_list('organization_id', 'user_id'):
+        organizations[organization_id].add(str(user_id))
+    if not organizations:
+        return {}
+
+    members = defaultdict(set)
+    for organization_id, user_id in OrganizationMember.objects.filter(
+        organization_id__in=list(organizations), status='active'
+    ).values_list('organization_id', 'user_id'):
+        members[organization_id].add(str(user_id))
+
+    co_members = defaultdict(set)
+    for organization_id, authors in organizations.items():
+        for author in authors:
+            co_members[author] |= members[organization_id]
+    return co_members
+
+
+def timeline_keys(item: dict, actors: List[str], co_members: Dict[str, Set[str]]) -> Set[str]:
+    """Every timeline one feed item (as a values() row) belongs on"""
+    keys = {home_key(actor) for actor in actors}
+    if item['is_public']:
+        for actor in actors:
+            keys |= {home_key(member) for member in co_members.get(actor, ())}
+            keys.add(author_key(actor))
+        keys |= {public_key(), public_key(item['activity_type'])}
+        if item['is_featured']:
+            keys.add(FEATURED_KEY)
+    return keys
+
+
+def fan_out(item_ids: Iterable, user_ids: Optional[Iterable] = None) -> int:
+    """
+    Push feed items onto every timeline they belong on, returns the timeline
+    writes. ``user_ids`` fans out for those actors instead of the items'
+    authors, for users joining an aggregated item.
+    """
+    store = get_timeline_store()
+    ids = [str(item_id) for item_id in item_ids]
+    actor_ids = [str(user_id) for user_id in user_ids] if user_ids is not None else None
+    writes = 0
+    for i in range(0, len(ids), FAN_OUT_BATCH_SIZE):
+        items = list(SocialFeed.objects.filter(id__in=ids[i:i + FAN_OUT_BATCH_SIZE]).values(
+            'id', 'user_id', 'activity_type', 'is_public', 'is_featured', 'created_at'
+        ))
+        if not items:
+            continue
+        actors = {str(item['id']): actor_ids or [str(item['user_id'])] for item in items}
+        co_members = _co_members({
+            actor for item in items if item['is_public'] for actor in actors[str(item['id'])]
+        })
+
+        entries = defaultdict(list)
+        for item in items:
+            entry = (str(item['id']), entry_score(item['created_at']))
+            for key in timeline_keys(item, actors[str(item['id'])], co_members):
+                entries[key].append(entry)
+        store.add(entries)
+        writes += sum(len(rows) for rows in entries.values())
+    return writes
+
+
+def keyset_after(queryset, cursor: Optional[TimelineEntry]):
+    """Rows of a SocialFeed queryset ordered after a cursor, newest first"""
+    if cursor is not None:
+        item_id, score = cursor
+        created_at = score_time(score)
+        queryset = queryset.filter(
+            models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, id__lt=item_id)
+        )
+    return queryset.order_by('-created_at', '-id')
+
+
+def item_cursor(item: SocialFeed) -> TimelineEntry:
+    return str(item.id), entry_score(item.created_at)
+
+
+def visible(key: str, item: SocialFeed) -> bool:
+    """Whether a timeline may still serve an item, its flags can change after fan-out"""
+    if key == home_key(item.user_id):
+        return True
+    if not item.is_public:
+        return False
+    return key != FEATURED_KEY or item.is_featured
+
+
+def _load(item_ids: List[str]) -> Dict[str, SocialFeed]:
+    return {
+        str(item_id): item
+        for item_id, item in SocialFeed.objects.select_related('user').in_bulk(item_ids).items()
+    }
+
+
+def hydrate(key: str, entries: List[TimelineEntry]) -> List[SocialFeed]:
+    """Feed items for timeline entries in one query, dropping (and pruning) deleted or hidden ones"""
+    if not entries:
+        return []
+    items = _load([item_id for item_id, _ in entries])
+    stale = [item_id for item_id, _ in entries if item_id not in items or not visible(key, items[item_id])]
+    if stale:
+        get_timeline_store().remove(key, stale)
+    return [items[item_id] for item_id, _ in entries if item_id not in stale]
+
+
+class Timeline:
+    """
+    One timeline, read a page at a time after a (item_id, score) cursor.
+    Once the timeline runs out (past its cap, or older than the timeline
+    itself) pages continue from ``fallback``, the equivalent SocialFeed
+    queryset.
+    """
+
+    def __init__(self, key: str, fallback=None):
+        self.key = key
+        self.fallback = fallback
+        self.store = get_timeline_store()
+
+    def after(self, cursor: Optional[TimelineEntry], limit: int) -> Tuple[List[SocialFeed], Optional[TimelineEntry]]:
+        """A page of items and the cursor for the next page, None on the last page"""
+        entries = self.store.after(self.key, limit + 1, cursor)
+        items = hydrate(self.key, entries[:limit])
+        if len(entries) > limit:
+            return items, entries[limit - 1]
+        if self.fallback is None:
+            return items, None
+
+        last = entries[-1] if entries else cursor
+        needed = limit - len(items)
+        older = list(keyset_after(self.fallback, last)[:needed + 1])
+        items += older[:needed]
+        if len(older) <= needed:
+            return items, None
+        return items, item_cursor(items[-1]) if items else last
+
+
+def merged(keys: List[str], limit: int) -> List[SocialFeed]:
+    """The newest items across several timelines, one range read each and one in_bulk"""
+    store = get_timeline_store()
+    newest = {}
+    sources = {}
+    for key in keys:
+        for item_id, score in store.page(key, limit):
+            if item_id not in newest:
+                newest[item_id] = score
+                sources[item_id] = key
+    entries = sorted(newest.items(), key=lambda entry: entry[1], reverse=True)[:limit]
+    if not entries:
+        return []
+
+    items = _load([item_id for item_id, _ in entries])
+    page = []
+    for item_id, _ in entries:
+        if item_id in items and visible(sources[item_id], items[item_id]):
+            page.append(items[item_id])
+        else:
+            store.remove(sources[item_id], [item_id])
+    return page
+
+
+def _actors(item: dict) -> List[str]:
+    """The author and the sampled actors of an aggregated item"""
+    author = str(item['user_id'])
+    return [author] + [actor for actor in item['metadata'].get('actor_ids', []) if actor != author]
+
+
+def refresh_item(item_id, previous: Dict[str, bool]) -> int:
+    """
+    Move an item between timelines after its is_public / is_featured flags
+    changed from ``previous``, returns the timelines it was removed from.
+    """
+    item = SocialFeed.objects.filter(id=item_id).values(
+        'id', 'user_id', 'activity_type', 'is_public', 'is_featured', 'metadata', 'created_at'
+    ).first()
+    if item is None:
+        return 0
+    actors = _actors(item)
+    co_members = _co_members(set(actors))
+    removed = timeline_keys(dict(item, **previous), actors, co_members) - timeline_keys(item, actors, co_members)
+    store = get_timeline_store()
+    for key in removed:
+        store.remove(key, [str(item_id)])
+    fan_out([item_id], actors)
+    return len(removed)
+
+
+def rebuild(since: Optional[datetime] = None) -> int:
+    """Re-fan feed items created since a time (all by default), e.g. after Redis is flushed"""
+    items = SocialFeed.objects.order_by('created_at')
+    if since:
+        items = items.filter(created_at__gte=since)
+    ids = list(items.values_list('id', flat=True))
+    writes = fan_out(ids)
+    logger.info(f"Fanned out {len(ids)} feed items to {writes} timeline entries")
+    return len(ids)
@@ -22,6 +22,8 @@ urlpatterns = [
     path('leaderboards/', views.LeaderboardListView.as_view(), name='leaderboard-list'),
     path('leaderboards/<uuid:pk>/', views.LeaderboardDetailView.as_view(), name='leaderboard-detail'),
     path('leaderboards/<uuid:leaderboard_id>/position/', views.user_leaderboard_position, name='user-leaderboard-position'),
+    path('leaderboards/<uuid:leaderboard_id>/around/', views.leaderboard_around_user, name='leaderboard-around-user'),
+    path('leaderboards/<uuid:leaderboard_id>/history/', views.LeaderboardHistoryView.as_view(), name='leaderboard-history'),
     
     # Social Feed
     path('feed/', views.SocialFeedView.as_view(), name='social-feed'),
@@ -5,24 +5,34 @@ from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.contrib.auth import get_user_model
 from django.db.models import Q
+from django.db.models.fields.json import KeyTransform
 from django.utils import timezone
 from datetime import timedelta
 
 from .models import (
     Badge, UserBadge, Challenge, ChallengeParticipation,
-    Leaderboard, LeaderboardEntry, SocialFeed, UserStats
+    Leaderboard, LeaderboardEntry, LeaderboardSnapshot, SocialFeed, UserStats
 )
 from .serializers import (
     BadgeSerializer, UserBadgeSerializer, ChallengeSerializer,
     ChallengeParticipationSerializer, ChallengeCreateSerializer,
     LeaderboardSerializer, LeaderboardEntrySerializer, LeaderboardWithEntriesSerializer,
+    LeaderboardStandingSerializer, LeaderboardSnapshotSerializer,
     SocialFeedSerializer, UserStatsSerializer
 )
+from . import timelines
+from .pagination import FeedCursorPagination
 from .services import (
     SocialService, BadgeService, ChallengeService, LeaderboardService
 )
 
+User = get_user_model()
+
+# Largest "around me" window either side of the user
+MAX_AROUND_RADIUS = 50
+
 
 class BadgeListView(generics.ListAPIView):
     """List all available badges"""
@@ -206,12 +216,6 @@ class LeaderboardDetailView(generics.RetrieveAPIView):
     queryset = Leaderboard.objects.filter(is_active=True)
     serializer_class = LeaderboardWithEntriesSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
-    def get_object(self):
-        leaderboard = super().get_object()
-        # Update leaderboard entries
-        LeaderboardService.update_leaderboard(leaderboard)
-        return leaderboard
 
 
 @api_view(['GET'])
@@ -220,11 +224,8 @@ def user_leaderboard_position(request, leaderboard_id):
     """Get user's position in a specific leaderboard"""
     leaderboard = get_object_or_404(Leaderboard, id=leaderboard_id, is_active=True)
     
-    # Get user's entry
-    entry = LeaderboardEntry.objects.filter(
-        leaderboard=leaderboard,
-        user=request.user
-    ).first()
+    # Live rank from the leaderboard store
+    entry = LeaderboardService.get_user_entry(leaderboard, request.user)
     
     if not entry:
         return Response({'message': 'User not found in leaderboard'}, status=status.HTTP_404_NOT_FOUND)
@@ -233,14 +234,94 @@ def user_leaderboard_position(request, leaderboard_id):
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def leaderboard_around_user(request, leaderboard_id):
+    """Entries ranked just above and below the user"""
+    leaderboard = get_object_or_404(Leaderboard, id=leaderboard_id, is_active=True)
+    
+    try:
+        radius = int(request.query_params.get('radius', 5))
+    except ValueError:
+        return Response({'error': 'radius must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    radius = min(max(radius, 0), MAX_AROUND_RADIUS)
+    
+    entries = LeaderboardService.get_neighbours(leaderboard, request.user, radius)
+    if entries is None:
+        return Response({'message': 'User not found in leaderboard'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'leaderboard': LeaderboardSerializer(leaderboard).data,
+        'radius': radius,
+        'entries': LeaderboardStandingSerializer(entries, many=True).data,
+    })
+
+
+class LeaderboardHistoryView(generics.ListAPIView):
+    """Snapshots of a leaderboard's closed periods, newest first"""
+    serializer_class = LeaderboardSnapshotSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        leaderboard = get_object_or_404(Leaderboard, id=self.kwargs['leaderboard_id'])
+        # Only the requesting user's slot of the packed ranks is read back
+        return LeaderboardSnapshot.objects.filter(leaderboard=leaderboard).defer('ranks').annotate(
+            user_standing=KeyTransform(str(self.request.user.id), 'ranks')
+        ).order_by('-period_start')
+    
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        snapshots = page if page is not None else queryset
+        user_ids = {entry['user_id'] for snapshot in snapshots for entry in snapshot.top_entries}
+        self.users = {str(user.id): user for user in User.objects.filter(id__in=user_ids)}
+        return page
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['users'] = getattr(self, 'users', {})
+        return context
+
+
 class SocialFeedView(generics.ListAPIView):
     """Social activity feed"""
     serializer_class = SocialFeedSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedCursorPagination
+    
+    def get_timeline_key(self):
+        """Precomputed timeline answering the request, None when filters are combined"""
+        params = self.request.query_params
+        activity_type = params.get('type', None)
+        user_id = params.get('user', None)
+        featured = params.get('featured', None) == 'true'
+        home = params.get('timeline', None) == 'home'
+        if sum(map(bool, [activity_type, user_id, featured, home])) > 1:
+            return None
+        if home:
+            return timelines.home_key(self.request.user.id)
+        if activity_type:
+            return timelines.public_key(activity_type)
+        if user_id:
+            return timelines.author_key(user_id)
+        if featured:
+            return timelines.FEATURED_KEY
+        return timelines.public_key()
     
     def get_queryset(self):
         queryset = SocialFeed.objects.filter(is_public=True).select_related('user')
         
+        # Personal timeline: own items and organisation co-members' public items
+        if self.request.query_params.get('timeline', None) == 'home':
+            user = self.request.user
+            queryset = SocialFeed.objects.filter(
+                Q(user=user) | Q(
+                    is_public=True,
+                    user__memberships__status='active',
+                    user__memberships__organization__members__user=user,
+                    user__memberships__organization__members__status='active'
+                )
+            ).distinct().select_related('user')
+        
         # Filter by activity type
         activity_type = self.request.query_params.get('type', None)
         if activity_type:
@@ -256,7 +337,13 @@ class SocialFeedView(generics.ListAPIView):
         if featured == 'true':
             queryset = queryset.filter(is_featured=True)
         
-        return queryset.order_by('-created_at')[:50]  # Limit to recent 50 items
+        queryset = queryset.order_by('-created_at', '-id')
+        
+        # Served from the precomputed timeline, continuing from the database once it runs out
+        key = self.get_timeline_key()
+        if key:
+            return timelines.Timeline(key, fallback=queryset)
+        return queryset
 
 
 class UserStatsView(generics.RetrieveAPIView):
@@ -265,10 +352,8 @@ class UserStatsView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
+        # Kept current by activity, badge and challenge events
         stats, created = UserStats.objects.get_or_create(user=self.request.user)
-        if created or (timezone.now() - stats.last_updated).total_seconds() > 3600:  # Update hourly
-            SocialService.update_user_stats(self.request.user)
-            stats.refresh_from_db()
         return stats
 
 
@@ -280,9 +365,6 @@ def user_dashboard(request):
     
     # Get or create user stats
     stats, created = UserStats.objects.get_or_create(user=user)
-    if created:
-        SocialService.update_user_stats(user)
-        stats.refresh_from_db()
     
     # Get recent badges (last 5)
     recent_badges = UserBadge.objects.filter(user=user).select_related('badge')[:5]
@@ -294,10 +376,15 @@ def user_dashboard(request):
         challenge__is_active=True
     ).select_related('challenge')[:3]
     
-    # Get recent feed items
-    recent_feed = SocialFeed.objects.filter(
-        Q(user=user) | Q(is_featured=True)
-    ).select_related('user')[:10]
+    # Get recent feed items, from the user's and the featured timelines
+    recent_feed = timelines.merged([timelines.home_key(user.id), timelines.FEATURED_KEY], 10)
+    if len(recent_feed) < 10:
+        # Timelines only hold what was fanned out since they were filled
+        older = SocialFeed.objects.filter(
+            Q(user=user) | Q(is_featured=True, is_public=True)
+        ).select_related('user')
+        cursor = timelines.item_cursor(recent_feed[-1]) if recent_feed else None
+        recent_feed += list(timelines.keyset_after(older, cursor)[:10 - len(recent_feed)])
     
     # Get user's best leaderboard positions (top 3)
     best_positions = LeaderboardEntry.objects.filter(